@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 # NOTE: If no "AlertR alert settings" and "Mail alert settings" are set to
 # None, each script will fall back to print its output.
@@ -16,3 +16,80 @@ STATE_DIR = "state"
 # If "start_search.py" is used to execute all scripts, this setting configures
 # the time in seconds before a script times out.
 START_PROCESS_TIMEOUT = 60
+
+# Compression used for the state files in STATE_DIR. Possible values: "zlib", "zstd" (needs the Python module
+# "zstandard" installed) or "none". State files in the old plain JSON format are migrated automatically.
+STATE_COMPRESSION = "zlib"
+
+# Monitoring scripts cache the hash or parsed content of files as long as the files' metadata (device, inode, size,
+# modification and change time) is unchanged. On average every FINGERPRINT_FULL_VERIFY_INTERVAL runs, all files are
+# read again regardless (1 disables the cache).
+FINGERPRINT_FULL_VERIFY_INTERVAL = 24
+
+# If search scripts process multiple locations (e.g., all subdirectories of "/"), the locations are processed in
+# parallel. At most SCAN_MAX_WORKERS locations are processed at the same time and at most SCAN_WORKERS_PER_DEVICE
+# locations stored on the same device (to not overload a single disk).
+SCAN_MAX_WORKERS = 4
+SCAN_WORKERS_PER_DEVICE = 1
+
+# Maximal number of bytes per second scripts read from files when hashing or scanning their content (0 means no limit).
+# Limits the impact of scans on latency-sensitive services running on the host. Note that a low limit might
+# require a higher START_PROCESS_TIMEOUT or searching in steps (SEARCH_IN_STEPS).
+IO_RATE_LIMIT = 0
+
+# Drop the pages of files read when hashing or scanning their content from the page cache afterwards, so that scans
+# do not push the working set of other services out of it.
+IO_DROP_PAGE_CACHE = True
+
+# Run external programs that read many files (e.g., debsums) with the idle I/O scheduling class ("ionice -c 3"),
+# so that they only use the disk if no other process needs it.
+IO_IDLE_PRIORITY = True
+
+# If activated, the filesystem searches of "search_hidden_exe.py", "search_immutable_files.py" and "search_dev_shm.py"
+# are done in a single traversal by "search_filesystem.py" (each file is only visited once). Findings are still
+# reported under the names of the scripts and their whitelists are used. Scripts that search in steps
+# (SEARCH_IN_STEPS) still search on their own.
+COMBINED_FILESYSTEM_SEARCH = False
+
+# Search scripts cache per file results (e.g., the attributes of a file) keyed by the inode of the file as long as its
+# change time is unchanged. On average every INODE_CACHE_FULL_SWEEP_INTERVAL runs, all files are processed again
+# regardless (1 disables the cache).
+INODE_CACHE_FULL_SWEEP_INTERVAL = 30
+
+# Search scripts split their search locations by the filesystems mounted below them and search each filesystem on its
+# own. Mounts of the following filesystem types are not searched. Entries can be literal values or patterns prefixed
+# with "glob:" (e.g., "glob:fuse.*") or "regex:". Pseudo filesystems only provide kernel interfaces.
+SCAN_SKIP_PSEUDO_FS_TYPES = ["proc", "sysfs", "devpts", "cgroup", "cgroup2", "debugfs", "tracefs", "securityfs",
+                             "pstore", "bpf", "configfs", "fusectl", "mqueue", "hugetlbfs", "autofs", "binfmt_misc",
+                             "efivarfs", "selinuxfs", "rpc_pipefs", "nsfs", "nfsd"]  # type: List[str]
+
+# Remote filesystems are slow to search and should be searched on the host they are stored on.
+SCAN_SKIP_REMOTE_FS_TYPES = ["nfs", "nfs4", "cifs", "smb3", "smbfs", "ncpfs", "9p", "afs", "ceph", "glusterfs",
+                             "lustre", "gpfs", "fuse.sshfs", "fuse.s3fs", "fuse.rclone"]  # type: List[str]
+
+# The content of filesystems mounted read-only (e.g., squashfs snap packages or ISO images) can not change while they
+# are mounted read-only. If activated, the search results of these filesystems are cached. A remount to read-write
+# and back keeps the mount id and options, hence cached results expire after SCAN_CACHE_MAX_AGE seconds and the
+# filesystem is searched again to catch files written in the meantime.
+SCAN_CACHE_READ_ONLY_FS = True
+SCAN_CACHE_MAX_AGE = 86400
+
+# File with the signatures (e.g., of crypto miners, reverse shells and webshells) the content of suspicious files is
+# matched against by search scripts. Relative paths are relative to the "scripts" directory.
+SIGNATURE_FILE = "config/signatures.txt"
+
+# Maximal number of bytes of a file that are matched against the signatures (0 means no limit).
+# Scripts matching many files additionally limit the number of bytes matched per execution (e.g., MAX_SCANNED_BYTES).
+SIGNATURE_SCAN_MAX_SIZE = 1048576
+
+# The entropy profile of files reported by search scripts is calculated per block of ENTROPY_BLOCK_SIZE bytes over at
+# most the first ENTROPY_MAX_SIZE bytes of a file. If the Python module "numpy" is installed, it is used to speed up
+# the calculation.
+ENTROPY_BLOCK_SIZE = 65536
+ENTROPY_MAX_SIZE = 1048576
+
+# Prefix of the IOC filter files ("<prefix>.bloom" and "<prefix>.sha256") holding SHA-256 hashes of known malicious
+# files (e.g., from threat intelligence feeds). The files are built with
+# "start_search.py --build-ioc-filter <feed file>" from a file with one hash per line. If set, the executables found
+# by search scripts are checked against the hashes. Relative paths are relative to the "scripts" directory.
+IOC_FILTER = None  # type: Optional[str]
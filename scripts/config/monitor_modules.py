@@ -1,6 +1,8 @@
 from typing import List
 
 # List of modules that are loaded and should be ignored.
+# Entries can be literal values or patterns prefixed with "glob:" (e.g., "glob:nvidia*")
+# or "regex:" (e.g., "regex:snd_.*").
 MODULES_WHITELIST = []  # type: List[str]
 
 # Is the script allowed to run or not?
@@ -1,2 +1,6 @@
+# Match the content of the deleted binaries against the signatures of known malicious content
+# (see SIGNATURE_FILE and SIGNATURE_SCAN_MAX_SIZE in config.py).
+SEARCH_SIGNATURES = True
+
 # Is the script allowed to run or not?
 ACTIVATED = True
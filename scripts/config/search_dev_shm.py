@@ -1,2 +1,52 @@
+from typing import List
+
+# Directories in which malware is often dropped since they are writable by everyone or stored in memory.
+# Directories that do not exist are ignored. The mounts of these directories are searched even if their filesystem
+# types are skipped by the scan policy (e.g., mqueue for /dev/mqueue, see SCAN_SKIP_PSEUDO_FS_TYPES in config.py),
+# also when they are searched together with other scripts by search_filesystem.py.
+DROP_LOCATIONS = ["/dev/shm", "/tmp", "/var/tmp", "/run/user", "/dev/mqueue"]  # type: List[str]
+
+# Also search all mounts of in-memory filesystems (e.g., tmpfs) and all mounts whose root directory is writable by
+# everyone (found via /proc/self/mountinfo). Mounts of filesystem types that are skipped by the scan policy
+# (see SCAN_SKIP_PSEUDO_FS_TYPES and SCAN_SKIP_REMOTE_FS_TYPES in config.py) are not discovered.
+DISCOVER_DROP_LOCATIONS = True
+
+# Filesystem types whose mounts are searched if DISCOVER_DROP_LOCATIONS is activated.
+DISCOVER_FS_TYPES = ["tmpfs", "ramfs"]  # type: List[str]
+
+# Maximum number of new or changed files that are classified per execution (0 means no limit).
+# Unchanged files are recognized by their inode, modification and change time and are not read again.
+# If databases or browsers create many shared memory segments, the limit bounds the time an execution takes.
+# Files that were not classified because of the limit are checked during the next executions.
+MAX_FILES = 10000
+
+# Maximum number of new or changed files that are classified per directory and execution (0 means no limit).
+# Prevents a single directory with many files from using up MAX_FILES.
+MAX_FILES_PER_DIRECTORY = 1000
+
+# Maximum number of bytes that are matched against the signatures per execution (0 means no limit). Counts towards
+# the same limit as MAX_FILES, i.e., files that are new or changed after the limit is reached are checked during the
+# next executions. Large shared memory segments that change constantly (e.g., of databases) are matched again on
+# each change, the limit bounds the time spent on them.
+MAX_SCANNED_BYTES = 268435456
+
+# Match the content of all files in the drop locations against the signatures of known malicious content
+# (see SIGNATURE_FILE in config.py). All signatures are matched in a single pass over the file.
+SEARCH_SIGNATURES = True
+
+# Report the entropy profile (entropy per block, see ENTROPY_BLOCK_SIZE in config.py) of each found file.
+# Packed or encrypted payloads have a high entropy. The profile is cached together with the other results of a file.
+REPORT_ENTROPY = True
+
+# List of directories to ignore.
+# Entries can be literal values or patterns prefixed with "glob:" (e.g., "glob:/tmp/systemd-private-*")
+# or "regex:" (e.g., "regex:/run/user/[0-9]+/snap\\..*").
+DROP_DIRECTORY_WHITELIST = []  # type: List[str]
+
+# List of files to ignore.
+# Entries can be literal values or patterns prefixed with "glob:" (e.g., "glob:/tmp/*.sh")
+# or "regex:" (e.g., "regex:/var/tmp/installer-[0-9]+\\.sh").
+DROP_FILE_WHITELIST = []  # type: List[str]
+
 # Is the script allowed to run or not?
 ACTIVATED = True
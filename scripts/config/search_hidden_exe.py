@@ -1,21 +1,48 @@
-from typing import List
+from typing import List, Optional
 
 # List of directories to search for hidden ELF files. Defaults to "/".
 SEARCH_LOCATIONS = []  # type: List[str]
 
 # To prevent a timeout if this script is run regularly for monitoring,
-# the search can be done in steps for each location given in SEARCH_LOCATIONS.
-# Steps mean if you have location_A, the first execution of this script will
-# process location_A non-recursively and terminates,
-# the second execution will process location_A/subdir_A recursively and terminates,
-# the third execution will process location_A/subdir_B recursively and terminates and so on.
-# After all subdirectories where processed, the subsequent execution will begin again with location_A non-recursively.
+# the search can be done in steps. Each execution of this script walks the locations given in SEARCH_LOCATIONS
+# until the time given in SEARCH_STEP_TIME_BUDGET is used up and stores the exact position it stopped at.
+# The next execution resumes at this position. After all locations were processed completely,
+# the subsequent execution begins a new pass with the first location. When the locations were last fully covered
+# can be shown by executing this script with the argument "--coverage".
 SEARCH_IN_STEPS = False
 
+# Time in seconds each execution is allowed to search if SEARCH_IN_STEPS is activated. Has to be well below
+# START_PROCESS_TIMEOUT in config.py, otherwise "start_search.py" kills the script before it stores its position.
+# None uses half of START_PROCESS_TIMEOUT.
+SEARCH_STEP_TIME_BUDGET = None  # type: Optional[int]
+
+# Only search the filesystems the search locations are located on and not the filesystems mounted below them.
+# Mounted pseudo and remote filesystems (e.g., /proc or network shares) are always skipped
+# (see SCAN_SKIP_PSEUDO_FS_TYPES and SCAN_SKIP_REMOTE_FS_TYPES in config.py).
+STAY_ON_FILESYSTEM = False
+
+# Match the content of all hidden files against the signatures of known malicious content
+# (see SIGNATURE_FILE and SIGNATURE_SCAN_MAX_SIZE in config.py). The matched signatures of a file are cached as long as
+# its change time is unchanged.
+SEARCH_SIGNATURES = True
+
+# Maximum number of bytes that are matched against the signatures per execution (0 means no limit). New or changed
+# hidden files that are found after the limit is reached are only checked for being ELF files, their content is
+# matched during the next executions.
+MAX_SCANNED_BYTES = 268435456
+
+# Report the entropy profile (entropy per block, see ENTROPY_BLOCK_SIZE in config.py) of each found file.
+# Packed or encrypted payloads have a high entropy. The profile is cached together with the other results of a file.
+REPORT_ENTROPY = True
+
 # List of directories to ignore.
+# Entries can be literal values or patterns prefixed with "glob:" (e.g., "glob:/home/*/.cache")
+# or "regex:" (e.g., "regex:/var/lib/docker/overlay2/[0-9a-f]+").
 HIDDEN_EXE_DIRECTORY_WHITELIST = []  # type: List[str]
 
 # List of hidden ELF files to ignore.
+# Entries can be literal values or patterns prefixed with "glob:" (e.g., "glob:/opt/*/.bin")
+# or "regex:" (e.g., "regex:/home/[^/]+/\\.local/bin/\\.tool").
 HIDDEN_EXE_FILE_WHITELIST = []  # type: List[str]
 
 # Is the script allowed to run or not?
@@ -1,21 +1,33 @@
-from typing import List
+from typing import List, Optional
 
 # List of directories to search for immutablle files. Defaults to "/".
 SEARCH_LOCATIONS = []  # type: List[str]
 
 # To prevent a timeout if this script is run regularly for monitoring,
-# the search can be done in steps for each location given in SEARCH_LOCATIONS.
-# Steps mean if you have location_A, the first execution of this script will
-# process location_A non-recursively and terminates,
-# the second execution will process location_A/subdir_A recursively and terminates,
-# the third execution will process location_A/subdir_B recursively and terminates and so on.
-# After all subdirectories where processed, the subsequent execution will begin again with location_A non-recursively.
+# the search can be done in steps. Each execution of this script walks the locations given in SEARCH_LOCATIONS
+# until the time given in SEARCH_STEP_TIME_BUDGET is used up and stores the exact position it stopped at.
+# The next execution resumes at this position. After all locations were processed completely,
+# the subsequent execution begins a new pass with the first location. When the locations were last fully covered
+# can be shown by executing this script with the argument "--coverage".
 SEARCH_IN_STEPS = False
 
+# Time in seconds each execution is allowed to search if SEARCH_IN_STEPS is activated. Has to be well below
+# START_PROCESS_TIMEOUT in config.py, otherwise "start_search.py" kills the script before it stores its position.
+# None uses half of START_PROCESS_TIMEOUT.
+SEARCH_STEP_TIME_BUDGET = None  # type: Optional[int]
+
+# Also search for files with the append-only attribute (set with "chattr +a"). Like immutable files, append-only files
+# can be used by attackers to prevent the removal of their files (e.g., of their entries in log files).
+SEARCH_APPEND_ONLY = False
+
 # List of directories to ignore.
+# Entries can be literal values or patterns prefixed with "glob:" (e.g., "glob:/home/*/.cache")
+# or "regex:" (e.g., "regex:/var/lib/docker/overlay2/[0-9a-f]+").
 IMMUTABLE_DIRECTORY_WHITELIST = []  # type: List[str]
 
 # List of immutable files to ignore.
+# Entries can be literal values or patterns prefixed with "glob:" (e.g., "glob:/etc/*.conf")
+# or "regex:" (e.g., "regex:/var/lib/[^/]+/lock").
 IMMUTABLE_FILE_WHITELIST = []  # type: List[str]
 
 # Is the script allowed to run or not?
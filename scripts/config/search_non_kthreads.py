@@ -1,6 +1,8 @@
 from typing import List
 
 # List of process names that are ignored.
+# Entries can be literal values or patterns prefixed with "glob:" (e.g., "glob:* /var/lib/lxc *")
+# or "regex:" (e.g., "regex:\\[kworker/\\d+:\\d+\\]").
 NON_KTHREAD_WHITELIST = []  # type: List[str]
 
 # Is the script allowed to run or not?
@@ -4,6 +4,8 @@ from typing import List
 DEBSUMS_EXE = "/usr/bin/debsums"
 
 # List of changed deb package files to ignore.
+# Entries can be literal values or patterns prefixed with "glob:" (e.g., "glob:/usr/share/locale/*")
+# or "regex:" (e.g., "regex:/etc/.*\\.conf").
 FILE_WHITELIST = []  # type: List[str]
 
 # Is the script allowed to run or not?
@@ -0,0 +1,140 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import socket
+import tarfile
+import time
+from typing import Dict, List, Optional
+
+# Files in the state directories that only make sense on the host they were created on.
+HOST_SPECIFIC_STATE_FILES = ["fingerprint_cache", "inode_cache", "hash_cache"]
+
+BASELINE_VERSION = 1
+
+
+class BaselineException(Exception):
+    pass
+
+
+def _calculate_file_hash(file_location: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(file_location, "rb") as fp:
+        chunk = fp.read(1048576)
+        while chunk:
+            file_hash.update(chunk)
+            chunk = fp.read(1048576)
+    return file_hash.hexdigest()
+
+
+def export_baseline(state_root: str, script_names: List[str], baseline_file: str) -> str:
+    """
+    Packs the states of the given scripts into a single baseline file. The baseline contains a manifest with the
+    hash of each packed state file to verify it during the import.
+
+    :param state_root: directory containing the state directories of the scripts
+    :param script_names: names of the scripts whose states are exported (e.g., "monitor_passwd.py")
+    :param baseline_file: file to write the baseline to
+    :return: SHA-256 hash of the baseline file
+    """
+    files = {}  # type: Dict[str, str]
+    for script_name in script_names:
+        script_state_dir = os.path.join(state_root, script_name)
+        if not os.path.isdir(script_state_dir):
+            raise BaselineException("No state for script '%s' found." % script_name)
+
+        for root, _, file_names in os.walk(script_state_dir):
+            for file_name in file_names:
+                if file_name in HOST_SPECIFIC_STATE_FILES or file_name.startswith("."):
+                    continue
+                file_location = os.path.join(root, file_name)
+                member_name = os.path.relpath(file_location, state_root)
+                files[member_name] = _calculate_file_hash(file_location)
+
+    manifest = {"version": BASELINE_VERSION,
+                "hostname": socket.gethostname(),
+                "created": int(time.time()),
+                "scripts": sorted(script_names),
+                "files": files}
+    manifest_data = json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8")
+
+    with tarfile.open(baseline_file, "w:gz") as tar:
+        manifest_info = tarfile.TarInfo("manifest.json")
+        manifest_info.size = len(manifest_data)
+        manifest_info.mtime = manifest["created"]
+        tar.addfile(manifest_info, io.BytesIO(manifest_data))
+
+        for member_name in sorted(files.keys()):
+            tar.add(os.path.join(state_root, member_name), arcname=os.path.join("state", member_name))
+
+    return _calculate_file_hash(baseline_file)
+
+
+def import_baseline(baseline_file: str, state_root: str, expected_hash: Optional[str] = None) -> List[str]:
+    """
+    Verifies the given baseline file and installs the contained states. Existing states of the scripts contained
+    in the baseline are replaced.
+
+    :param baseline_file:
+    :param state_root: directory containing the state directories of the scripts
+    :param expected_hash: SHA-256 hash the baseline file has to have (as printed during the export)
+    :return: names of the scripts whose states were imported
+    """
+    if expected_hash is not None and _calculate_file_hash(baseline_file) != expected_hash.lower():
+        raise BaselineException("Hash of baseline file '%s' does not match." % baseline_file)
+
+    try:
+        tar = tarfile.open(baseline_file, "r:gz")
+    except Exception as e:
+        raise BaselineException("Unable to open baseline file '%s'; Exception: '%s'" % (baseline_file, str(e)))
+
+    with tar:
+        try:
+            manifest = json.loads(tar.extractfile("manifest.json").read().decode("utf-8"))
+        except Exception as e:
+            raise BaselineException("Unable to read baseline manifest; Exception: '%s'" % str(e))
+
+        if manifest.get("version") != BASELINE_VERSION:
+            raise BaselineException("Baseline version '%s' is not supported." % str(manifest.get("version")))
+
+        # Read and verify all files before touching the existing states.
+        files_data = {}  # type: Dict[str, bytes]
+        for member in tar.getmembers():
+            if member.name == "manifest.json":
+                continue
+            member_name = os.path.relpath(member.name, "state")
+            if member_name not in manifest["files"].keys() or not member.isfile():
+                raise BaselineException("Baseline contains unexpected member '%s'." % member.name)
+            data = tar.extractfile(member).read()
+            if hashlib.sha256(data).hexdigest() != manifest["files"][member_name]:
+                raise BaselineException("Hash of baseline member '%s' does not match." % member.name)
+            files_data[member_name] = data
+
+        if set(files_data.keys()) != set(manifest["files"].keys()):
+            raise BaselineException("Baseline is missing files listed in its manifest.")
+
+    script_names = manifest["scripts"]
+    for script_name in script_names:
+        if os.sep in script_name or script_name in ["", ".", ".."]:
+            raise BaselineException("Baseline contains invalid script name '%s'." % script_name)
+    for member_name in files_data.keys():
+        if os.path.normpath(member_name).split(os.sep)[0] not in script_names or os.path.isabs(member_name):
+            raise BaselineException("Baseline member '%s' is outside of the script states." % member_name)
+
+    for script_name in script_names:
+        script_state_dir = os.path.join(state_root, script_name)
+        if os.path.isdir(script_state_dir):
+            shutil.rmtree(script_state_dir)
+        os.makedirs(script_state_dir)
+
+    for member_name, data in files_data.items():
+        file_location = os.path.join(state_root, os.path.normpath(member_name))
+        file_dir = os.path.dirname(file_location)
+        if not os.path.exists(file_dir):
+            os.makedirs(file_dir)
+        with open(file_location, "wb") as fp:
+            fp.write(data)
+        os.chmod(file_location, 0o600)
+
+    return script_names
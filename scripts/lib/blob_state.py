@@ -0,0 +1,84 @@
+import hashlib
+import os
+import zlib
+from typing import Iterable
+
+from .state import StateException, write_file_atomic
+
+
+class BlobStateException(StateException):
+    def __init__(self, msg: str):
+        super().__init__(msg)
+
+
+class BlobStore:
+    """
+    Content-addressed storage for file contents in the state directory. Each blob is stored (compressed)
+    once under its SHA-256 hash, a state only has to hold the hash. Blobs are not reference counted, instead
+    the owner of the store passes all hashes its state still refers to when collecting garbage (mark and sweep).
+    """
+
+    def __init__(self, state_dir: str):
+        self._blob_dir = os.path.join(state_dir, "blobs")
+
+    @staticmethod
+    def calculate_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _get_blob_file(self, blob_hash: str) -> str:
+        return os.path.join(self._blob_dir, blob_hash[:2], blob_hash)
+
+    def contains(self, blob_hash: str) -> bool:
+        return os.path.isfile(self._get_blob_file(blob_hash))
+
+    def put(self, data: bytes) -> str:
+        """
+        Stores the given data if it is not already stored.
+
+        :param data:
+        :return: hash of the data
+        """
+        blob_hash = self.calculate_hash(data)
+        blob_file = self._get_blob_file(blob_hash)
+        if os.path.isfile(blob_file):
+            return blob_hash
+
+        blob_dir = os.path.dirname(blob_file)
+        if not os.path.exists(blob_dir):
+            os.makedirs(blob_dir)
+
+        # Never have a partially written blob under its final name.
+        write_file_atomic(blob_file, zlib.compress(data, 9))
+
+        return blob_hash
+
+    def get(self, blob_hash: str) -> bytes:
+        try:
+            with open(self._get_blob_file(blob_hash), 'rb') as fp:
+                data = zlib.decompress(fp.read())
+
+        except Exception as e:
+            raise BlobStateException("Unable to read blob '%s'; Exception: '%s'" % (blob_hash, str(e)))
+
+        if self.calculate_hash(data) != blob_hash:
+            raise BlobStateException("Blob '%s' is corrupted." % blob_hash)
+
+        return data
+
+    def collect_garbage(self, live_hashes: Iterable[str]):
+        """
+        Removes all stored blobs that are not in the given set of hashes.
+
+        :param live_hashes: hashes of all blobs still referenced by the state
+        """
+        live_hashes = set(live_hashes)
+        if not os.path.isdir(self._blob_dir):
+            return
+
+        for sub_dir in os.listdir(self._blob_dir):
+            sub_dir_path = os.path.join(self._blob_dir, sub_dir)
+            for blob_hash in os.listdir(sub_dir_path):
+                if blob_hash not in live_hashes:
+                    os.unlink(os.path.join(sub_dir_path, blob_hash))
+            if not os.listdir(sub_dir_path):
+                os.rmdir(sub_dir_path)
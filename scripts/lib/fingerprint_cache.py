@@ -0,0 +1,69 @@
+import os
+import random
+from typing import Any, Callable, Dict, List
+
+from .state import load_state, store_state
+
+try:
+    from config.config import FINGERPRINT_FULL_VERIFY_INTERVAL
+except:
+    FINGERPRINT_FULL_VERIFY_INTERVAL = 24
+
+
+class FingerprintCache:
+    """
+    Caches results that are derived from the content of a file (e.g., its hash or parsed entries) keyed by the
+    fingerprint (device, inode, size, mtime, ctime) of the file. As long as the fingerprint of a file does not
+    change, the cached result is used instead of reading the file again. On average every
+    FINGERPRINT_FULL_VERIFY_INTERVAL runs the cache is ignored and all files are processed again to catch
+    tampered timestamps. The full verification runs are chosen randomly so that an attacker cannot predict them
+    (and no run counter has to be written to the state directory on each run).
+    """
+
+    def __init__(self, state_dir: str, full_verify_interval: int = FINGERPRINT_FULL_VERIFY_INTERVAL):
+        self._state_dir = state_dir
+        self._cache = {}  # type: Dict[str, Dict[str, List[Any]]]
+        self._new_cache = {}  # type: Dict[str, Dict[str, List[Any]]]
+
+        # Start with an empty cache if a full verification has to be done.
+        self._is_full_verify = full_verify_interval <= 1 or random.randrange(full_verify_interval) == 0
+        if not self._is_full_verify:
+            self._cache = load_state(state_dir, "fingerprint_cache")
+
+    @property
+    def is_full_verify(self) -> bool:
+        return self._is_full_verify
+
+    def get(self, file_location: str, namespace: str, func: Callable[[str], Any], force: bool = False) -> Any:
+        """
+        Gets the result of func(file_location) either from the cache or by executing the function.
+
+        :param file_location:
+        :param namespace: name of the result type (allows caching different results for the same file)
+        :param func: function that processes the file; its result has to be JSON serializable
+        :param force: ignore cached result
+        :return: result of func(file_location)
+        """
+        # Get the fingerprint before processing the file. If the file changes while it is processed,
+        # the fingerprint will be different during the next run.
+        file_stat = os.stat(file_location)
+        fingerprint = [file_stat.st_dev,
+                       file_stat.st_ino,
+                       file_stat.st_size,
+                       file_stat.st_mtime_ns,
+                       file_stat.st_ctime_ns]
+
+        cached_entry = self._cache.get(namespace, {}).get(file_location)
+        if not force and cached_entry is not None and cached_entry[:5] == fingerprint:
+            result = cached_entry[5]
+        else:
+            result = func(file_location)
+
+        self._new_cache.setdefault(namespace, {})[file_location] = fingerprint + [result]
+        return result
+
+    def store(self):
+        """
+        Stores the cache. Only entries of files that were requested during this run are kept.
+        """
+        store_state(self._state_dir, self._new_cache, "fingerprint_cache")
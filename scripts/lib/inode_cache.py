@@ -0,0 +1,103 @@
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .state import load_state, store_state
+
+try:
+    from config.config import INODE_CACHE_FULL_SWEEP_INTERVAL
+except:
+    INODE_CACHE_FULL_SWEEP_INTERVAL = 30
+
+
+class InodeCache:
+    """
+    Caches results that are derived from a file keyed by its (device, inode) pair and a stamp taken from its metadata
+    (e.g., the change time, which the kernel updates on each content or attribute change and which cannot be set by
+    user space). As long as the stamp of a file does not change, the cached result is used instead of processing the
+    file again. Unlike FingerprintCache, the file location is not part of the key, hence renamed or hard linked files
+    are still found in the cache and the cache is suited for scans of complete filesystems.
+    On average every INODE_CACHE_FULL_SWEEP_INTERVAL runs the cache is ignored and all files are processed again.
+
+    Scans that only process a part of the filesystem per run (e.g., SEARCH_IN_STEPS) keep unused entries until they
+    were not seen during a complete pass. For this, each entry holds the start of the pass it was last used in (its
+    generation), which only changes once per pass. Hence, the stored cache only changes if files change.
+    """
+
+    def __init__(self,
+                 state_dir: str,
+                 state_name: str = "inode_cache",
+                 full_sweep_interval: int = INODE_CACHE_FULL_SWEEP_INTERVAL):
+        self._state_dir = state_dir
+        self._state_name = state_name
+        self._new_cache = {}  # type: Dict[str, List[Any]]
+
+        # The cache is also loaded during a full sweep since unused entries might be kept when it is stored.
+        self._is_full_sweep = full_sweep_interval <= 1 or random.randrange(full_sweep_interval) == 0
+        self._cache = load_state(state_dir, state_name)  # type: Dict[str, List[Any]]
+
+    @property
+    def is_full_sweep(self) -> bool:
+        return self._is_full_sweep
+
+    def is_cached(self, file_stat: os.stat_result, stamp: List[int]) -> bool:
+        """
+        :param file_stat:
+        :param stamp:
+        :return: True if get() would return a cached result for the file
+        """
+        if self._is_full_sweep:
+            return False
+        cached_entry = self._cache.get("%d:%d" % (file_stat.st_dev, file_stat.st_ino))
+        return cached_entry is not None and cached_entry[0] == stamp
+
+    def get(self, file_stat: os.stat_result, stamp: List[int], func: Callable[[], Any]) -> Any:
+        """
+        Gets the result of func() either from the cache or by executing the function.
+
+        :param file_stat: stat result of the file (taken before processing it)
+        :param stamp: values of the metadata the result depends on (e.g., [file_stat.st_ctime_ns])
+        :param func: function that processes the file; its result has to be JSON serializable
+        :return: result of func()
+        """
+        key = "%d:%d" % (file_stat.st_dev, file_stat.st_ino)
+        cached_entry = self._cache.get(key)
+        if not self._is_full_sweep and cached_entry is not None and cached_entry[0] == stamp:
+            result = cached_entry[1]
+        else:
+            result = func()
+
+        self._new_cache[key] = [stamp, result]
+        return result
+
+    def store(self, min_generation: Optional[int] = None, generation: Optional[int] = None):
+        """
+        Stores the cache.
+
+        :param min_generation: if not set, only entries used during this run are kept (without generation);
+        otherwise, unused entries are kept if their generation is at or after the given time (e.g., the start of the
+        last complete pass)
+        :param generation: generation of the entries used during this run (e.g., the start of the current pass;
+        defaults to the current time); only used if min_generation is set
+        """
+        if min_generation is not None:
+            if generation is None:
+                generation = int(time.time())
+
+            for key, new_entry in self._new_cache.items():
+                # Unchanged entries keep their generation if they were already used during the current pass.
+                cached_entry = self._cache.get(key)
+                if (cached_entry is not None
+                        and len(cached_entry) == 3
+                        and cached_entry[2] >= generation
+                        and cached_entry[:2] == new_entry):
+                    new_entry.append(cached_entry[2])
+                else:
+                    new_entry.append(generation)
+
+            for key, cached_entry in self._cache.items():
+                if key not in self._new_cache.keys() and len(cached_entry) == 3 and cached_entry[2] >= min_generation:
+                    self._new_cache[key] = cached_entry
+
+        store_state(self._state_dir, self._new_cache, self._state_name)
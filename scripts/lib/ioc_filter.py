@@ -0,0 +1,269 @@
+import binascii
+import hashlib
+import math
+import mmap
+import os
+import struct
+from typing import Iterable, Optional
+
+from .inode_cache import InodeCache
+from .state import write_file_atomic
+from .util_io import iter_fd_chunks, open_noatime
+
+try:
+    from config.config import IOC_FILTER
+except:
+    IOC_FILTER = None
+
+# The filter file "<prefix>.bloom" starts with a header of IOC_FILTER_HEADER_SIZE bytes
+# (magic, version, number of hash functions, number of bits, number of hashes) followed by the bit array.
+# The hash file "<prefix>.sha256" holds the raw SHA-256 digests sorted in ascending order (32 bytes each).
+IOC_FILTER_MAGIC = b"LSMS-BLOOM"
+IOC_FILTER_VERSION = 1
+IOC_FILTER_HEADER_SIZE = 32
+_HEADER_FORMAT = "<10sBBQQ"
+
+_DIGEST_SIZE = 32
+_CHUNK_SIZE = 65536
+
+
+class IocFilterException(Exception):
+    pass
+
+
+def _get_bit_indexes(digest: bytes, num_hashes: int, num_bits: int) -> Iterable[int]:
+    # SHA-256 digests are uniformly distributed already, hence the indexes are derived from the digest itself
+    # (double hashing) instead of hashing it again.
+    h1 = int.from_bytes(digest[0:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    for i in range(num_hashes):
+        yield (h1 + i * h2) % num_bits
+
+
+def build_ioc_filter(hash_lines: Iterable[str], filter_prefix: str, false_positive_rate: float = 0.0001) -> int:
+    """
+    Builds the filter and hash file from a feed of SHA-256 hashes.
+
+    :param hash_lines: lines of the feed, each starting with a hex encoded SHA-256 hash (e.g., the output of
+    "sha256sum"); empty lines and lines starting with "#" are ignored
+    :param filter_prefix: location of the files without extension
+    :param false_positive_rate: false positive rate of the Bloom filter (before the exact lookup in the hash file)
+    :return: number of distinct hashes
+    """
+    digests = set()
+    for line_number, line in enumerate(hash_lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        hash_hex = line.split()[0].lower()
+        try:
+            digest = binascii.unhexlify(hash_hex)
+        except (binascii.Error, ValueError):
+            digest = b""
+        if len(digest) != _DIGEST_SIZE:
+            raise IocFilterException("Line %d does not start with a SHA-256 hash." % line_number)
+        digests.add(digest)
+
+    sorted_digests = sorted(digests)
+    num_digests = len(sorted_digests)
+
+    # Optimal size of the bit array and number of hash functions for the given false positive rate.
+    num_bits = max(64, int(math.ceil(-max(num_digests, 1) * math.log(false_positive_rate) / (math.log(2) ** 2))))
+    num_bits = (num_bits + 7) // 8 * 8
+    num_hashes = min(32, max(1, int(round(num_bits / max(num_digests, 1) * math.log(2)))))
+
+    bits = bytearray(num_bits // 8)
+    for digest in sorted_digests:
+        for index in _get_bit_indexes(digest, num_hashes, num_bits):
+            bits[index >> 3] |= 1 << (index & 7)
+
+    header = struct.pack(_HEADER_FORMAT, IOC_FILTER_MAGIC, IOC_FILTER_VERSION, num_hashes, num_bits, num_digests)
+    header += b"\x00" * (IOC_FILTER_HEADER_SIZE - len(header))
+
+    # The hash file is written first since the filter file is used to detect if both files exist.
+    write_file_atomic(filter_prefix + ".sha256", b"".join(sorted_digests))
+    write_file_atomic(filter_prefix + ".bloom", header + bytes(bits))
+
+    return num_digests
+
+
+class IocFilter:
+    """
+    Set of known malicious SHA-256 hashes (e.g., from threat intelligence feeds) that is memory mapped instead of
+    loaded. A lookup first checks the Bloom filter, which only touches a few pages and rejects almost all hashes
+    not in the set. The remaining hashes are confirmed by a binary search in the sorted hash file, hence the lookup
+    has no false positives.
+    """
+
+    def __init__(self, filter_prefix: str):
+        self._filter_prefix = filter_prefix
+        self._filter_map = None  # type: Optional[mmap.mmap]
+        self._hash_map = None  # type: Optional[mmap.mmap]
+
+        try:
+            with open(filter_prefix + ".bloom", "rb") as fp:
+                self._filter_map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(filter_prefix + ".sha256", "rb") as fp:
+                hash_stat = os.fstat(fp.fileno())
+                # Empty files can not be mapped.
+                if hash_stat.st_size > 0:
+                    self._hash_map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        except Exception as e:
+            self.close()
+            raise IocFilterException("Unable to load IOC filter '%s': %s" % (filter_prefix, str(e)))
+
+        if len(self._filter_map) < IOC_FILTER_HEADER_SIZE:
+            self.close()
+            raise IocFilterException("IOC filter '%s' is corrupted." % filter_prefix)
+
+        magic, version, num_hashes, num_bits, num_digests = struct.unpack_from(_HEADER_FORMAT, self._filter_map, 0)
+        if magic != IOC_FILTER_MAGIC or version != IOC_FILTER_VERSION:
+            self.close()
+            raise IocFilterException("IOC filter '%s' has an unknown format." % filter_prefix)
+
+        if (len(self._filter_map) != IOC_FILTER_HEADER_SIZE + num_bits // 8
+                or hash_stat.st_size != num_digests * _DIGEST_SIZE):
+            self.close()
+            raise IocFilterException("IOC filter '%s' is corrupted." % filter_prefix)
+
+        self._num_hashes = num_hashes
+        self._num_bits = num_bits
+        self._num_digests = num_digests
+
+        # Changes whenever the filter is built again (used to invalidate results that depend on the filter).
+        self._filter_id = hashlib.sha256(self._filter_map[:IOC_FILTER_HEADER_SIZE]
+                                         + struct.pack("<qQ", hash_stat.st_mtime_ns, hash_stat.st_ino)).hexdigest()
+
+    @property
+    def filter_id(self) -> str:
+        return self._filter_id
+
+    def __len__(self) -> int:
+        return self._num_digests
+
+    def _is_in_hash_file(self, digest: bytes) -> bool:
+        low = 0
+        high = self._num_digests
+        while low < high:
+            middle = (low + high) // 2
+            offset = middle * _DIGEST_SIZE
+            current = self._hash_map[offset:offset + _DIGEST_SIZE]
+            if current == digest:
+                return True
+            if current < digest:
+                low = middle + 1
+            else:
+                high = middle
+        return False
+
+    def contains(self, digest: bytes) -> bool:
+        """
+        :param digest: raw SHA-256 digest
+        :return: True if the hash is in the set
+        """
+        if self._num_digests == 0:
+            return False
+
+        for index in _get_bit_indexes(digest, self._num_hashes, self._num_bits):
+            if not self._filter_map[IOC_FILTER_HEADER_SIZE + (index >> 3)] & (1 << (index & 7)):
+                return False
+
+        return self._is_in_hash_file(digest)
+
+    def close(self):
+        if self._filter_map is not None:
+            self._filter_map.close()
+            self._filter_map = None
+        if self._hash_map is not None:
+            self._hash_map.close()
+            self._hash_map = None
+
+
+def _calculate_fd_hash(fd: int) -> str:
+    file_hash = hashlib.sha256()
+    for chunk in iter_fd_chunks(fd, _CHUNK_SIZE):
+        file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class IocChecker:
+    """
+    Checks files against the IOC filter. The SHA-256 hash of a file is cached by its (device, inode) pair and its
+    ctime, hence an unchanged file is only hashed once while updated feeds are still applied to it.
+    """
+
+    def __init__(self, ioc_filter: IocFilter, hash_cache: InodeCache):
+        self._ioc_filter = ioc_filter
+        self._hash_cache = hash_cache
+
+    @property
+    def filter_id(self) -> str:
+        return self._ioc_filter.filter_id
+
+    def _check_hash(self, file_hash: str) -> Optional[str]:
+        if self._ioc_filter.contains(binascii.unhexlify(file_hash)):
+            return file_hash
+        return None
+
+    def check_file(self, file_location: str, file_stat: os.stat_result) -> Optional[str]:
+        """
+        :param file_location: symlinks are not followed
+        :param file_stat: stat result of the file (taken before reading it)
+        :return: SHA-256 hash of the file if it is a known malicious file, otherwise None
+        """
+        def calculate_hash() -> str:
+            fd = open_noatime(file_location)
+            try:
+                return _calculate_fd_hash(fd)
+            finally:
+                os.close(fd)
+
+        return self._check_hash(self._hash_cache.get(file_stat, [file_stat.st_ctime_ns], calculate_hash))
+
+    def check_fd(self, fd: int) -> Optional[str]:
+        """
+        :param fd: opened file (e.g., /proc/<pid>/exe of a process whose binary was deleted); read from the start
+        :return: SHA-256 hash of the file if it is a known malicious file, otherwise None
+        """
+        def calculate_hash() -> str:
+            os.lseek(fd, 0, os.SEEK_SET)
+            return _calculate_fd_hash(fd)
+
+        file_stat = os.fstat(fd)
+        return self._check_hash(self._hash_cache.get(file_stat, [file_stat.st_ctime_ns], calculate_hash))
+
+    def finish(self, min_generation: Optional[int] = None, generation: Optional[int] = None):
+        """
+        Stores the hash cache and releases the filter.
+
+        :param min_generation: see InodeCache.store()
+        :param generation: see InodeCache.store()
+        """
+        self._hash_cache.store(min_generation, generation)
+        self._ioc_filter.close()
+
+
+def get_ioc_filter_prefix(ioc_filter: Optional[str] = IOC_FILTER) -> Optional[str]:
+    """
+    :param ioc_filter: relative paths are relative to the scripts directory
+    :return: absolute location of the IOC filter files without extension (None if no filter is configured)
+    """
+    if ioc_filter is None:
+        return None
+    if not os.path.isabs(ioc_filter):
+        ioc_filter = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ioc_filter)
+    return ioc_filter
+
+
+def load_ioc_checker(state_dir: str) -> Optional[IocChecker]:
+    """
+    :param state_dir: state directory of the script holding the hash cache
+    :return: checker or None if no IOC filter is configured
+    """
+    filter_prefix = get_ioc_filter_prefix()
+    if filter_prefix is None:
+        return None
+
+    return IocChecker(IocFilter(filter_prefix), InodeCache(state_dir, "hash_cache"))
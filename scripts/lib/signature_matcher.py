@@ -0,0 +1,315 @@
+import binascii
+import collections
+import hashlib
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+from .state import load_state, store_state
+from .util_io import iter_fd_chunks, iter_file_chunks
+
+try:
+    from config.config import SIGNATURE_FILE, SIGNATURE_SCAN_MAX_SIZE
+except:
+    SIGNATURE_FILE = "config/signatures.txt"
+    SIGNATURE_SCAN_MAX_SIZE = 1048576
+
+# Files are read and matched in chunks of this size.
+SIGNATURE_CHUNK_SIZE = 65536
+
+# Version of the compiled form, increased on changes to it so that stored automatons are rebuilt.
+_COMPILED_VERSION = 2
+
+
+class SignatureException(Exception):
+    pass
+
+
+def parse_signatures(data: str) -> List[Tuple[str, bytes]]:
+    """
+    Parses the content of a signature file. Each line has the form "<name>:<pattern>". The pattern is either a
+    literal value (e.g., "xmrig:stratum+tcp://") or a hex string prefixed with "hex:" (e.g., "elf:hex:7f454c46").
+    Multiple patterns can have the same name. Empty lines and lines starting with "#" are ignored.
+
+    :param data:
+    :return: list of (name, pattern) tuples
+    """
+    signatures = []  # type: List[Tuple[str, bytes]]
+    for line_number, line in enumerate(data.split("\n"), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        if ":" not in line:
+            raise SignatureException("Signature in line %d has no name." % line_number)
+        name, pattern = line.split(":", 1)
+        name = name.strip()
+        if not name:
+            raise SignatureException("Signature in line %d has no name." % line_number)
+
+        if pattern.startswith("hex:"):
+            try:
+                pattern_bytes = binascii.unhexlify(pattern[4:].replace(" ", ""))
+            except (binascii.Error, ValueError) as e:
+                raise SignatureException("Signature in line %d is not a valid hex string: %s" % (line_number, str(e)))
+        else:
+            pattern_bytes = pattern.encode("utf-8")
+
+        if not pattern_bytes:
+            raise SignatureException("Signature in line %d has an empty pattern." % line_number)
+        signatures.append((name, pattern_bytes))
+
+    return signatures
+
+
+def _build_prefilter(patterns: List[bytes]) -> Optional[Pattern]:
+    """
+    Builds a regular expression that finds any of the patterns. The patterns are merged into a trie, hence the
+    expression branches on the next byte instead of trying each pattern at each position (a pattern is omitted if
+    a prefix of it is also a pattern since finding the prefix is sufficient).
+
+    :param patterns:
+    :return: compiled expression or None if there are no patterns
+    """
+    if not patterns:
+        return None
+
+    trie = {}  # type: Dict[Optional[int], Any]
+    for pattern in patterns:
+        node = trie
+        for byte in pattern:
+            node = node.setdefault(byte, {})
+        node[None] = True
+
+    def to_expression(node: Dict[Optional[int], Any]) -> bytes:
+        if None in node:
+            return b""
+        branches = [re.escape(bytes([byte])) + to_expression(node[byte]) for byte in sorted(node.keys())]
+        if len(branches) == 1:
+            return branches[0]
+        return b"(?:" + b"|".join(branches) + b")"
+
+    return re.compile(to_expression(trie))
+
+
+class SignatureMatcher:
+    """
+    Matches all signatures at once with an Aho-Corasick automaton. The automaton is built once from the patterns
+    and turned into a deterministic one (the failure links are resolved while building), hence each byte run through
+    it costs a single transition regardless of the number of signatures.
+    Since the automaton runs in Python, each chunk is first searched by a regular expression built from the patterns
+    (see _build_prefilter()), which runs in C in a single pass over the chunk. Only chunks that contain at least one
+    pattern are run through the automaton, which is the case for few chunks of benign files. To find patterns
+    spanning chunk boundaries, each chunk is searched together with the end of the previous one.
+    """
+
+    def __init__(self,
+                 names: List[str],
+                 transitions: List[Dict[int, int]],
+                 outputs: List[Optional[Tuple[int, ...]]],
+                 patterns: List[bytes],
+                 signature_id: str):
+        """
+        Use build() or load_signature_matcher() to create an instance.
+
+        :param names: names of the signatures
+        :param transitions: per state the transitions to states other than the root
+        :param outputs: per state the indexes of the names of the signatures that end in it (None if none end in it)
+        :param patterns: distinct patterns of the signatures
+        :param signature_id: hash of the signatures the automaton was built from
+        """
+        self._names = names
+        self._transitions = transitions
+        self._outputs = outputs
+        self._signature_id = signature_id
+        self._patterns = patterns
+        self._max_pattern_size = max([len(x) for x in patterns] + [0])
+
+        # Patterns that contain another pattern are not needed to check if a chunk contains any pattern.
+        prefilter_patterns = []  # type: List[bytes]
+        for pattern in sorted(patterns, key=len):
+            if not any(x in pattern for x in prefilter_patterns):
+                prefilter_patterns.append(pattern)
+        self._prefilter = _build_prefilter(prefilter_patterns)
+
+    @property
+    def signature_id(self) -> str:
+        return self._signature_id
+
+    @property
+    def names(self) -> List[str]:
+        return self._names
+
+    @staticmethod
+    def build(signatures: List[Tuple[str, bytes]], signature_id: str = "") -> "SignatureMatcher":
+        """
+        Builds the automaton.
+
+        :param signatures: list of (name, pattern) tuples
+        :param signature_id: hash of the signatures (e.g., of the signature file)
+        :return:
+        """
+        names = sorted(set([x[0] for x in signatures]))
+        name_indexes = {name: i for i, name in enumerate(names)}
+
+        # Trie of the patterns.
+        goto = [{}]  # type: List[Dict[int, int]]
+        ends = [set()]  # type: List[Set[int]]
+        for name, pattern in signatures:
+            state = 0
+            for byte in pattern:
+                next_state = goto[state].get(byte)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][byte] = next_state
+                    goto.append({})
+                    ends.append(set())
+                state = next_state
+            ends[state].add(name_indexes[name])
+
+        # Breadth-first over the trie: the transitions of a state are the ones of its failure state overridden by
+        # its own trie edges. Transitions back to the root are not stored.
+        transitions = [dict(goto[0])]  # type: List[Dict[int, int]]
+        transitions.extend([{} for _ in range(len(goto) - 1)])
+        fail = [0] * len(goto)
+        queue = collections.deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions[state] = dict(transitions[fail[state]])
+            for byte, next_state in goto[state].items():
+                fail[next_state] = transitions[fail[state]].get(byte, 0)
+                transitions[state][byte] = next_state
+                queue.append(next_state)
+            ends[state].update(ends[fail[state]])
+
+        outputs = [tuple(sorted(x)) if x else None for x in ends]  # type: List[Optional[Tuple[int, ...]]]
+        patterns = sorted(set([x[1] for x in signatures]))
+        return SignatureMatcher(names, transitions, outputs, patterns, signature_id)
+
+    def to_state(self) -> Dict[str, object]:
+        return {"version": _COMPILED_VERSION,
+                "signature_id": self._signature_id,
+                "names": self._names,
+                "transitions": [sorted(x.items()) for x in self._transitions],
+                "outputs": [list(x) if x is not None else None for x in self._outputs],
+                "patterns": [binascii.hexlify(x).decode("ascii") for x in self._patterns]}
+
+    @staticmethod
+    def from_state(state_data: Dict[str, object]) -> "SignatureMatcher":
+        return SignatureMatcher(state_data["names"],
+                                [{byte: state for byte, state in x} for x in state_data["transitions"]],
+                                [tuple(x) if x is not None else None for x in state_data["outputs"]],
+                                [binascii.unhexlify(x) for x in state_data["patterns"]],
+                                state_data["signature_id"])
+
+    def _match_window(self, window: bytes, found: Set[int]):
+        transitions = self._transitions
+        outputs = self._outputs
+        state = 0
+        for byte in window:
+            state = transitions[state].get(byte, 0)
+            if outputs[state] is not None:
+                found.update(outputs[state])
+
+    def match_chunks(self, chunks: Iterable[bytes]) -> List[str]:
+        """
+        Matches the data given as consecutive chunks.
+
+        :param chunks:
+        :return: sorted names of the signatures found in the data
+        """
+        if self._prefilter is None:
+            return []
+
+        overlap = self._max_pattern_size - 1
+        found = set()  # type: Set[int]
+        tail = b""
+        for chunk in chunks:
+            window = tail + chunk
+            if self._prefilter.search(window) is not None:
+                self._match_window(window, found)
+
+                # Stop as soon as every signature was found.
+                if len(found) == len(self._names):
+                    break
+
+            tail = window[-overlap:] if overlap > 0 else b""
+
+        return [self._names[x] for x in sorted(found)]
+
+    def match(self, data: bytes) -> List[str]:
+        return self.match_chunks([data])
+
+    @staticmethod
+    def get_scan_size(file_size: int, max_size: int = SIGNATURE_SCAN_MAX_SIZE) -> int:
+        """
+        :param file_size:
+        :param max_size: maximal number of bytes read from the file (0 means no limit)
+        :return: number of bytes of a file with the given size that are matched
+        """
+        if max_size > 0:
+            return min(file_size, max_size)
+        return file_size
+
+    def match_file(self, file_location: str, max_size: int = SIGNATURE_SCAN_MAX_SIZE) -> List[str]:
+        """
+        Matches the content of the file (symlinks are not followed).
+
+        :param file_location:
+        :param max_size: maximal number of bytes read from the file (0 means no limit)
+        :return: sorted names of the signatures found in the file
+        """
+        return self.match_chunks(iter_file_chunks(file_location, SIGNATURE_CHUNK_SIZE, max_size))
+
+    def match_fd(self, fd: int, max_size: int = SIGNATURE_SCAN_MAX_SIZE) -> List[str]:
+        """
+        Matches the content of the opened file read in chunks of SIGNATURE_CHUNK_SIZE.
+
+        :param fd:
+        :param max_size: maximal number of bytes read from the file (0 means no limit)
+        :return: sorted names of the signatures found in the file
+        """
+        return self.match_chunks(iter_fd_chunks(fd, SIGNATURE_CHUNK_SIZE, max_size))
+
+
+def load_signature_matcher(state_dir: str, signature_file: str = SIGNATURE_FILE) -> Optional[SignatureMatcher]:
+    """
+    Loads the signatures and returns their matcher. The compiled automaton is stored in the state directory and
+    only built again if the signature file changes.
+
+    :param state_dir: state directory of the script using the matcher
+    :param signature_file: relative paths are relative to the scripts directory
+    :return: matcher or None if the signature file does not contain any signature
+    """
+    if not os.path.isabs(signature_file):
+        signature_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), signature_file)
+
+    try:
+        with open(signature_file, "rb") as fp:
+            data = fp.read()
+
+    except Exception as e:
+        raise SignatureException("Unable to read signature file '%s': %s" % (signature_file, str(e)))
+
+    signature_id = hashlib.sha256(data).hexdigest()
+
+    state_data = load_state(state_dir, "signature_matcher")
+    if state_data.get("version") == _COMPILED_VERSION and state_data.get("signature_id") == signature_id:
+        matcher = SignatureMatcher.from_state(state_data)
+
+    else:
+        try:
+            signatures = parse_signatures(data.decode("utf-8"))
+
+        except UnicodeDecodeError as e:
+            raise SignatureException("Signature file '%s' is not UTF-8 encoded: %s" % (signature_file, str(e)))
+
+        except SignatureException as e:
+            raise SignatureException("Invalid signature file '%s': %s" % (signature_file, str(e)))
+
+        matcher = SignatureMatcher.build(signatures, signature_id)
+        store_state(state_dir, matcher.to_state(), "signature_matcher")
+
+    if not matcher.names:
+        return None
+    return matcher
@@ -1,42 +1,202 @@
+import hashlib
 import json
 import os
 import stat
-from typing import Dict, Any
+import sys
+import tempfile
+import zlib
+from typing import Dict, Any, Iterator, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    from config.config import STATE_COMPRESSION
+except:
+    STATE_COMPRESSION = "zlib"
+
+# The compact state format starts with a single header line "LSMS-STATE <version> <codec>" followed by a
+# compressed stream of newline-separated JSON records of the form [key, value] (one record per top-level key).
+# This allows iterating over the state without decompressing and parsing the whole file at once.
+STATE_MAGIC = b"LSMS-STATE"
+STATE_VERSION = 2
+
+_CHUNK_SIZE = 65536
 
 
 class StateException(Exception):
     pass
 
 
-def load_state(state_dir: str) -> Dict[str, Any]:
-    state_file = os.path.join(state_dir, "state")
+def _intern_keys(pairs) -> Dict[str, Any]:
+    # Paths are used as keys in most states, intern them to not hold the same string multiple times in memory.
+    return {sys.intern(k): v for k, v in pairs}
+
+
+def _get_compressor(codec: str):
+    if codec == "zlib":
+        return zlib.compressobj(9)
+    elif codec == "zstd":
+        if zstandard is None:
+            raise StateException("Python module 'zstandard' needed for state compression 'zstd' is not installed.")
+        return zstandard.ZstdCompressor(level=19).compressobj()
+    elif codec == "none":
+        return None
+    raise StateException("Unknown state compression '%s'." % codec)
+
+
+def _get_decompressor(codec: str):
+    if codec == "zlib":
+        return zlib.decompressobj()
+    elif codec == "zstd":
+        if zstandard is None:
+            raise StateException("Python module 'zstandard' needed for state compression 'zstd' is not installed.")
+        return zstandard.ZstdDecompressor().decompressobj()
+    elif codec == "none":
+        return None
+    raise StateException("Unknown state compression '%s'." % codec)
+
+
+def _iter_records(fp, codec: str) -> Iterator[Tuple[str, Any]]:
+    decompressor = _get_decompressor(codec)
+    remaining = b""
+    while True:
+        chunk = fp.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+        lines = (remaining + chunk).split(b"\n")
+        remaining = lines.pop()
+        for line in lines:
+            key, value = json.loads(line.decode("utf-8"), object_pairs_hook=_intern_keys)
+            yield sys.intern(key), value
+
+    if decompressor is not None and hasattr(decompressor, "flush"):
+        remaining += decompressor.flush()
+    if remaining.strip():
+        raise StateException("State data is truncated.")
+
+
+def _serialize_state(state_data: Dict[str, Any], codec: str) -> bytes:
+    compressor = _get_compressor(codec)
+    data = [b"%s %d %s\n" % (STATE_MAGIC, STATE_VERSION, codec.encode("ascii"))]
+    for key in sorted(state_data.keys()):
+        record = json.dumps([key, state_data[key]], separators=(",", ":"), sort_keys=True).encode("utf-8") + b"\n"
+        if compressor is not None:
+            record = compressor.compress(record)
+        data.append(record)
+    if compressor is not None:
+        data.append(compressor.flush())
+    return b"".join(data)
+
+
+def iter_state(state_dir: str, state_name: str = "state") -> Iterator[Tuple[str, Any]]:
+    """
+    Iterates over the top-level entries of the stored state without loading the whole state file into memory.
+    State files stored in the old plain JSON format are still readable (but have to be parsed as a whole).
+
+    :param state_dir:
+    :param state_name: name of the state file in the state directory
+    :return: iterator over (key, value) tuples
+    """
+    state_file = os.path.join(state_dir, state_name)
+    if not os.path.isfile(state_file):
+        return
+
+    try:
+        with open(state_file, 'rb') as fp:
+            header = fp.readline()
+
+            # Old plain JSON state files are migrated transparently with the next store.
+            if not header.startswith(STATE_MAGIC):
+                data = header + fp.read()
+                for key, value in json.loads(data.decode("utf-8"), object_pairs_hook=_intern_keys).items():
+                    yield key, value
+                return
+
+            header_split = header.strip().split(b" ")
+            if len(header_split) != 3:
+                raise StateException("Unable to parse header '%s'." % header.decode("utf-8", "replace"))
+            version = int(header_split[1])
+            codec = header_split[2].decode("ascii")
+            if version > STATE_VERSION:
+                raise StateException("State format version %d is not supported." % version)
+
+            for key, value in _iter_records(fp, codec):
+                yield key, value
+
+    except Exception as e:
+        raise StateException("State file: '%s'; Exception: '%s'" % (state_file, str(e)))
+
+
+def load_state(state_dir: str, state_name: str = "state") -> Dict[str, Any]:
     state_data = {}
-    if os.path.isfile(state_file):
-        data = None
+    for key, value in iter_state(state_dir, state_name):
+        state_data[key] = value
+    return state_data
+
+
+def _calculate_file_digest(file_location: str) -> bytes:
+    file_hash = hashlib.sha256()
+    with open(file_location, 'rb') as fp:
+        chunk = fp.read(_CHUNK_SIZE)
+        while chunk:
+            file_hash.update(chunk)
+            chunk = fp.read(_CHUNK_SIZE)
+    return file_hash.digest()
+
+
+def write_file_atomic(file_location: str, data: bytes) -> bool:
+    """
+    Writes the given data to the file by writing a temporary file first and replacing the file afterwards.
+    Hence, the file either contains the old or the new data even if the process crashes while writing.
+    If the file already contains the given data, nothing is written.
+
+    :param file_location:
+    :param data:
+    :return: True if the file was written, False if it already contained the data
+    """
+    if os.path.isfile(file_location):
         try:
-            with open(state_file, 'rt') as fp:
-                data = fp.read()
-            if data is None:
-                raise StateException("Read state data is None.")
+            if _calculate_file_digest(file_location) == hashlib.sha256(data).digest():
+                return False
 
-            state_data = json.loads(data)
+        except OSError:
+            pass
 
-        except Exception as e:
-            raise StateException("State data: '%s'; Exception: '%s'" % (str(data), str(e)))
+    file_dir = os.path.dirname(file_location)
+    fd, temp_file = tempfile.mkstemp(dir=file_dir, prefix=".%s." % os.path.basename(file_location))
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.chmod(temp_file, stat.S_IREAD | stat.S_IWRITE)
+        os.replace(temp_file, file_location)
 
-    return state_data
+    except Exception:
+        os.unlink(temp_file)
+        raise
+
+    # Persist the rename itself.
+    dir_fd = os.open(file_dir, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
 
+    return True
 
-def store_state(state_dir: str, state_data: Dict[str, Any]):
+
+def store_state(state_dir: str, state_data: Dict[str, Any], state_name: str = "state"):
     # Create state dir if it does not exist.
     if not os.path.exists(state_dir):
         os.makedirs(state_dir)
 
-    state_file = os.path.join(state_dir, "state")
-
-    with open(state_file, 'wt') as fp:
-        fp.write(json.dumps(state_data))
-
-    os.chmod(state_file, stat.S_IREAD | stat.S_IWRITE)
-
+    state_file = os.path.join(state_dir, state_name)
 
+    # The serialization is deterministic (sorted keys), hence an unchanged state is not written again.
+    write_file_atomic(state_file, _serialize_state(state_data, STATE_COMPRESSION))
@@ -1,13 +1,23 @@
 import os
-import json
-import stat
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Callable, Iterator, List, Optional, Set, Tuple
 
-from .state import StateException
+from .state import StateException, load_state, store_state
 from .util_file import FileLocation
+from .util_walk import walk_entries_ordered
+
+try:
+    from config.config import START_PROCESS_TIMEOUT
+except:
+    START_PROCESS_TIMEOUT = 60
+
+# Interval in seconds in which the cursor is handed to the checkpoint function of a step-wise walk.
+STEP_CHECKPOINT_INTERVAL = 10
 
 
 class StepLocation(FileLocation):
+    __slots__ = ("_search_recursive",)
+
     def __init__(self, location: str, search_recursive: bool):
         super().__init__(location)
         self._search_recursive = search_recursive
@@ -22,33 +32,159 @@ class StepStateException(StateException):
         super().__init__(msg)
 
 
-def load_step_state(state_dir: str) -> Dict[str, Any]:
-    state_file = os.path.join(state_dir, "step_state")
-    state_data = {"next_step": 0}
-    if os.path.isfile(state_file):
-        data = None
-        try:
-            with open(state_file, 'rt') as fp:
-                data = fp.read()
-            if data is None:
-                raise StepStateException("Read state data is None.")
+def get_step_time_budget(time_budget: Optional[float]) -> float:
+    """
+    :param time_budget: configured time budget in seconds (None for the default)
+    :return: time budget of a step; defaults to half of START_PROCESS_TIMEOUT so that the search finishes and stores
+    its cursor before "start_search.py" kills the script
+    """
+    if time_budget is None:
+        return START_PROCESS_TIMEOUT / 2
+    return time_budget
+
+
+def iter_step_entries(state_data: Dict[str, Any],
+                      locations: List[str],
+                      time_budget: float,
+                      one_filesystem: bool = False,
+                      skip_locations: Optional[Set[str]] = None,
+                      checkpoint_func: Optional[Callable[[], None]] = None) -> Iterator[os.DirEntry]:
+    """
+    Walks the given locations starting at the cursor stored in the step state and yields their entries until the
+    time budget is exhausted. The cursor is the location and the path of the last processed entry, hence the next
+    execution resumes at exactly this position (even if directories were added or removed in the meantime).
+    The state data is updated with the new cursor and the coverage statistics while iterating.
+
+    :param state_data: step state as returned by load_step_state()
+    :param locations: directories to walk
+    :param time_budget: time in seconds after which the walk stops (the entry currently processed is finished)
+    :param one_filesystem: do not descend into directories on other devices (mount points)
+    :param skip_locations: directories that are not descended into (e.g., mount points)
+    :param checkpoint_func: called every STEP_CHECKPOINT_INTERVAL seconds after the cursor was updated (e.g., to
+    store the step state in case the script is killed before the walk finishes)
+    :return: iterator over the entries
+    """
+    deadline = time.monotonic() + time_budget
+    next_checkpoint = time.monotonic() + STEP_CHECKPOINT_INTERVAL
+
+    cursor = state_data["cursor"]
+    if cursor is not None and cursor["location"] not in locations:
+        cursor = None
+
+    # Start a new pass over all locations.
+    if cursor is None or state_data["pass_started"] is None:
+        cursor = None
+        state_data["pass_started"] = int(time.time())
+        state_data["pass_entries"] = 0
+
+    start_index = 0
+    if cursor is not None:
+        start_index = locations.index(cursor["location"])
+
+        # Location of the cursor was already completely processed.
+        if cursor["path"] is None:
+            start_index += 1
+            cursor = None
+
+    for location in locations[start_index:]:
+        resume_after = None
+        if cursor is not None and cursor["location"] == location:
+            resume_after = tuple(cursor["path"])
+
+        for entry, key in walk_entries_ordered(location, resume_after, one_filesystem, skip_locations):
+            yield entry
+
+            state_data["cursor"] = {"location": location, "path": list(key)}
+            state_data["pass_entries"] += 1
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            if checkpoint_func is not None and now >= next_checkpoint:
+                checkpoint_func()
+                next_checkpoint = now + STEP_CHECKPOINT_INTERVAL
+
+        # Location completely processed, the next one starts at its beginning.
+        cursor = None
+        state_data["cursor"] = {"location": location, "path": None}
+
+    # All locations were processed, hence everything existing at the start of the pass was covered.
+    now = int(time.time())
+    state_data["last_full_coverage"] = state_data["pass_started"]
+    state_data["last_full_coverage_duration"] = now - state_data["pass_started"]
+    state_data["last_full_coverage_entries"] = state_data["pass_entries"]
+    state_data["cursor"] = None
+    state_data["pass_started"] = None
+
+
+def get_step_generations(state_data: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Generations for caches of a step-wise search (see InodeCache.store()) after the walk of this execution.
+
+    :param state_data: step state as returned by load_step_state()
+    :return: tuple of the start of the last complete pass (unused entries seen since then are kept) and the start of
+    the current pass (generation of the used entries)
+    """
+    min_generation = state_data["last_full_coverage"] or 0
+    generation = state_data["pass_started"]
+
+    # The pass was completed during this execution.
+    if generation is None:
+        generation = min_generation
+    return min_generation, generation
+
+
+def get_step_coverage(state_data: Dict[str, Any]) -> str:
+    """
+    :param state_data: step state as returned by load_step_state()
+    :return: human readable coverage statistics of the step state
+    """
+    def format_time(timestamp: int) -> str:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+    lines = []
+    if state_data["last_full_coverage"] is None:
+        lines.append("Last full coverage: never")
+    else:
+        lines.append("Last full coverage: pass started %s (took %d seconds; %d entries)"
+                     % (format_time(state_data["last_full_coverage"]),
+                        state_data["last_full_coverage_duration"],
+                        state_data["last_full_coverage_entries"]))
+
+    if state_data["pass_started"] is None:
+        lines.append("Current pass: not started")
+    else:
+        position = "-"
+        cursor = state_data["cursor"]
+        if cursor is not None:
+            position = cursor["location"]
+            if cursor["path"] is not None:
+                position = os.path.join(cursor["location"], *cursor["path"])
+        lines.append("Current pass: started %s (%d entries processed; position: %s)"
+                     % (format_time(state_data["pass_started"]), state_data["pass_entries"], position))
+
+    return "\n".join(lines)
 
-            state_data = json.loads(data)
 
-        except Exception as e:
-            raise StepStateException("State data: '%s'; Exception: '%s'" % (str(data), str(e)))
+def load_step_state(state_dir: str) -> Dict[str, Any]:
+    state_data = {"cursor": None,
+                  "pass_started": None,
+                  "pass_entries": 0,
+                  "last_full_coverage": None,
+                  "last_full_coverage_duration": 0,
+                  "last_full_coverage_entries": 0,
+                  "mount_cache": {}}
+    try:
+        state_data.update(load_state(state_dir, "step_state"))
+
+    except Exception as e:
+        raise StepStateException(str(e))
+
+    # Index of the step-wise search used by older versions.
+    if "next_step" in state_data.keys():
+        del state_data["next_step"]
 
     return state_data
 
 
 def store_step_state(state_dir: str, state_data: Dict[str, Any]):
-    # Create state dir if it does not exist.
-    if not os.path.exists(state_dir):
-        os.makedirs(state_dir)
-
-    state_file = os.path.join(state_dir, "step_state")
-
-    with open(state_file, 'wt') as fp:
-        fp.write(json.dumps(state_data))
-
-    os.chmod(state_file, stat.S_IREAD | stat.S_IWRITE)
+    store_state(state_dir, state_data, "step_state")
@@ -0,0 +1,212 @@
+import os
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .util_io import read_file_header
+from .util_mount import ScanLocation, get_scan_locations
+from .util_scan import DeviceScanScheduler
+from .util_walk import walk_entries
+
+
+def _is_at_or_below(location: str, directory: str) -> bool:
+    return location == directory or directory == "/" or location.startswith(directory + "/")
+
+
+class EntryContext:
+    """
+    Directory entry that is checked by the detectors. Information that is expensive to get (stat result, header of
+    the file) is retrieved once on first use and shared by all detectors.
+    """
+
+    __slots__ = ("_entry", "_header_size", "_stat", "_header")
+
+    def __init__(self, entry: os.DirEntry, header_size: int):
+        self._entry = entry
+        self._header_size = header_size
+        self._stat = None  # type: Optional[os.stat_result]
+        self._header = None  # type: Optional[bytes]
+
+    @property
+    def entry(self) -> os.DirEntry:
+        return self._entry
+
+    @property
+    def path(self) -> str:
+        return self._entry.path
+
+    @property
+    def stat(self) -> os.stat_result:
+        if self._stat is None:
+            self._stat = self._entry.stat(follow_symlinks=False)
+        return self._stat
+
+    @property
+    def header(self) -> bytes:
+        """
+        First bytes of the regular file (as many as the detector needing the most requested).
+        """
+        if self._header is None:
+            self._header = read_file_header(self._entry.path, self._header_size)
+        return self._header
+
+
+class Detector:
+    """
+    Base class of the checks that are run on each entry of a filesystem traversal. A detector belongs to a search
+    script and its results are processed (whitelists, findings) by this script.
+    """
+
+    # Name of the detector (e.g., the name of the search script it belongs to).
+    name = ""
+
+    # Number of bytes of the file header the detector needs.
+    header_size = 0
+
+    def __init__(self, locations: List[str], mount_ids: Optional[Set[int]] = None):
+        """
+        :param locations: directories the detector searches in
+        :param mount_ids: if set, the detector only searches in the mounts with these ids
+        """
+        self._locations = [os.path.normpath(os.path.abspath(x)) for x in locations]
+        self._mount_ids = mount_ids
+
+    @property
+    def locations(self) -> List[str]:
+        return self._locations
+
+    @property
+    def cache_id(self) -> str:
+        """
+        Identifies the results of the detector in the cache of read-only filesystems. Detectors whose results depend
+        on more than the entries (e.g., on the loaded signatures) have to include this in the id.
+        """
+        return self.name
+
+    def get_coverage(self, scan_location: ScanLocation) -> Optional[bool]:
+        """
+        :param scan_location:
+        :return: True if the detector checks all entries of the scan location, False if it only checks some of them
+        (the scan location contains one of its locations) and None if it does not check any of them
+        """
+        if self._mount_ids is not None and scan_location.mount.mount_id not in self._mount_ids:
+            return None
+        if any(_is_at_or_below(scan_location.location, x) for x in self._locations):
+            return True
+        if any(_is_at_or_below(x, scan_location.location) for x in self._locations):
+            return False
+        return None
+
+    def is_covered(self, file_location: str) -> bool:
+        return any(_is_at_or_below(file_location, x) for x in self._locations)
+
+    def check(self, context: EntryContext) -> Optional[Any]:
+        """
+        Checks a single entry. OSErrors (e.g., the file vanished) are handled by the caller.
+
+        :param context:
+        :return: JSON serializable result if the entry is suspicious, otherwise None
+        """
+        raise NotImplementedError("Abstract class.")
+
+    def finish(self):
+        """
+        Called after the traversal finished (e.g., to store caches of the detector).
+        """
+        pass
+
+
+class TraversalEngine:
+    """
+    Walks the union of the locations of all registered detectors once and runs all detectors on each entry.
+    Directory listings, stat calls and reads of file headers are shared by the detectors.
+    """
+
+    def __init__(self, detectors: List[Detector]):
+        self._detectors = detectors
+        self._header_size = max([x.header_size for x in detectors] + [0])
+
+    def check_entry(self, entry: os.DirEntry, detectors: List[Detector], results: Dict[str, List[Any]]):
+        context = EntryContext(entry, self._header_size)
+        for detector in detectors:
+            try:
+                result = detector.check(context)
+
+            # File vanished or is not accessible.
+            except OSError:
+                continue
+
+            if result is not None:
+                results[detector.name].append(result)
+
+    def scan(self, scan_location: ScanLocation) -> Dict[str, List[Any]]:
+        """
+        Walks a single scan location.
+
+        :param scan_location:
+        :return: dictionary with the detector name as key and the list of its results as value
+        """
+        results = {x.name: [] for x in self._detectors}  # type: Dict[str, List[Any]]
+        full_detectors = []  # type: List[Detector]
+        partial_detectors = []  # type: List[Detector]
+        for detector in self._detectors:
+            coverage = detector.get_coverage(scan_location)
+            if coverage is True:
+                full_detectors.append(detector)
+            elif coverage is False:
+                partial_detectors.append(detector)
+
+        if not full_detectors and not partial_detectors:
+            return results
+
+        for entry in walk_entries(scan_location.location,
+                                  scan_location.search_recursive,
+                                  False,
+                                  scan_location.skip_locations):
+            detectors = full_detectors
+            if partial_detectors:
+                detectors = full_detectors + [x for x in partial_detectors if x.is_covered(entry.path)]
+            self.check_entry(entry, detectors, results)
+
+        return results
+
+    def run(self,
+            mount_cache: Dict[str, Any],
+            error_func: Callable[[str], None],
+            stay_on_filesystem: bool = False) -> Dict[str, List[Any]]:
+        """
+        Walks all locations of the detectors. The locations are split by the mounts they contain and processed in
+        parallel (grouped by the device they are stored on). The results of read-only filesystems are cached.
+
+        :param mount_cache: cache of the results of read-only filesystems (e.g., from a stored state)
+        :param error_func: function that reports the error message of a location that could not be searched
+        (the results of the other locations are still returned)
+        :param stay_on_filesystem: do not search mounts located below the locations of the detectors
+        :return: dictionary with the detector name as key and the list of its results as value
+        """
+        # Cached results are only valid for the same set of detectors.
+        namespace = ",".join(sorted([x.cache_id for x in self._detectors]))
+        for key in list(mount_cache.keys()):
+            if key != namespace:
+                del mount_cache[key]
+        cache = mount_cache.setdefault(namespace, {})
+
+        # Locations below other locations are searched as part of them.
+        all_locations = set()  # type: Set[str]
+        for detector in self._detectors:
+            all_locations.update(detector.locations)
+        locations = sorted([x for x in all_locations
+                            if not any(x != y and _is_at_or_below(x, y) for y in all_locations)])
+
+        results = {x.name: [] for x in self._detectors}  # type: Dict[str, List[Any]]
+        # The mounts of the merged locations are still searched even if their filesystem types are skipped by the
+        # policy (e.g., /dev/mqueue below /), the same as when their detectors run on their own.
+        scan_locations = get_scan_locations(locations, stay_on_filesystem, sorted(all_locations))
+        for location_results in DeviceScanScheduler().run_cached(scan_locations, self.scan, error_func, cache):
+            if location_results is None:
+                continue
+            for name, detector_results in location_results.items():
+                results[name].extend(detector_results)
+
+        for detector in self._detectors:
+            detector.finish()
+
+        return results
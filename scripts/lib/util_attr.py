@@ -0,0 +1,76 @@
+import errno
+import fcntl
+import os
+import struct
+
+from .util_io import open_noatime
+
+# _IOR('f', 1, long) from linux/fs.h (the kernel reads and writes an int nevertheless).
+FS_IOC_GETFLAGS = (2 << 30) | (struct.calcsize("l") << 16) | (ord("f") << 8) | 1
+
+FS_IMMUTABLE_FL = 0x00000010
+FS_APPEND_FL = 0x00000020
+
+# Flags in the order and with the letters used by lsattr.
+_FLAG_LETTERS = [(0x00000001, "s"),
+                 (0x00000002, "u"),
+                 (0x00000008, "S"),
+                 (0x00010000, "D"),
+                 (FS_IMMUTABLE_FL, "i"),
+                 (FS_APPEND_FL, "a"),
+                 (0x00000040, "d"),
+                 (0x00000080, "A"),
+                 (0x00000004, "c"),
+                 (0x00000800, "E"),
+                 (0x00004000, "j"),
+                 (0x00001000, "I"),
+                 (0x00008000, "t"),
+                 (0x00020000, "T"),
+                 (0x00080000, "e"),
+                 (0x00800000, "C"),
+                 (0x02000000, "x"),
+                 (0x40000000, "F"),
+                 (0x10000000, "N"),
+                 (0x20000000, "P"),
+                 (0x00100000, "V"),
+                 (0x00000400, "m")]
+
+# Errors signaling that the filesystem does not support inode flags.
+_UNSUPPORTED_ERRNOS = {errno.ENOTTY, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS}
+
+
+def get_inode_flags(file_location: str, is_dir: bool = False) -> int:
+    """
+    Reads the inode flags (as shown by lsattr) of a regular file or directory with the FS_IOC_GETFLAGS ioctl.
+
+    :param file_location:
+    :param is_dir: the location is a directory
+    :return: inode flags (0 if the filesystem does not support them)
+    """
+    flags = os.O_RDONLY
+    if is_dir:
+        flags |= os.O_DIRECTORY
+
+    fd = open_noatime(file_location, flags)
+    try:
+        # Use a buffer of the size of a long in case the kernel writes one.
+        buffer = bytearray(struct.calcsize("l"))
+        fcntl.ioctl(fd, FS_IOC_GETFLAGS, buffer)
+
+    except OSError as e:
+        if e.errno in _UNSUPPORTED_ERRNOS:
+            return 0
+        raise
+
+    finally:
+        os.close(fd)
+
+    return struct.unpack_from("I", buffer)[0]
+
+
+def format_inode_flags(flags: int) -> str:
+    """
+    :param flags:
+    :return: inode flags in the format of lsattr (e.g., "----i---------e-------")
+    """
+    return "".join([letter if flags & flag else "-" for flag, letter in _FLAG_LETTERS])
@@ -0,0 +1,76 @@
+import collections
+import math
+from typing import Iterable, List
+
+from .util_io import iter_file_chunks
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from config.config import ENTROPY_BLOCK_SIZE, ENTROPY_MAX_SIZE
+except:
+    ENTROPY_BLOCK_SIZE = 65536
+    ENTROPY_MAX_SIZE = 1048576
+
+# Blocks with a higher entropy (bits per byte) are likely compressed or encrypted.
+HIGH_ENTROPY_THRESHOLD = 7.2
+
+
+def _get_byte_counts(data: bytes) -> Iterable[int]:
+    if numpy is not None:
+        return numpy.bincount(numpy.frombuffer(data, dtype=numpy.uint8), minlength=256).tolist()
+
+    # Counter builds the histogram in a single pass in C (faster than 256 passes of bytes.count() over the data).
+    return collections.Counter(data).values()
+
+
+def calculate_entropy(data: bytes) -> float:
+    """
+    Calculates the Shannon entropy of the data from its byte histogram.
+
+    :param data:
+    :return: entropy in bits per byte (0.0 to 8.0)
+    """
+    size = len(data)
+    if size == 0:
+        return 0.0
+
+    entropy = 0.0
+    for count in _get_byte_counts(data):
+        if count:
+            probability = count / size
+            entropy -= probability * math.log2(probability)
+    return entropy
+
+
+def get_entropy_profile(file_location: str,
+                        block_size: int = ENTROPY_BLOCK_SIZE,
+                        max_size: int = ENTROPY_MAX_SIZE) -> List[float]:
+    """
+    Calculates the entropy of each block of the file (symlinks are not followed).
+
+    :param file_location:
+    :param block_size:
+    :param max_size: maximal number of bytes read from the file
+    :return: entropy of each block rounded to two decimal places (the last block might be smaller)
+    """
+    return [round(calculate_entropy(x), 2) for x in iter_file_chunks(file_location, block_size, max_size)]
+
+
+def format_entropy_profile(profile: List[float]) -> str:
+    """
+    :param profile: see get_entropy_profile()
+    :return: readable description of the profile
+    """
+    if not profile:
+        return "empty"
+
+    description = "max %.2f (per %d KiB block: %s)" % (max(profile),
+                                                        ENTROPY_BLOCK_SIZE // 1024,
+                                                        " ".join(["%.2f" % x for x in profile]))
+    if max(profile) >= HIGH_ENTROPY_THRESHOLD:
+        description += ", likely packed or encrypted"
+    return description
@@ -1,99 +1,164 @@
 import os
+import sys
 
-from typing import List
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from .util_whitelist import PatternWhitelist, is_pattern_entry
 
 
 class FileLocation:
     """
-    Class that stores a location of a file or directory.
+    Class that stores a location of a file or directory. Since scans can create hundreds of thousands of
+    instances, the class uses __slots__ and stores the directory part of the location as interned string
+    (files in the same directory share it).
     """
 
+    __slots__ = ("_dir", "_name")
+
     def __init__(self, location: str):
-        self._location = location
+        directory, separator, name = location.rpartition(os.sep)
+        self._dir = sys.intern(directory + separator)
+        self._name = name
 
     @property
     def location(self) -> str:
-        return self._location
+        return self._dir + self._name
+
+
+def _split_path(path: str) -> List[str]:
+    return [x for x in os.path.normpath(path).split(os.sep) if x]
+
+
+class DirectoryWhitelist:
+    """
+    Prefix trie over the path components of whitelisted directories. It is built once and can be reused
+    to check files in O(depth of the file path). Entries can also be patterns (see PatternWhitelist) that are
+    matched against the directory of the file and its parent directories.
+    """
+
+    def __init__(self, dir_whitelist: List[FileLocation]):
+        self._is_empty = not dir_whitelist
+        self._pattern_whitelist = PatternWhitelist([x.location for x in dir_whitelist if is_pattern_entry(x.location)])
 
+        # Each node is a dictionary from path component to child node. The None key marks a whitelisted directory.
+        self._root = {}  # type: Dict[Optional[str], Any]
+        for whitelist_entry in dir_whitelist:
+            if is_pattern_entry(whitelist_entry.location):
+                continue
+            node = self._root
+            for component in _split_path(whitelist_entry.location):
+                node = node.setdefault(component, {})
+            node[None] = True
+
+    @property
+    def is_empty(self) -> bool:
+        return self._is_empty
 
-def apply_directory_whitelist(dir_whitelist: List[FileLocation], files: List[FileLocation]) -> List[FileLocation]:
+    def _is_pattern_whitelisted(self, file_location: str) -> bool:
+        path = os.path.dirname(os.path.normpath(file_location))
+        while True:
+            if self._pattern_whitelist.is_whitelisted(path):
+                return True
+            parent = os.path.dirname(path)
+            if parent == path:
+                return False
+            path = parent
+
+    def is_whitelisted(self, file_location: str) -> bool:
+        # NOTE: this check also works if "/" is whitelisted, since the root node is marked as whitelisted then.
+        node = self._root
+        if None in node:
+            return True
+        for component in _split_path(os.path.dirname(os.path.normpath(file_location))):
+            node = node.get(component)
+            if node is None:
+                break
+            if None in node:
+                return True
+        if self._pattern_whitelist.has_patterns:
+            return self._is_pattern_whitelisted(file_location)
+        return False
+
+
+def apply_directory_whitelist(dir_whitelist: Union[List[FileLocation], DirectoryWhitelist],
+                              files: List[FileLocation]) -> List[FileLocation]:
     """
     Applies a whitelist containing directories to the given file list. The whitelist contains directories
     that are considered whitelisted. If the whitelist contains the directory "/home" then all files
     stored in "/home" are removed from the result (e.g., "/home/user/test.txt").
 
-    :param dir_whitelist:
+    :param dir_whitelist: list of directories or an already built whitelist (to reuse it for multiple calls)
     :param files:
     :return: list of files that do not match whitelist
     """
-    if not dir_whitelist:
+    if not isinstance(dir_whitelist, DirectoryWhitelist):
+        dir_whitelist = DirectoryWhitelist(dir_whitelist)
+
+    if dir_whitelist.is_empty:
         return files
 
-    # Extract the components of the whitelist paths (pre-process it to reduces processing steps).
-    whitelist_path_components_list = []
-    for whitelist_entry in dir_whitelist:
-        whitelist_path = os.path.normpath(whitelist_entry.location)
-        whitelist_path_components = []
-        while True:
-            whitelist_path, component = os.path.split(whitelist_path)
-            if not component:
-                break
-            whitelist_path_components.insert(0, component)
-        whitelist_path_components_list.append(whitelist_path_components)
+    return [x for x in files if not dir_whitelist.is_whitelisted(x.location)]
 
-    new_files = []
-    for file in files:
-        is_whitelisted = False
 
-        # Extract the components of the path to the file.
-        path = os.path.dirname(os.path.normpath(file.location))
-        path_components = []
-        while True:
-            path, component = os.path.split(path)
-            if not component:
-                break
-            path_components.insert(0, component)
+class FileWhitelist:
+    """
+    Set of the (device, inode) pairs of whitelisted files. It is built once (stat'ing each whitelisted file only once)
+    and can be reused to check files with a single stat call each. Whitelisted files that do not exist are ignored.
+    Entries can also be patterns (see PatternWhitelist) that are matched against the location of the file.
+    """
 
-        for whitelist_path_components in whitelist_path_components_list:
+    def __init__(self, file_whitelist: List[FileLocation]):
+        self._is_empty = not file_whitelist
+        self._pattern_whitelist = PatternWhitelist([x.location for x in file_whitelist if is_pattern_entry(x.location)])
+        self._inodes = set()  # type: Set[Tuple[int, int]]
+        for whitelist_file in file_whitelist:
+            if is_pattern_entry(whitelist_file.location):
+                continue
+            try:
+                file_stat = os.stat(whitelist_file.location)
 
-            # Skip case such as "whitelist: /usr/local/bin" and "file path: /usr"
-            if len(whitelist_path_components) > len(path_components):
+            except OSError:
                 continue
 
-            # NOTE: this check also works if "/" is whitelisted, since the whitelist components are empty and
-            # thus the file is counted as whitelisted.
-            is_whitelisted = True
-            for i in range(len(whitelist_path_components)):
-                if whitelist_path_components[i] != path_components[i]:
-                    is_whitelisted = False
-            if is_whitelisted:
-                break
+            self._inodes.add((file_stat.st_dev, file_stat.st_ino))
 
-        if not is_whitelisted:
-            new_files.append(file)
-    return new_files
+    @property
+    def is_empty(self) -> bool:
+        return self._is_empty
 
+    def is_whitelisted(self, file_location: str) -> bool:
+        if self._pattern_whitelist.is_whitelisted(file_location):
+            return True
 
-def apply_file_whitelist(file_whitelist: List[FileLocation], files: List[FileLocation]) -> List[FileLocation]:
+        # No stat call needed if there are no (existing) whitelisted files.
+        if not self._inodes:
+            return False
+
+        # A file that can not be stat'ed (e.g., it was deleted in the meantime) is not whitelisted.
+        try:
+            file_stat = os.stat(file_location)
+
+        except OSError:
+            return False
+
+        return (file_stat.st_dev, file_stat.st_ino) in self._inodes
+
+
+def apply_file_whitelist(file_whitelist: Union[List[FileLocation], FileWhitelist],
+                         files: List[FileLocation]) -> List[FileLocation]:
     """
     Applies a whitelist containing files to the given file list. The whitelist contains files
     that are considered whitelisted. If the whitelist contains the file "/home/user/test.txt" than all occurrences of
     this file in the file list will be removed.
 
-    :param file_whitelist:
+    :param file_whitelist: list of files or an already built whitelist (to reuse it for multiple calls)
     :param files:
     :return: list of files that do not match whitelist
     """
-    if not file_whitelist:
+    if not isinstance(file_whitelist, FileWhitelist):
+        file_whitelist = FileWhitelist(file_whitelist)
+
+    if file_whitelist.is_empty:
         return files
 
-    new_files = []
-    for file in files:
-        is_whitelisted = False
-        for whitelist_file in file_whitelist:
-            if os.path.samefile(file.location, whitelist_file.location):
-                is_whitelisted = True
-                break
-        if not is_whitelisted:
-            new_files.append(file)
-    return new_files
+    return [x for x in files if not file_whitelist.is_whitelisted(x.location)]
@@ -0,0 +1,56 @@
+import struct
+from typing import Optional
+
+# Number of bytes of the file header needed to classify a file.
+FILETYPE_HEADER_SIZE = 128
+
+_ELF_TYPES = {1: "relocatable", 2: "executable", 3: "shared object", 4: "core"}
+
+# Magic bytes of executable formats other than ELF and scripts.
+_MAGICS = [(b"\xfe\xed\xfa\xce", "Mach-O"),
+           (b"\xce\xfa\xed\xfe", "Mach-O"),
+           (b"\xfe\xed\xfa\xcf", "Mach-O 64-bit"),
+           (b"\xcf\xfa\xed\xfe", "Mach-O 64-bit"),
+           (b"\xca\xfe\xba\xbe", "Mach-O universal binary or Java class"),
+           (b"\x00asm", "WebAssembly"),
+           (b"MZ", "DOS/PE executable")]
+
+
+def _get_elf_type(header: bytes) -> str:
+    if len(header) < 18:
+        return "ELF"
+
+    # EI_DATA (byte 5) gives the byte order of the e_type field.
+    byte_order = "<" if header[5] == 1 else ">"
+    e_type = struct.unpack_from(byte_order + "H", header, 16)[0]
+    if e_type in _ELF_TYPES.keys():
+        return "ELF %s" % _ELF_TYPES[e_type]
+    return "ELF"
+
+
+def _get_script_type(header: bytes) -> str:
+    # Interpreter is given by the first line (e.g., "#!/usr/bin/env python3").
+    interpreter = header[2:].split(b"\n", 1)[0].strip()
+    if not interpreter:
+        return "script"
+    return "script (%s)" % interpreter.decode("utf-8", "replace")
+
+
+def get_executable_type(header: bytes) -> Optional[str]:
+    """
+    Classifies a file by the first bytes of its content (see FILETYPE_HEADER_SIZE) into executable formats.
+
+    :param header:
+    :return: description of the executable format or None if the file is not executable
+    """
+    if header[:4] == b"\x7fELF":
+        return _get_elf_type(header)
+
+    if header[:2] == b"#!":
+        return _get_script_type(header)
+
+    for magic, description in _MAGICS:
+        if header[:len(magic)] == magic:
+            return description
+
+    return None
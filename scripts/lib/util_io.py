@@ -0,0 +1,175 @@
+import os
+import shutil
+import threading
+import time
+from typing import Iterator, Optional
+
+try:
+    from config.config import IO_RATE_LIMIT, IO_DROP_PAGE_CACHE, IO_IDLE_PRIORITY
+except:
+    IO_RATE_LIMIT = 0
+    IO_DROP_PAGE_CACHE = True
+    IO_IDLE_PRIORITY = True
+
+
+class TokenBucket:
+    """
+    Limits the rate of an operation (e.g., the number of bytes read per second). Each operation takes tokens from
+    the bucket, which is refilled at the given rate up to its capacity. If the bucket is empty, the operation has to
+    wait until the tokens it took are refilled. The bucket can be shared by multiple threads.
+    """
+
+    def __init__(self, rate: int, capacity: Optional[int] = None):
+        """
+        :param rate: tokens per second (0 means no limit)
+        :param capacity: maximal number of tokens that can be taken at once without waiting (defaults to the rate)
+        """
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else rate
+        self._tokens = float(self._capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int):
+        """
+        Takes the given number of tokens and waits if not enough tokens are available.
+
+        :param amount:
+        """
+        if self._rate <= 0:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self._capacity), self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+
+            # The tokens are taken even if not available, the bucket is in debt until they are refilled.
+            # Hence, concurrent threads wait in the order they took tokens.
+            self._tokens -= amount
+            wait_time = -self._tokens / self._rate if self._tokens < 0 else 0.0
+
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+# Shared by all reads of the process (see IO_RATE_LIMIT).
+_io_bucket = TokenBucket(IO_RATE_LIMIT)
+
+
+def open_noatime(file_location: str, flags: int = os.O_RDONLY, follow_symlinks: bool = False) -> int:
+    """
+    Opens the file without updating its access time if permitted (O_NOATIME is only allowed for the owner of the
+    file or with CAP_FOWNER) and without following symlinks or blocking (e.g., if the file was replaced by a FIFO).
+
+    :param file_location:
+    :param flags:
+    :param follow_symlinks:
+    :return: file descriptor
+    """
+    flags |= os.O_NONBLOCK
+    if not follow_symlinks:
+        flags |= os.O_NOFOLLOW
+    try:
+        return os.open(file_location, flags | os.O_NOATIME)
+
+    except PermissionError:
+        return os.open(file_location, flags)
+
+
+def _fadvise(fd: int, advice: int):
+    try:
+        os.posix_fadvise(fd, 0, 0, advice)
+
+    # Not supported by the file (e.g., pipes or some pseudo files).
+    except OSError:
+        pass
+
+
+def iter_fd_chunks(fd: int, chunk_size: int, max_size: int = 0) -> Iterator[bytes]:
+    """
+    Reads the opened file from its current position in chunks. The reads are limited to IO_RATE_LIMIT bytes per
+    second (shared by all reads of the process). The kernel is advised to read ahead since the file is read
+    sequentially and, if IO_DROP_PAGE_CACHE is set, to drop the read pages from the page cache afterwards so that
+    scans do not push the working set of other services out of it.
+
+    :param fd:
+    :param chunk_size:
+    :param max_size: maximal number of bytes read (0 means no limit)
+    :return: read chunks (the last one might be smaller)
+    """
+    _fadvise(fd, os.POSIX_FADV_SEQUENTIAL)
+    try:
+        remaining = max_size
+        while max_size <= 0 or remaining > 0:
+            size = chunk_size
+            if max_size > 0:
+                size = min(size, remaining)
+                remaining -= size
+            chunk = os.read(fd, size)
+            if not chunk:
+                break
+            _io_bucket.consume(len(chunk))
+            yield chunk
+
+    finally:
+        if IO_DROP_PAGE_CACHE:
+            _fadvise(fd, os.POSIX_FADV_DONTNEED)
+
+
+def iter_file_chunks(file_location: str,
+                     chunk_size: int,
+                     max_size: int = 0,
+                     follow_symlinks: bool = False) -> Iterator[bytes]:
+    """
+    Reads the file in chunks (see iter_fd_chunks()) without updating its access time if permitted.
+
+    :param file_location:
+    :param chunk_size:
+    :param max_size: maximal number of bytes read (0 means no limit)
+    :param follow_symlinks:
+    :return: read chunks (the last one might be smaller)
+    """
+    fd = open_noatime(file_location, follow_symlinks=follow_symlinks)
+    try:
+        for chunk in iter_fd_chunks(fd, chunk_size, max_size):
+            yield chunk
+
+    finally:
+        os.close(fd)
+
+
+def read_file_header(file_location: str, size: int) -> bytes:
+    """
+    Reads the first bytes of the file.
+
+    :param file_location:
+    :param size: number of bytes to read
+    :return: read bytes (fewer if the file is smaller)
+    """
+    fd = open_noatime(file_location)
+    try:
+        data = b""
+        while len(data) < size:
+            chunk = os.read(fd, size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        _io_bucket.consume(len(data))
+        return data
+
+    finally:
+        os.close(fd)
+
+
+def get_idle_io_command(command: str) -> str:
+    """
+    The I/O of external programs can not be limited by IO_RATE_LIMIT, instead they are run with the idle I/O
+    scheduling class if IO_IDLE_PRIORITY is set and "ionice" is available.
+
+    :param command: shell command
+    :return: shell command to execute
+    """
+    if IO_IDLE_PRIORITY and shutil.which("ionice") is not None:
+        return "ionice -c 3 %s" % command
+    return command
@@ -0,0 +1,103 @@
+import hashlib
+import os
+from typing import Dict, List, Optional, Set
+
+
+def combine_hashes(hashes: Dict[str, str]) -> str:
+    """
+    Combines the given named hashes into a single hash (order independent).
+
+    :param hashes: dictionary with name as key and hash as value
+    :return: combined hash
+    """
+    combined_hash = hashlib.sha256()
+    for name in sorted(hashes.keys()):
+        combined_hash.update(("%s\0%s\n" % (name, hashes[name])).encode("utf-8"))
+    return combined_hash.hexdigest()
+
+
+class MerkleTree:
+    """
+    Merkle tree over a set of files given by their absolute path and the hash of their content. The hash of a
+    directory is built from the names and hashes of its children, hence the root hash summarizes all files and two
+    trees can be compared by only descending into directories whose hashes differ.
+    """
+
+    def __init__(self, leaves: Dict[str, str], dir_hashes: Optional[Dict[str, str]] = None):
+        """
+        :param leaves: dictionary with the file location as key and the hash of its content as value
+        :param dir_hashes: already known hashes of the directories (e.g., from a stored state)
+        """
+        self._leaves = leaves
+        self._children = {}  # type: Dict[str, Set[str]]
+        for leaf in leaves.keys():
+            path = leaf
+            while True:
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                if parent in self._children.keys():
+                    self._children[parent].add(path)
+                    break
+                self._children[parent] = {path}
+                path = parent
+
+        if dir_hashes is not None and set(dir_hashes.keys()) == set(self._children.keys()):
+            self._dir_hashes = dir_hashes
+        else:
+            self._dir_hashes = {}  # type: Dict[str, str]
+            if self._children:
+                self._calculate_dir_hash("/")
+
+    def _calculate_dir_hash(self, dir_path: str) -> str:
+        children_hashes = {}
+        for child in self._children[dir_path]:
+            if child in self._children.keys():
+                children_hashes[os.path.basename(child)] = "D" + self._calculate_dir_hash(child)
+            else:
+                children_hashes[os.path.basename(child)] = "F" + self._leaves[child]
+        dir_hash = combine_hashes(children_hashes)
+        self._dir_hashes[dir_path] = dir_hash
+        return dir_hash
+
+    @property
+    def dir_hashes(self) -> Dict[str, str]:
+        return self._dir_hashes
+
+    @property
+    def root_hash(self) -> str:
+        if not self._dir_hashes:
+            return combine_hashes({})
+        return self._dir_hashes["/"]
+
+    def _get_hash(self, path: str) -> Optional[str]:
+        if path in self._dir_hashes.keys():
+            return "D" + self._dir_hashes[path]
+        if path in self._leaves.keys():
+            return "F" + self._leaves[path]
+        return None
+
+    def get_changed_files(self, other: "MerkleTree") -> List[str]:
+        """
+        Compares this tree with another one and only descends into subtrees whose hashes differ.
+
+        :param other:
+        :return: sorted list of file locations that were added, removed or modified
+        """
+        changed_files = []
+        to_process = ["/"]
+        while to_process:
+            path = to_process.pop()
+            own_hash = self._get_hash(path)
+            other_hash = other._get_hash(path)
+            if own_hash == other_hash:
+                continue
+
+            own_children = self._children.get(path, set())
+            other_children = other._children.get(path, set())
+            if path in self._leaves.keys() or path in other._leaves.keys():
+                changed_files.append(path)
+            to_process.extend(own_children | other_children)
+
+        changed_files.sort()
+        return changed_files
@@ -0,0 +1,306 @@
+import hashlib
+import os
+import re
+import stat
+from typing import Dict, List, Optional, Set
+
+from .step_state import StepLocation
+from .util_whitelist import PatternWhitelist
+
+try:
+    from config.config import SCAN_SKIP_PSEUDO_FS_TYPES, SCAN_SKIP_REMOTE_FS_TYPES, SCAN_CACHE_READ_ONLY_FS, \
+        SCAN_CACHE_MAX_AGE
+except:
+    SCAN_SKIP_PSEUDO_FS_TYPES = ["proc", "sysfs", "devpts", "cgroup", "cgroup2", "debugfs", "tracefs", "securityfs",
+                                 "pstore", "bpf", "configfs", "fusectl", "mqueue", "hugetlbfs", "autofs", "binfmt_misc",
+                                 "efivarfs", "selinuxfs", "rpc_pipefs", "nsfs", "nfsd"]
+    SCAN_SKIP_REMOTE_FS_TYPES = ["nfs", "nfs4", "cifs", "smb3", "smbfs", "ncpfs", "9p", "afs", "ceph", "glusterfs",
+                                 "lustre", "gpfs", "fuse.sshfs", "fuse.s3fs", "fuse.rclone"]
+    SCAN_CACHE_READ_ONLY_FS = True
+    SCAN_CACHE_MAX_AGE = 86400
+
+MOUNTINFO_LOCATION = "/proc/self/mountinfo"
+
+
+class MountException(Exception):
+    pass
+
+
+class MountInfo:
+    """
+    Mount as given by a line of /proc/self/mountinfo.
+    """
+
+    __slots__ = ("_mount_id", "_device", "_mount_point", "_fs_type", "_source", "_super_options")
+
+    def __init__(self, mount_id: int, device: str, mount_point: str, fs_type: str, source: str, super_options: str):
+        self._mount_id = mount_id
+        self._device = device
+        self._mount_point = mount_point
+        self._fs_type = fs_type
+        self._source = source
+        self._super_options = super_options
+
+    @property
+    def mount_id(self) -> int:
+        return self._mount_id
+
+    @property
+    def mount_point(self) -> str:
+        return self._mount_point
+
+    @property
+    def fs_type(self) -> str:
+        return self._fs_type
+
+    @property
+    def is_read_only(self) -> bool:
+        """
+        True if the filesystem itself is read-only (superblock option), not just this mount of it
+        (a read-only bind mount does not prevent changes through other mounts).
+        """
+        return "ro" in self._super_options.split(",")
+
+    @property
+    def identity(self) -> str:
+        """
+        Identity of the mount. It changes if the filesystem is unmounted and mounted again (new mount id) or remounted
+        with different options. A remount to read-write and back to read-only keeps the identity.
+        """
+        return "%d:%s:%s:%s:%s" % (self._mount_id, self._device, self._fs_type, self._source, self._super_options)
+
+
+class ScanLocation(StepLocation):
+    """
+    Search location that is located on a single mount. Subdirectories that are mount points of other mounts
+    are not descended into.
+    """
+
+    __slots__ = ("_mount", "_skip_locations")
+
+    def __init__(self, location: str, search_recursive: bool, mount: MountInfo, skip_locations: Set[str]):
+        super().__init__(location, search_recursive)
+        self._mount = mount
+        self._skip_locations = skip_locations
+
+    @property
+    def mount(self) -> MountInfo:
+        return self._mount
+
+    @property
+    def skip_locations(self) -> Set[str]:
+        return self._skip_locations
+
+    @property
+    def is_cacheable(self) -> bool:
+        """
+        True if the content of the location can only change if its filesystem is remounted read-write. Since the
+        identity of the mount does not reveal such a remount, cached results expire after SCAN_CACHE_MAX_AGE seconds.
+        """
+        return SCAN_CACHE_READ_ONLY_FS and self._mount.is_read_only and self.search_recursive
+
+    @property
+    def cache_key(self) -> str:
+        key_data = "\0".join([self._mount.identity, self.location] + sorted(self._skip_locations))
+        return hashlib.sha256(key_data.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def _decode_mountinfo_field(field: str) -> str:
+    # Spaces, tabs, newlines and backslashes are escaped as octal numbers (e.g., "\040").
+    return re.sub(r"\\([0-7]{3})", lambda x: chr(int(x.group(1), 8)), field)
+
+
+def get_mounts() -> List[MountInfo]:
+    """
+    Parses the mounts of the mount namespace of this process.
+
+    :return: list of mounts in the order of /proc/self/mountinfo (parents before children)
+    """
+    mounts = []  # type: List[MountInfo]
+    try:
+        with open(MOUNTINFO_LOCATION, "rt", errors="surrogateescape") as fp:
+            for line in fp:
+                # Format: mount_id parent_id major:minor root mount_point mount_options [optional fields...]
+                # - fs_type source super_options
+                fields = line.split()
+                separator = fields.index("-", 6)
+                mounts.append(MountInfo(int(fields[0]),
+                                        fields[2],
+                                        _decode_mountinfo_field(fields[4]),
+                                        fields[separator + 1],
+                                        _decode_mountinfo_field(fields[separator + 2]),
+                                        fields[separator + 3]))
+
+    except Exception as e:
+        raise MountException("Unable to parse '%s'; Exception: '%s'" % (MOUNTINFO_LOCATION, str(e)))
+
+    return mounts
+
+
+def _is_below(location: str, directory: str) -> bool:
+    """
+    :return: True if location is located strictly below directory
+    """
+    if directory == "/":
+        return location != "/"
+    return location.startswith(directory + "/")
+
+
+def _get_visible_mounts() -> Dict[str, MountInfo]:
+    # A mount that is mounted over another one on the same mount point hides it.
+    visible_mounts = {}  # type: Dict[str, MountInfo]
+    for mount in get_mounts():
+        visible_mounts[mount.mount_point] = mount
+    return visible_mounts
+
+
+def _get_location_mount(location: str, visible_mounts: Dict[str, MountInfo]) -> Optional[MountInfo]:
+    path = location
+    while True:
+        if path in visible_mounts.keys():
+            return visible_mounts[path]
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def get_skipped_mount_points() -> Set[str]:
+    """
+    :return: mount points of all mounts whose filesystem type is skipped by the configured policy
+    """
+    skip_policy = PatternWhitelist(SCAN_SKIP_PSEUDO_FS_TYPES + SCAN_SKIP_REMOTE_FS_TYPES)
+    return {x.mount_point for x in _get_visible_mounts().values() if skip_policy.is_whitelisted(x.fs_type)}
+
+
+def discover_drop_locations(fs_types: List[str]) -> List[str]:
+    """
+    Finds mounts that are typical drop locations for malware, i.e., mounts of in-memory filesystems (their content
+    vanishes on reboot) and mounts whose root directory is writable by everyone. Mounts of filesystem types skipped
+    by the configured policy (pseudo and remote filesystems) are neither returned nor accessed (stat'ing the root
+    of an autofs or NFS mount can trigger an automount or hang if the server is not reachable).
+
+    :param fs_types: filesystem types whose mounts are drop locations (e.g., "tmpfs")
+    :return: sorted list of mount points
+    """
+    skip_policy = PatternWhitelist(SCAN_SKIP_PSEUDO_FS_TYPES + SCAN_SKIP_REMOTE_FS_TYPES)
+    drop_locations = []  # type: List[str]
+    for mount_point, mount in _get_visible_mounts().items():
+        if skip_policy.is_whitelisted(mount.fs_type):
+            continue
+
+        if mount.fs_type in fs_types:
+            drop_locations.append(mount_point)
+            continue
+
+        try:
+            if os.stat(mount_point).st_mode & stat.S_IWOTH:
+                drop_locations.append(mount_point)
+
+        except OSError:
+            continue
+
+    drop_locations.sort()
+    return drop_locations
+
+
+def get_location_mount_ids(locations: List[str]) -> Set[int]:
+    """
+    :param locations:
+    :return: ids of the mounts the given locations are located on
+    """
+    visible_mounts = _get_visible_mounts()
+    mount_ids = set()  # type: Set[int]
+    for location in locations:
+        location_mount = _get_location_mount(os.path.normpath(os.path.abspath(location)), visible_mounts)
+        if location_mount is not None:
+            mount_ids.add(location_mount.mount_id)
+    return mount_ids
+
+
+def get_scan_locations(locations: List[str],
+                       stay_on_filesystem: bool = False,
+                       explicit_locations: Optional[List[str]] = None) -> List[ScanLocation]:
+    """
+    Splits the given locations by the mounts they contain, hence each search stays on a single filesystem.
+    Mounts of filesystem types skipped by the configured policy (pseudo and remote filesystems) are not searched.
+    Locations on read-only filesystems are searched as a whole (to be able to cache the result), all others are split
+    into the location itself (searched non-recursively) and each of its subdirectories (searched recursively).
+
+    :param locations:
+    :param stay_on_filesystem: do not search mounts located below the given locations
+    :param explicit_locations: locations below the given locations that were explicitly configured (e.g., when the
+    locations of several detectors are merged), their mounts are searched like the ones of the given locations
+    :return: list of scan locations
+    """
+    visible_mounts = _get_visible_mounts()
+    skip_policy = PatternWhitelist(SCAN_SKIP_PSEUDO_FS_TYPES + SCAN_SKIP_REMOTE_FS_TYPES)
+    mount_points = set(visible_mounts.keys())
+
+    # The mount of a given location is always searched (even if its filesystem type is skipped by the policy)
+    # since it was explicitly configured.
+    explicit_mount_points = set()  # type: Set[str]
+    for location in explicit_locations or []:
+        location_mount = _get_location_mount(os.path.normpath(os.path.abspath(location)), visible_mounts)
+        if location_mount is not None:
+            explicit_mount_points.add(location_mount.mount_point)
+
+    # Roots of the mounts to search.
+    roots = []  # type: List[ScanLocation]
+    processed_roots = set()  # type: Set[str]
+    for location in locations:
+        location = os.path.normpath(os.path.abspath(location))
+        location_mount = _get_location_mount(location, visible_mounts)
+        if location_mount is None:
+            raise MountException("Unable to find mount of '%s'." % location)
+        location_roots = [(location, location_mount)]
+
+        if not stay_on_filesystem:
+            skipped_mount_points = []  # type: List[str]
+            for mount_point in sorted(mount_points):
+                if not _is_below(mount_point, location):
+                    continue
+                if mount_point not in explicit_mount_points:
+                    if any(_is_below(mount_point, x) or mount_point == x for x in skipped_mount_points):
+                        continue
+                    if skip_policy.is_whitelisted(visible_mounts[mount_point].fs_type):
+                        skipped_mount_points.append(mount_point)
+                        continue
+                location_roots.append((mount_point, visible_mounts[mount_point]))
+
+        for root, mount in location_roots:
+            if root in processed_roots:
+                continue
+            processed_roots.add(root)
+            skip_locations = {x for x in mount_points if _is_below(x, root)}
+            roots.append(ScanLocation(root, True, mount, skip_locations))
+
+    scan_locations = []  # type: List[ScanLocation]
+    for root in roots:
+        if root.is_cacheable:
+            scan_locations.append(root)
+            continue
+
+        # Add root as non-recursive search location in order to search in it without going deeper.
+        scan_locations.append(ScanLocation(root.location, False, root.mount, root.skip_locations))
+
+        # Add all containing subdirectories as recursive search locations.
+        try:
+            with os.scandir(root.location) as dir_iter:
+                entries = sorted(dir_iter, key=lambda x: x.name)
+
+        except OSError:
+            continue
+
+        for entry in entries:
+            try:
+                if not entry.is_dir(follow_symlinks=False) or entry.path in root.skip_locations:
+                    continue
+
+            except OSError:
+                continue
+
+            skip_locations = {x for x in root.skip_locations if _is_below(x, entry.path)}
+            scan_locations.append(ScanLocation(entry.path, True, root.mount, skip_locations))
+
+    return scan_locations
@@ -0,0 +1,258 @@
+import os
+from typing import Dict, Iterator, List, Optional
+
+# Process flag of kernel threads (see include/linux/sched.h), can not be set by user space.
+PF_KTHREAD = 0x00200000
+
+# Pid of kthreadd, the parent of all kernel threads.
+KTHREADD_PID = 2
+
+# Marks values of a process that were not read yet (None is a valid value).
+_NOT_READ = object()
+
+
+class ProcessInfo:
+    """
+    Information about a single process read from procfs. Each file of the process is only read on first use and
+    the result is kept, hence all checks see the same values. Values of processes that terminated in the meantime
+    (or that are not accessible) are None.
+    """
+
+    __slots__ = ("_pid", "_proc_dir", "_stat", "_status", "_exe", "_cmdline", "_environ")
+
+    def __init__(self, pid: int, proc_dir: str = "/proc"):
+        self._pid = pid
+        self._proc_dir = os.path.join(proc_dir, str(pid))
+        self._stat = _NOT_READ
+        self._status = _NOT_READ
+        self._exe = _NOT_READ
+        self._cmdline = _NOT_READ
+        self._environ = _NOT_READ
+
+    @property
+    def pid(self) -> int:
+        return self._pid
+
+    def get_file(self, name: str) -> str:
+        """
+        :param name: name of the file in the procfs directory of the process (e.g., "maps")
+        :return: location of the file
+        """
+        return os.path.join(self._proc_dir, name)
+
+    def _read_file(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self.get_file(name), "rb") as fp:
+                return fp.read()
+
+        # Process terminated or is not accessible.
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            return None
+
+    @property
+    def stat(self) -> Optional[List[str]]:
+        """
+        Fields of /proc/<pid>/stat starting with the state (field 3). The name (field 2) is enclosed in parentheses
+        and can contain any character, hence it is not part of the fields (see name).
+        """
+        if self._stat is _NOT_READ:
+            self._stat = None
+            data = self._read_file("stat")
+            if data is not None:
+                self._stat = data.decode("utf-8", "replace").rsplit(")", 1)[-1].split()
+        return self._stat
+
+    @property
+    def status(self) -> Optional[Dict[str, str]]:
+        if self._status is _NOT_READ:
+            self._status = None
+            data = self._read_file("status")
+            if data is not None:
+                self._status = {}
+                for line in data.decode("utf-8", "replace").split("\n"):
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        self._status[key] = value.strip()
+        return self._status
+
+    @property
+    def exe(self) -> Optional[str]:
+        """
+        Target of the exe link (e.g., "/usr/bin/bash" or "/tmp/x (deleted)"). None for kernel threads.
+        """
+        if self._exe is _NOT_READ:
+            try:
+                self._exe = os.readlink(self.get_file("exe"))
+
+            except OSError:
+                self._exe = None
+        return self._exe
+
+    @property
+    def cmdline(self) -> Optional[List[str]]:
+        """
+        Arguments of the process (empty for kernel threads).
+        """
+        if self._cmdline is _NOT_READ:
+            self._cmdline = None
+            data = self._read_file("cmdline")
+            if data is not None:
+                self._cmdline = [x.decode("utf-8", "replace") for x in data.split(b"\x00")]
+                # The arguments are terminated by a 0-byte.
+                if self._cmdline and self._cmdline[-1] == "":
+                    self._cmdline.pop()
+        return self._cmdline
+
+    @property
+    def environ(self) -> Optional[Dict[str, str]]:
+        """
+        Environment the process was started with.
+        """
+        if self._environ is _NOT_READ:
+            self._environ = None
+            data = self._read_file("environ")
+            if data is not None:
+                self._environ = {}
+                for entry in data.split(b"\x00"):
+                    if b"=" in entry:
+                        key, value = entry.split(b"=", 1)
+                        self._environ[key.decode("utf-8", "replace")] = value.decode("utf-8", "replace")
+        return self._environ
+
+    @property
+    def name(self) -> Optional[str]:
+        """
+        Name of the process (at most 15 characters, can be changed by the process itself).
+        """
+        status = self.status
+        if status is None:
+            return None
+        return status.get("Name")
+
+    @property
+    def ppid(self) -> Optional[int]:
+        stat = self.stat
+        if stat is None or len(stat) < 2:
+            return None
+        return int(stat[1])
+
+    @property
+    def flags(self) -> Optional[int]:
+        """
+        Kernel flags of the process (PF_* constants, field 9 of /proc/<pid>/stat).
+        """
+        stat = self.stat
+        if stat is None or len(stat) < 7:
+            return None
+        return int(stat[6])
+
+    @property
+    def is_kernel_thread(self) -> Optional[bool]:
+        """
+        True if the process has the PF_KTHREAD flag set and is kthreadd or a child of it.
+        """
+        flags = self.flags
+        if flags is None:
+            return None
+        return bool(flags & PF_KTHREAD) and (self._pid == KTHREADD_PID or self.ppid == KTHREADD_PID)
+
+    def has_mappings(self) -> Optional[bool]:
+        """
+        Kernel threads have no memory mappings. Only a single byte of the maps file is read to check this.
+
+        :return: True if the process has memory mappings, None if the process terminated or is not accessible
+        """
+        try:
+            with open(self.get_file("maps"), "rb") as fp:
+                return fp.read(1) != b""
+
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            return None
+
+    @property
+    def command(self) -> Optional[str]:
+        """
+        Command line as shown by ps (the name in brackets if the process has no arguments, e.g., kernel threads).
+        """
+        cmdline = self.cmdline
+        if cmdline is None:
+            return None
+        if cmdline:
+            return " ".join(cmdline)
+        name = self.name
+        if name is None:
+            return None
+        return "[%s]" % name
+
+    def __str__(self) -> str:
+        return "Pid: %d\nPPid: %s\nName: %s\nExe: %s\nCommand: %s" % (self._pid,
+                                                                        self.ppid,
+                                                                        self.name,
+                                                                        self.exe,
+                                                                        self.command)
+
+
+class ProcSnapshot:
+    """
+    Snapshot of all processes. The pids are listed once on creation, the information about each process is read
+    lazily and kept (see ProcessInfo). Hence, all checks of a run work on one consistent set of processes instead
+    of each enumerating /proc on its own.
+    """
+
+    def __init__(self, proc_dir: str = "/proc"):
+        self._processes = {}  # type: Dict[int, ProcessInfo]
+        for entry in os.listdir(proc_dir):
+            if entry.isdigit():
+                self._processes[int(entry)] = ProcessInfo(int(entry), proc_dir)
+        self._children = None  # type: Optional[Dict[int, List[int]]]
+
+    @property
+    def pids(self) -> List[int]:
+        return sorted(self._processes.keys())
+
+    def __iter__(self) -> Iterator[ProcessInfo]:
+        for pid in self.pids:
+            yield self._processes[pid]
+
+    def __len__(self) -> int:
+        return len(self._processes)
+
+    def get(self, pid: int) -> Optional[ProcessInfo]:
+        return self._processes.get(pid)
+
+    def get_parent(self, pid: int) -> Optional[ProcessInfo]:
+        """
+        :param pid:
+        :return: parent process or None if the process or its parent is not part of the snapshot
+        """
+        process = self._processes.get(pid)
+        if process is None or process.ppid is None:
+            return None
+        return self._processes.get(process.ppid)
+
+    def get_children(self, pid: int) -> List[ProcessInfo]:
+        """
+        :param pid:
+        :return: child processes (the index is built on first use by reading the stat file of all processes)
+        """
+        if self._children is None:
+            self._children = {}
+            for process in self:
+                if process.ppid is not None:
+                    self._children.setdefault(process.ppid, []).append(process.pid)
+
+        return [self._processes[x] for x in self._children.get(pid, [])]
+
+    def get_ancestors(self, pid: int) -> List[ProcessInfo]:
+        """
+        :param pid:
+        :return: parent, grandparent, ... of the process up to the first process not part of the snapshot
+        """
+        ancestors = []  # type: List[ProcessInfo]
+        seen = {pid}
+        parent = self.get_parent(pid)
+        while parent is not None and parent.pid not in seen:
+            ancestors.append(parent)
+            seen.add(parent.pid)
+            parent = self.get_parent(parent.pid)
+        return ancestors
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .util_file import FileLocation
+from .util_mount import ScanLocation
+
+try:
+    from config.config import SCAN_MAX_WORKERS, SCAN_WORKERS_PER_DEVICE, SCAN_CACHE_MAX_AGE
+except:
+    SCAN_MAX_WORKERS = 4
+    SCAN_WORKERS_PER_DEVICE = 1
+    SCAN_CACHE_MAX_AGE = 86400
+
+
+class DeviceScanScheduler:
+    """
+    Runs scans of multiple locations in parallel. The locations are grouped by the device they are stored on and
+    only a limited number of scans run concurrently on the same device. Hence, independent disks are scanned in
+    parallel while a single (spinning) disk is not overloaded with concurrent scans.
+    """
+
+    def __init__(self, max_workers: int = SCAN_MAX_WORKERS, workers_per_device: int = SCAN_WORKERS_PER_DEVICE):
+        self._max_workers = max(1, max_workers)
+        self._workers_per_device = max(1, workers_per_device)
+
+    @staticmethod
+    def _get_device(location: str) -> Optional[int]:
+        try:
+            return os.stat(location).st_dev
+
+        except OSError:
+            return None
+
+    def run(self,
+            locations: List[FileLocation],
+            scan_func: Callable[[FileLocation], Any],
+            error_func: Callable[[str], None]) -> List[Any]:
+        """
+        Executes scan_func for each location. A failing scan (e.g., an I/O error) does not affect the scans of the
+        other locations, it is reported via error_func and its result is None.
+
+        :param locations:
+        :param scan_func: function that scans a single location (executed in a worker thread)
+        :param error_func: function that reports the error message of a failed scan (e.g., output_error())
+        :return: results of scan_func in the same order as the given locations
+        """
+        # Pending location indexes per device (in the order of the given locations).
+        pending = {}  # type: Dict[Optional[int], List[int]]
+        for i, location in enumerate(locations):
+            pending.setdefault(self._get_device(location.location), []).append(i)
+        for indexes in pending.values():
+            indexes.reverse()
+
+        active = {x: 0 for x in pending.keys()}  # type: Dict[Optional[int], int]
+        devices = list(pending.keys())
+        results = [None] * len(locations)  # type: List[Any]
+        errors = []  # type: List[str]
+        condition = threading.Condition()
+
+        def worker():
+            next_device = 0
+            while True:
+                with condition:
+                    index = None
+                    while index is None:
+                        if not any(pending.values()):
+                            return
+
+                        # Take the next location of a device that has capacity left (round robin over devices).
+                        for i in range(len(devices)):
+                            device = devices[(next_device + i) % len(devices)]
+                            if pending[device] and active[device] < self._workers_per_device:
+                                index = pending[device].pop()
+                                active[device] += 1
+                                next_device = (next_device + i + 1) % len(devices)
+                                break
+
+                        if index is None:
+                            condition.wait()
+
+                try:
+                    results[index] = scan_func(locations[index])
+
+                except Exception as e:
+                    with condition:
+                        errors.append("Unable to search '%s': %s" % (locations[index].location, str(e)))
+
+                with condition:
+                    active[device] -= 1
+                    condition.notify_all()
+
+        threads = []
+        for _ in range(min(self._max_workers, len(locations))):
+            thread = threading.Thread(target=worker, daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        # Reported after all threads finished since the error output is not thread-safe.
+        for error in errors:
+            error_func(error)
+
+        return results
+
+    def run_cached(self,
+                   locations: List[ScanLocation],
+                   scan_func: Callable[[ScanLocation], Any],
+                   error_func: Callable[[str], None],
+                   cache: Dict[str, Any]) -> List[Any]:
+        """
+        Executes scan_func for each location whose result is not cached. Results of locations on read-only
+        filesystems are taken from the cache and stored in it (unless the scan failed). Cached results older than
+        SCAN_CACHE_MAX_AGE seconds are searched again. Cache entries that were not used are removed.
+
+        :param locations:
+        :param scan_func: function that scans a single location (executed in a worker thread)
+        :param error_func: see run()
+        :param cache: cache of the results (e.g., from a stored state) that is updated in place
+        :return: results of scan_func in the same order as the given locations
+        """
+        now = int(time.time())
+        results = [None] * len(locations)  # type: List[Any]
+        used_keys = set()
+        to_scan = []  # type: List[int]
+        for i, location in enumerate(locations):
+            if location.is_cacheable:
+                used_keys.add(location.cache_key)
+
+                # Each cache entry is a [time of the scan, result] pair.
+                cache_entry = cache.get(location.cache_key)
+                if (isinstance(cache_entry, list)
+                        and len(cache_entry) == 2
+                        and 0 <= now - cache_entry[0] < SCAN_CACHE_MAX_AGE):
+                    results[i] = cache_entry[1]
+                    continue
+            to_scan.append(i)
+
+        scan_results = self.run([locations[i] for i in to_scan], scan_func, error_func)
+        for i, result in zip(to_scan, scan_results):
+            results[i] = result
+            if locations[i].is_cacheable:
+                if result is None:
+                    used_keys.discard(locations[i].cache_key)
+                else:
+                    cache[locations[i].cache_key] = [now, result]
+
+        for key in set(cache.keys()) - used_keys:
+            del cache[key]
+
+        return results
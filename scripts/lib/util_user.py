@@ -7,6 +7,8 @@ class PasswdException(Exception):
 
 class SystemUser:
 
+    __slots__ = ("_name", "_password", "_uid", "_gid", "_info", "_home", "_shell")
+
     def __init__(self,
                  name: str,
                  password: str,
@@ -0,0 +1,136 @@
+import os
+from typing import Iterator, List, Optional, Set, Tuple
+
+
+def walk_entries(location: str,
+                 search_recursive: bool = True,
+                 one_filesystem: bool = True,
+                 skip_locations: Optional[Set[str]] = None) -> Iterator[os.DirEntry]:
+    """
+    Walks the given directory with os.scandir() and yields all entries (files, directories, symlinks, ...) as they
+    are found. The type information of the directory entries is used, hence no additional stat call is needed for
+    files. Symlinks are not followed and directories that can not be read are skipped.
+
+    :param location: directory to walk
+    :param search_recursive: descend into subdirectories
+    :param one_filesystem: do not descend into directories on other devices (mount points)
+    :param skip_locations: directories that are not descended into (e.g., mount points)
+    :return: iterator over the entries
+    """
+    root_dev = None
+    if one_filesystem:
+        try:
+            root_dev = os.stat(location).st_dev
+
+        except OSError:
+            return
+
+    to_process = [location]
+    while to_process:
+        dir_location = to_process.pop()
+        try:
+            with os.scandir(dir_location) as dir_iter:
+                for entry in dir_iter:
+                    yield entry
+
+                    if not search_recursive:
+                        continue
+
+                    try:
+                        if not entry.is_dir(follow_symlinks=False):
+                            continue
+
+                        # Only directories need a stat call to check the device.
+                        if root_dev is not None and entry.stat(follow_symlinks=False).st_dev != root_dev:
+                            continue
+
+                    except OSError:
+                        continue
+
+                    if skip_locations and entry.path in skip_locations:
+                        continue
+
+                    to_process.append(entry.path)
+
+        except OSError:
+            continue
+
+
+def walk_entries_ordered(location: str,
+                         resume_after: Optional[Tuple[str, ...]] = None,
+                         one_filesystem: bool = True,
+                         skip_locations: Optional[Set[str]] = None) -> Iterator[Tuple[os.DirEntry, Tuple[str, ...]]]:
+    """
+    Walks the given directory recursively in a deterministic order (depth-first, entries sorted by name) and yields
+    all entries together with their key (path components relative to the location). The order of the keys is their
+    lexicographic order, hence a walk can be resumed at the position of a given key even if directories were added
+    or removed in the meantime (subtrees that are completely located before the key are skipped without reading them).
+
+    :param location: directory to walk
+    :param resume_after: key of the last processed entry; only entries after it are yielded
+    :param one_filesystem: do not descend into directories on other devices (mount points)
+    :param skip_locations: directories that are not descended into (e.g., mount points)
+    :return: iterator over (entry, key) tuples
+    """
+    root_dev = None
+    if one_filesystem:
+        try:
+            root_dev = os.stat(location).st_dev
+
+        except OSError:
+            return
+
+    def list_dir(dir_location: str) -> List[os.DirEntry]:
+        try:
+            with os.scandir(dir_location) as dir_iter:
+                entries = list(dir_iter)
+
+        except OSError:
+            return []
+
+        entries.sort(key=lambda x: x.name)
+        return entries
+
+    # Stack of (key of directory, sorted entries of directory, index of next entry).
+    stack = [((), list_dir(location), 0)]
+    while stack:
+        dir_key, entries, index = stack.pop()
+        if index >= len(entries):
+            continue
+        stack.append((dir_key, entries, index + 1))
+
+        entry = entries[index]
+        key = dir_key + (entry.name,)
+
+        is_processed = False
+        if resume_after is not None:
+            if key < resume_after and resume_after[:len(key)] != key:
+                # Entry and its complete subtree are located before the resume position.
+                continue
+
+            elif resume_after[:len(key)] == key:
+                # Entry was already processed, but entries of its subtree might not.
+                is_processed = True
+
+            else:
+                # All following entries are located after the resume position.
+                resume_after = None
+
+        if not is_processed:
+            yield entry, key
+
+        try:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+
+            # Only directories need a stat call to check the device.
+            if root_dev is not None and entry.stat(follow_symlinks=False).st_dev != root_dev:
+                continue
+
+        except OSError:
+            continue
+
+        if skip_locations and entry.path in skip_locations:
+            continue
+
+        stack.append((key, list_dir(entry.path), 0))
@@ -0,0 +1,100 @@
+import fnmatch
+import re
+from typing import Iterable, List, Optional, Pattern, Set
+
+# Prefixes of whitelist entries that are patterns instead of literal values.
+GLOB_PREFIX = "glob:"
+REGEX_PREFIX = "regex:"
+
+
+class WhitelistException(Exception):
+    pass
+
+
+def is_pattern_entry(entry: str) -> bool:
+    return entry.startswith(GLOB_PREFIX) or entry.startswith(REGEX_PREFIX)
+
+
+# Constructs that refer to groups by number or name (backreferences, conditionals).
+_GROUP_REFERENCE = re.compile(r"\\[1-9]|\\g<|\(\?P=|\(\?\(")
+
+_DEFAULT_FLAGS = re.compile("").flags
+
+
+def _is_combinable(pattern: str, compiled: Pattern) -> bool:
+    """
+    :param pattern:
+    :param compiled: pattern compiled on its own
+    :return: True if the pattern behaves the same as part of an alternation with other patterns, i.e., it has no
+    global flags (they have to be at the start of the expression), no named groups (names have to be unique) and
+    no references to groups (group numbers are shifted by the groups of preceding patterns)
+    """
+    if compiled.flags != _DEFAULT_FLAGS or compiled.groupindex:
+        return False
+    return _GROUP_REFERENCE.search(pattern) is None
+
+
+class PatternWhitelist:
+    """
+    Whitelist that can be used by all scripts. Entries are either literal values (exact match),
+    glob patterns prefixed with "glob:" (e.g., "glob:/home/*/.cache/*"; "*" also matches "/")
+    or regular expressions prefixed with "regex:" (e.g., "regex:\\[kworker/\\d+:\\d+\\]"). Patterns have to match the
+    whole value. Literal entries are looked up in a set and the patterns are combined into a single regular
+    expression, hence a value is checked with a single match call. Regular expressions that can not be combined with
+    others (global flags, named groups or references to groups) are compiled and matched on their own.
+    """
+
+    def __init__(self, entries: Iterable[str]):
+        self._literals = set()  # type: Set[str]
+        self._separate_patterns = []  # type: List[Pattern]
+        combinable_patterns = []  # type: List[str]
+        for entry in entries:
+            if entry.startswith(GLOB_PREFIX):
+                pattern = fnmatch.translate(entry[len(GLOB_PREFIX):])
+
+            elif entry.startswith(REGEX_PREFIX):
+                pattern = entry[len(REGEX_PREFIX):]
+
+            else:
+                self._literals.add(entry)
+                continue
+
+            try:
+                compiled = re.compile(pattern)
+
+            except re.error as e:
+                raise WhitelistException("Invalid regular expression '%s' in whitelist: %s" % (pattern, str(e)))
+
+            if _is_combinable(pattern, compiled):
+                combinable_patterns.append(pattern)
+            else:
+                self._separate_patterns.append(re.compile(pattern, re.DOTALL))
+
+        self._combined_pattern = None  # type: Optional[Pattern]
+        if combinable_patterns:
+            self._combined_pattern = re.compile("|".join(["(?:%s)" % x for x in combinable_patterns]), re.DOTALL)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self._literals and not self.has_patterns
+
+    @property
+    def has_patterns(self) -> bool:
+        return self._combined_pattern is not None or bool(self._separate_patterns)
+
+    def is_whitelisted(self, value: str) -> bool:
+        if value in self._literals:
+            return True
+        if self._combined_pattern is not None and self._combined_pattern.fullmatch(value) is not None:
+            return True
+        for pattern in self._separate_patterns:
+            if pattern.fullmatch(value) is not None:
+                return True
+        return False
+
+    def filter(self, values: Iterable[str]) -> List[str]:
+        """
+        :param values:
+        :return: list of values that do not match the whitelist
+        """
+        return [x for x in values if not self.is_whitelisted(x)]
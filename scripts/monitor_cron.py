@@ -29,8 +29,11 @@ import sys
 from typing import Dict, List, Set
 
 import lib.global_vars
+from lib.fingerprint_cache import FingerprintCache
 from lib.state import load_state, store_state
 from lib.util import output_error, output_finding
+from lib.util_io import iter_file_chunks
+from lib.util_merkle import MerkleTree, combine_hashes
 from lib.util_user import get_system_users
 
 # Read configuration.
@@ -49,27 +52,26 @@ except:
 
 
 def _calculate_hash(file_location: str) -> str:
-    with open(file_location, "rb") as fp:
-        file_hash = hashlib.md5()
-        chunk = fp.read(1048576)
-        while chunk:
-            file_hash.update(chunk)
-            chunk = fp.read(1048576)
+    file_hash = hashlib.md5()
+    for chunk in iter_file_chunks(file_location, 1048576, follow_symlinks=True):
+        file_hash.update(chunk)
 
     return file_hash.hexdigest().upper()
 
 
-def _get_cron_script_files() -> Dict[str, str]:
+def _get_cron_script_files(fingerprint_cache: FingerprintCache) -> Dict[str, str]:
     cron_script_files = dict()
     for cron_script_dir in CRON_SCRIPT_DIRS:
         for cron_script_file in os.listdir(cron_script_dir):
             cron_script_location = os.path.join(cron_script_dir, cron_script_file)
-            cron_script_files[cron_script_location] = _calculate_hash(cron_script_location)
+            cron_script_files[cron_script_location] = fingerprint_cache.get(cron_script_location,
+                                                                            "hash",
+                                                                            _calculate_hash)
 
     return cron_script_files
 
 
-def _get_crontab_files() -> Dict[str, List[str]]:
+def _get_crontab_files(fingerprint_cache: FingerprintCache) -> Dict[str, List[str]]:
     crontab_entries = dict()
 
     # Add default location of crontab entries.
@@ -88,11 +90,19 @@ def _get_crontab_files() -> Dict[str, List[str]]:
             crontab_files.append(crontab_location)
 
     for crontab_file in crontab_files:
-        crontab_entries[crontab_file] = _parse_crontab(crontab_file)
+        crontab_entries[crontab_file] = fingerprint_cache.get(crontab_file, "crontab", _parse_crontab)
 
     return crontab_entries
 
 
+def _get_crontab_hashes(crontab_data: Dict[str, List[str]]) -> Dict[str, str]:
+    crontab_hashes = dict()
+    for crontab_file, crontab_entries in crontab_data.items():
+        crontab_hashes[crontab_file] = hashlib.sha256("\n".join(crontab_entries).encode("utf-8")).hexdigest()
+
+    return crontab_hashes
+
+
 def _get_crontab_users(curr_crontab_data: Dict[str, List[str]]) -> Set[str]:
     crontab_users = set()
 
@@ -142,8 +152,10 @@ def monitor_cron():
         return
 
     stored_cron_data = {}
+    fingerprint_cache = None
     try:
         stored_cron_data = load_state(STATE_DIR)
+        fingerprint_cache = FingerprintCache(STATE_DIR)
 
     except Exception as e:
         output_error(__file__, str(e))
@@ -159,44 +171,47 @@ def monitor_cron():
 
     curr_crontab_data = {}
     try:
-        curr_crontab_data = _get_crontab_files()
+        curr_crontab_data = _get_crontab_files(fingerprint_cache)
 
     except Exception as e:
         output_error(__file__, str(e))
         return
 
-    # Compare stored crontab data with current one.
+    # Compare stored crontab data with current one. Only subtrees whose hashes differ are compared.
     stored_crontab_data = stored_cron_data["crontab"]
-    for stored_crontab_file, stored_crontab_entries in stored_crontab_data.items():
+    stored_crontab_tree = MerkleTree(_get_crontab_hashes(stored_crontab_data),
+                                     stored_cron_data.get("crontab_merkle"))
+    curr_crontab_tree = MerkleTree(_get_crontab_hashes(curr_crontab_data))
+    for crontab_file in curr_crontab_tree.get_changed_files(stored_crontab_tree):
 
         # Check if crontab file was deleted.
-        if stored_crontab_file not in curr_crontab_data.keys():
-            message = "Crontab file '%s' was deleted." % stored_crontab_file
+        if crontab_file not in curr_crontab_data.keys():
+            message = "Crontab file '%s' was deleted." % crontab_file
+            output_finding(__file__, message)
+            continue
+
+        # Check new crontab file added.
+        if crontab_file not in stored_crontab_data.keys():
+            message = "Crontab file '%s' was added.\n\n" % crontab_file
+            for curr_crontab_entry in curr_crontab_data[crontab_file]:
+                message += "Entry: %s\n" % curr_crontab_entry
             output_finding(__file__, message)
             continue
 
         # Check entries were deleted.
-        for stored_crontab_entry in stored_crontab_entries:
-            if stored_crontab_entry not in curr_crontab_data[stored_crontab_file]:
-                message = "Entry in crontab file '%s' was deleted.\n\n" % stored_crontab_file
+        for stored_crontab_entry in stored_crontab_data[crontab_file]:
+            if stored_crontab_entry not in curr_crontab_data[crontab_file]:
+                message = "Entry in crontab file '%s' was deleted.\n\n" % crontab_file
                 message += "Deleted entry: %s" % stored_crontab_entry
                 output_finding(__file__, message)
 
         # Check entries were added.
-        for curr_crontab_entry in curr_crontab_data[stored_crontab_file]:
-            if curr_crontab_entry not in stored_crontab_entries:
-                message = "Entry in crontab file '%s' was added.\n\n" % stored_crontab_file
+        for curr_crontab_entry in curr_crontab_data[crontab_file]:
+            if curr_crontab_entry not in stored_crontab_data[crontab_file]:
+                message = "Entry in crontab file '%s' was added.\n\n" % crontab_file
                 message += "Added entry: %s" % curr_crontab_entry
                 output_finding(__file__, message)
 
-    # Check new crontab file added.
-    for curr_crontab_file, curr_crontab_entries in curr_crontab_data.items():
-        if curr_crontab_file not in stored_crontab_data.keys():
-            message = "Crontab file '%s' was added.\n\n" % curr_crontab_file
-            for curr_crontab_entry in curr_crontab_entries:
-                message += "Entry: %s\n" % curr_crontab_entry
-            output_finding(__file__, message)
-
     # Check users running crontab entries actually exist as system users.
     system_users = get_system_users()
     for crontab_user in _get_crontab_users(curr_crontab_data):
@@ -206,36 +221,51 @@ def monitor_cron():
 
     curr_script_data = {}
     try:
-        curr_script_data = _get_cron_script_files()
+        curr_script_data = _get_cron_script_files(fingerprint_cache)
 
     except Exception as e:
         output_error(__file__, str(e))
         return
 
-    # Compare stored cron script data with current one.
+    # Compare stored cron script data with current one. Only subtrees whose hashes differ are compared.
     stored_script_data = stored_cron_data["cronscripts"]
-    for stored_script_file, stored_script_hash in stored_script_data.items():
+    stored_script_tree = MerkleTree(stored_script_data, stored_cron_data.get("cronscripts_merkle"))
+    curr_script_tree = MerkleTree(curr_script_data)
+    for script_file in curr_script_tree.get_changed_files(stored_script_tree):
 
         # Check if cron script file was deleted.
-        if stored_script_file not in curr_script_data.keys():
-            message = "Cron script file '%s' was deleted." % stored_script_file
+        if script_file not in curr_script_data.keys():
+            message = "Cron script file '%s' was deleted." % script_file
             output_finding(__file__, message)
-            continue
 
-        # Check if cron script file was modified.
-        if stored_script_hash != curr_script_data[stored_script_file]:
-            message = "Cron script file '%s' was modified." % stored_script_file
+        # Check new cron script file added.
+        elif script_file not in stored_script_data.keys():
+            message = "Cron script file '%s' was added." % script_file
             output_finding(__file__, message)
 
-    # Check new cron script file added.
-    for curr_script_file in curr_script_data.keys():
-        if curr_script_file not in stored_script_data.keys():
-            message = "Cron script file '%s' was added." % curr_script_file
+        # Cron script file was modified.
+        else:
+            message = "Cron script file '%s' was modified." % script_file
             output_finding(__file__, message)
 
     try:
         store_state(STATE_DIR, {"crontab": curr_crontab_data,
-                                "cronscripts": curr_script_data})
+                                "crontab_merkle": curr_crontab_tree.dir_hashes,
+                                "cronscripts": curr_script_data,
+                                "cronscripts_merkle": curr_script_tree.dir_hashes})
+        fingerprint_cache.store()
+
+    except Exception as e:
+        output_error(__file__, str(e))
+
+
+def print_merkle_root():
+    try:
+        state_data = load_state(STATE_DIR)
+        crontab_tree = MerkleTree(_get_crontab_hashes(state_data.get("crontab", {})), state_data.get("crontab_merkle"))
+        script_tree = MerkleTree(state_data.get("cronscripts", {}), state_data.get("cronscripts_merkle"))
+        print(combine_hashes({"crontab": crontab_tree.root_hash,
+                              "cronscripts": script_tree.root_hash}))
 
     except Exception as e:
         output_error(__file__, str(e))
@@ -246,4 +276,9 @@ if __name__ == '__main__':
         # Suppress output in our initial execution to establish a state.
         if sys.argv[1] == "--init":
             lib.global_vars.SUPPRESS_OUTPUT = True
+
+        # Print the root hash of the stored state (e.g., to compare it with the one of a golden image).
+        elif sys.argv[1] == "--merkle-root":
+            print_merkle_root()
+            sys.exit(0)
     monitor_cron()
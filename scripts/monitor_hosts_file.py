@@ -147,10 +147,10 @@ def monitor_hosts():
             output_finding(__file__, message)
 
     try:
-        # Convert set to list.
+        # Convert set to sorted list (keeps the stored state identical if nothing changed).
         state_data = {}
         for k, v in curr_hosts_data.items():
-            state_data[k] = list(v)
+            state_data[k] = sorted(v)
 
         store_state(STATE_DIR, state_data)
 
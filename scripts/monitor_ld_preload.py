@@ -106,8 +106,8 @@ def monitor_ld_preload():
             output_finding(__file__, message)
 
     try:
-        # Convert set to list.
-        state_data = {"ld_data": list(curr_ld_data)}
+        # Convert set to sorted list (keeps the stored state identical if nothing changed).
+        state_data = {"ld_data": sorted(curr_ld_data)}
 
         store_state(STATE_DIR, state_data)
 
@@ -28,6 +28,7 @@ import sys
 import lib.global_vars
 from lib.state import load_state, store_state
 from lib.util import output_error, output_finding
+from lib.util_whitelist import PatternWhitelist
 
 # Read configuration.
 try:
@@ -88,7 +89,12 @@ def monitor_modules():
         return
 
     # Remove whitelisted modules from the currently loaded modules set.
-    current_modules = current_modules - set(MODULES_WHITELIST)
+    try:
+        current_modules = set(PatternWhitelist(MODULES_WHITELIST).filter(current_modules))
+
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
 
     # Check for newly loaded modules.
     loaded_modules = current_modules - stored_modules_data
@@ -113,8 +119,8 @@ def monitor_modules():
         output_finding(__file__, message)
 
     try:
-        # Convert set to list.
-        state_data = {"modules_data": list(current_modules)}
+        # Convert set to sorted list (keeps the stored state identical if nothing changed).
+        state_data = {"modules_data": sorted(current_modules)}
 
         store_state(STATE_DIR, state_data)
 
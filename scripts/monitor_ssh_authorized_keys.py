@@ -27,6 +27,7 @@ import sys
 from typing import List, Tuple, Dict, Any
 
 import lib.global_vars
+from lib.fingerprint_cache import FingerprintCache
 from lib.state import load_state, store_state
 from lib.util import output_error, output_finding
 from lib.util_user import get_system_users
@@ -52,7 +53,7 @@ def _get_home_dirs() -> List[Tuple[str, str]]:
     return [(x.name, x.home) for x in get_system_users()]
 
 
-def _get_system_ssh_data() -> List[Dict[str, Any]]:
+def _get_system_ssh_data(fingerprint_cache: FingerprintCache) -> List[Dict[str, Any]]:
     ssh_data = []
     user_home_list = _get_home_dirs()
 
@@ -63,7 +64,9 @@ def _get_system_ssh_data() -> List[Dict[str, Any]]:
             if os.path.isfile(authorized_keys_file):
                 ssh_user_data = {"user": user,
                                  "authorized_keys_file": authorized_keys_file,
-                                 "authorized_keys_entries": _parse_authorized_keys_file(authorized_keys_file)}
+                                 "authorized_keys_entries": fingerprint_cache.get(authorized_keys_file,
+                                                                                  "authorized_keys",
+                                                                                  _parse_authorized_keys_file)}
                 ssh_data.append(ssh_user_data)
     return ssh_data
 
@@ -78,7 +81,7 @@ def _parse_authorized_keys_file(authorized_keys_file: str) -> List[str]:
     except Exception as e:
         raise MonitorSSHException("Unable to parse file '%s'; Exception: '%s'" % (authorized_keys_file, str(e)))
 
-    return list(entries)
+    return sorted(entries)
 
 
 def monitor_ssh_authorized_keys():
@@ -95,11 +98,13 @@ def monitor_ssh_authorized_keys():
 
     stored_ssh_data = []
     curr_ssh_data = []
+    fingerprint_cache = None
     try:
         state_data = load_state(STATE_DIR)
         if "ssh_data" in state_data.keys():
             stored_ssh_data = state_data["ssh_data"]
-        curr_ssh_data = _get_system_ssh_data()
+        fingerprint_cache = FingerprintCache(STATE_DIR)
+        curr_ssh_data = _get_system_ssh_data(fingerprint_cache)
 
     except Exception as e:
         output_error(__file__, str(e))
@@ -172,6 +177,7 @@ def monitor_ssh_authorized_keys():
     try:
         state_data["ssh_data"] = curr_ssh_data
         store_state(STATE_DIR, state_data)
+        fingerprint_cache.store()
 
     except Exception as e:
         output_error(__file__, str(e))
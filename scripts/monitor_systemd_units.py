@@ -26,11 +26,14 @@ https://www.trendmicro.com/en_us/research/23/c/iron-tiger-sysupdate-adds-linux-t
 
 import os
 import sys
-from typing import Dict
+from typing import Dict, Optional
 
 import lib.global_vars
+from lib.blob_state import BlobStore
+from lib.fingerprint_cache import FingerprintCache
 from lib.state import load_state, store_state
 from lib.util import get_diff_per_line, output_error, output_finding
+from lib.util_merkle import MerkleTree
 
 # Read configuration.
 try:
@@ -57,7 +60,52 @@ except:
                          "/lib/systemd/network"]
 
 
-def _get_system_unit_files() -> Dict[str, str]:
+def _process_unit_file(file_location: str, blob_store: BlobStore) -> Optional[str]:
+    """
+    Checks if the given file is a systemd unit file that can execute commands and places its content into the
+    blob store.
+
+    :param file_location:
+    :param blob_store:
+    :return: hash of the content of the unit file or None if it is not of interest
+    """
+    with open(file_location, "rt") as fp:
+        data = fp.read()
+
+    # Filter for systemd unit files that can execute commands
+    if "[Unit]" in data and "[Service]" in data:
+        # Since keys do not have to start at the beginning of the line, we go through each line,
+        # remove whitespaces leading whitespaces and check if it starts with a key we are interested in
+        for line in data.split("\n"):
+            normalized_line = line.strip()
+            if any(normalized_line.startswith(x) for x in ["ExecStart",
+                                                           "ExecStartPre",
+                                                           "ExecStartPost",
+                                                           "ExecReload",
+                                                           "ExecStop",
+                                                           "ExecStopPost"]):
+
+                # Store complete data of unit file in the blob store. Identical unit files (e.g.,
+                # copies in /lib/systemd/system and /etc/systemd/system) are only stored once and
+                # the state just holds the hash of the data. Further, it will prevent
+                # race-conditions when we already have the data stored and do not read it
+                # afterwards from the file if we generate alerts.
+                return blob_store.put(data.encode("utf-8"))
+
+    return None
+
+
+def _get_system_unit_files(blob_store: BlobStore, fingerprint_cache: FingerprintCache) -> Dict[str, str]:
+    """
+    Gets all systemd unit files that can execute commands. The content of the files is placed into the blob store.
+
+    :param blob_store:
+    :param fingerprint_cache:
+    :return: dictionary with the location of the unit file as key and the hash of its content as value
+    """
+    def process_unit_file(file_location: str) -> Optional[str]:
+        return _process_unit_file(file_location, blob_store)
+
     systemd_unit_files = dict()
     for systemd_unit_dir in SYSTEMD_UNIT_DIRS:
         for root, _, files in os.walk(systemd_unit_dir):
@@ -66,31 +114,14 @@ def _get_system_unit_files() -> Dict[str, str]:
 
                 # Some files are broken symlinks, hence, check if they exist
                 if os.path.exists(file_location):
-                    with open(file_location, "rt") as fp:
-                        data = fp.read()
-
-                    # Filter for systemd unit files that can execute commands
-                    if "[Unit]" in data and "[Service]" in data:
-                        # Since keys do not have to start at the beginning of the line, we go through each line,
-                        # remove whitespaces leading whitespaces and check if it starts with a key we are interested in
-                        for line in data.split("\n"):
-                            normalized_line = line.strip()
-                            if any(normalized_line.startswith(x) for x in ["ExecStart",
-                                                                           "ExecStartPre",
-                                                                           "ExecStartPost",
-                                                                           "ExecReload",
-                                                                           "ExecStop",
-                                                                           "ExecStopPost"]):
-
-                                # Store complete data of unit file. Even on a non-server system such as a
-                                # xubuntu 22.04 we only have around 700 unit files of interest. Calculating with
-                                # 1kB of data per file (which is way larger than a normal unit file has) we only
-                                # need a little over 700 kB memory for this. Even on a Raspberry Pi we have no
-                                # problem doing this. Further, it will prevent race-conditions when we already
-                                # have the data stored and do not read it afterwards from the file if we generate
-                                # alerts.
-                                systemd_unit_files[file_location] = data
-                                break
+                    unit_hash = fingerprint_cache.get(file_location, "unit", process_unit_file)
+
+                    # Process the file again if the blob of the cached hash does no longer exist.
+                    if unit_hash is not None and not blob_store.contains(unit_hash):
+                        unit_hash = fingerprint_cache.get(file_location, "unit", process_unit_file, force=True)
+
+                    if unit_hash is not None:
+                        systemd_unit_files[file_location] = unit_hash
 
     return systemd_unit_files
 
@@ -107,58 +138,101 @@ def monitor_systemd_units():
         return
 
     stored_systemd_units_data = {}
+    blob_store = None
+    fingerprint_cache = None
     try:
         stored_systemd_units_data = load_state(STATE_DIR)
+        blob_store = BlobStore(STATE_DIR)
+        fingerprint_cache = FingerprintCache(STATE_DIR)
+
+        # Migrate old state that holds the complete data of the unit files into the blob store.
+        if "units" in stored_systemd_units_data.keys():
+            stored_systemd_units_data["unit_hashes"] = {}
+            for stored_unit_file, stored_unit_data in stored_systemd_units_data["units"].items():
+                unit_hash = blob_store.put(stored_unit_data.encode("utf-8"))
+                stored_systemd_units_data["unit_hashes"][stored_unit_file] = unit_hash
+            del stored_systemd_units_data["units"]
 
     except Exception as e:
         output_error(__file__, str(e))
         return
 
-    # Add units key in case we do not have any stored data yet.
-    if "units" not in stored_systemd_units_data.keys():
-        stored_systemd_units_data["units"] = {}
+    # Add unit hashes key in case we do not have any stored data yet.
+    if "unit_hashes" not in stored_systemd_units_data.keys():
+        stored_systemd_units_data["unit_hashes"] = {}
 
-    curr_systemd_units_data = {}
+    curr_unit_hashes = {}
     try:
-        curr_systemd_units_data = _get_system_unit_files()
+        curr_unit_hashes = _get_system_unit_files(blob_store, fingerprint_cache)
 
     except Exception as e:
         output_error(__file__, str(e))
         return
 
-    # Compare stored unit files data with current one.
-    stored_units_data = stored_systemd_units_data["units"]
-    for stored_unit_file, stored_unit_data in stored_units_data.items():
+    # Compare stored unit files data with current one. Only subtrees whose hashes differ are compared.
+    stored_unit_hashes = stored_systemd_units_data["unit_hashes"]
+    stored_tree = MerkleTree(stored_unit_hashes, stored_systemd_units_data.get("unit_merkle"))
+    curr_tree = MerkleTree(curr_unit_hashes)
+    for unit_file in curr_tree.get_changed_files(stored_tree):
 
         # Check if unit file was deleted.
-        if stored_unit_file not in curr_systemd_units_data.keys():
-            message = "Systemd unit file '%s' was deleted." % stored_unit_file
+        if unit_file not in curr_unit_hashes.keys():
+            message = "Systemd unit file '%s' was deleted." % unit_file
             output_finding(__file__, message)
             continue
 
-        # Check if unit file was modified.
-        if stored_unit_data != curr_systemd_units_data[stored_unit_file]:
-
-            diff = get_diff_per_line("Old",
-                                     stored_unit_data,
-                                     "New",
-                                     curr_systemd_units_data[stored_unit_file])
+        # Check new unit file added.
+        if unit_file not in stored_unit_hashes.keys():
+            try:
+                curr_unit_data = blob_store.get(curr_unit_hashes[unit_file]).decode("utf-8")
 
-            message = "Systemd unit file '%s' was modified:\n\nDiff:\n%s\n\nNew file:\n%s" % (stored_unit_file,
-                                                                                              diff,
-                                                                                              curr_systemd_units_data[stored_unit_file])  # noqa:E501
+            except Exception as e:
+                output_error(__file__, str(e))
+                curr_unit_data = ""
 
+            message = "Systemd unit file '%s' was added:\n\n%s" % (unit_file,
+                                                                   curr_unit_data)
             output_finding(__file__, message)
+            continue
+
+        # Unit file was modified.
+        try:
+            stored_unit_data = blob_store.get(stored_unit_hashes[unit_file]).decode("utf-8")
+            curr_unit_data = blob_store.get(curr_unit_hashes[unit_file]).decode("utf-8")
 
-    # Check new unit file added.
-    for curr_unit_file in curr_systemd_units_data.keys():
-        if curr_unit_file not in stored_units_data.keys():
-            message = "Systemd unit file '%s' was added:\n\n%s" % (curr_unit_file,
-                                                                   curr_systemd_units_data[curr_unit_file])
+        except Exception as e:
+            output_error(__file__, str(e))
+            message = "Systemd unit file '%s' was modified." % unit_file
             output_finding(__file__, message)
+            continue
+
+        diff = get_diff_per_line("Old",
+                                 stored_unit_data,
+                                 "New",
+                                 curr_unit_data)
+
+        message = "Systemd unit file '%s' was modified:\n\nDiff:\n%s\n\nNew file:\n%s" % (unit_file,
+                                                                                          diff,
+                                                                                          curr_unit_data)
+
+        output_finding(__file__, message)
 
     try:
-        store_state(STATE_DIR, {"units": curr_systemd_units_data})
+        store_state(STATE_DIR, {"unit_hashes": curr_unit_hashes,
+                                "unit_merkle": curr_tree.dir_hashes})
+
+        # Only remove the old unit file data after the new state was stored successfully.
+        blob_store.collect_garbage(curr_unit_hashes.values())
+        fingerprint_cache.store()
+
+    except Exception as e:
+        output_error(__file__, str(e))
+
+
+def print_merkle_root():
+    try:
+        state_data = load_state(STATE_DIR)
+        print(MerkleTree(state_data.get("unit_hashes", {}), state_data.get("unit_merkle")).root_hash)
 
     except Exception as e:
         output_error(__file__, str(e))
@@ -169,4 +243,9 @@ if __name__ == '__main__':
         # Suppress output in our initial execution to establish a state.
         if sys.argv[1] == "--init":
             lib.global_vars.SUPPRESS_OUTPUT = True
+
+        # Print the root hash of the stored state (e.g., to compare it with the one of a golden image).
+        elif sys.argv[1] == "--merkle-root":
+            print_merkle_root()
+            sys.exit(0)
     monitor_systemd_units()
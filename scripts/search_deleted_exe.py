@@ -10,26 +10,36 @@
 """
 Short summary:
 Search running programs whose binary was deleted. Indicator of malicious programs.
+Additionally, the content of the deleted binaries is matched against signatures of known malicious content
+(e.g., crypto miners and reverse shells) and their hashes are checked against the hashes of known malicious files
+(if IOC_FILTER is set).
 
 Requirements:
 None
 """
 
 import os
-import re
 import sys
+from typing import List
 
-from lib.util import output_finding
+from lib.ioc_filter import load_ioc_checker
+from lib.signature_matcher import load_signature_matcher
+from lib.util import output_error, output_finding
+from lib.util_proc import ProcessInfo, ProcSnapshot
 
 # Read configuration.
 try:
-    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR
-    from config.search_deleted_exe import ACTIVATED
+    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR, STATE_DIR
+    from config.search_deleted_exe import ACTIVATED, SEARCH_SIGNATURES
+
+    STATE_DIR = os.path.join(os.path.dirname(__file__), STATE_DIR, os.path.basename(__file__))
 except:
     ALERTR_FIFO = None
     FROM_ADDR = None
     TO_ADDR = None
     ACTIVATED = True
+    SEARCH_SIGNATURES = True
+    STATE_DIR = os.path.join("/tmp", os.path.basename(__file__))
 
 
 def search_deleted_exe_files():
@@ -44,31 +54,66 @@ def search_deleted_exe_files():
             print("Module deactivated.")
         return
 
-    # Get all suspicious ELF files.
-    fd = os.popen("ls -laR /proc/*/exe 2> /dev/null | grep -v memfd: | grep \\(deleted\\)")
-    suspicious_exe_raw = fd.read().strip()
-    fd.close()
+    # Get all processes whose binary was deleted (deleted memfd files are searched by search_memfd_create.py).
+    suspicious_exes = []  # type: List[ProcessInfo]
+    try:
+        for process in ProcSnapshot():
+            exe = process.exe
+            if exe is not None and exe.endswith(" (deleted)") and not exe.startswith("/memfd:"):
+                suspicious_exes.append(process)
 
-    suspicious_exes = []
-    if suspicious_exe_raw.strip():
-        suspicious_exes.extend(suspicious_exe_raw.strip().split("\n"))
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
+
+    matcher = None
+    ioc_checker = None
+    if suspicious_exes:
+        try:
+            if SEARCH_SIGNATURES:
+                matcher = load_signature_matcher(STATE_DIR)
+            ioc_checker = load_ioc_checker(STATE_DIR)
+
+        except Exception as e:
+            output_error(__file__, str(e))
 
     if suspicious_exes:
         message = "Deleted executable file(s) found:\n\n"
-        for suspicious_exe in suspicious_exes:
-            match = re.search(r" (/proc/(\d+)/exe -> .*)$", suspicious_exe)
-            exe = match.group(1)
-            pid = match.group(2)
-            message += "\n%s" % exe
-            with open("/proc/%s/cmdline" % pid, "rb") as fp:
-                cmdline = fp.read()
-                # Replace 0-bytes with whitespaces for readability
-                cmdline = cmdline.replace(b"\x00", b" ")
-                message += "\n/proc/%s/cmdline -> %s" % (pid, cmdline.decode("utf-8"))
+        for process in suspicious_exes:
+            message += "\n/proc/%d/exe -> %s" % (process.pid, process.exe)
+            # Arguments are separated by whitespaces for readability.
+            message += "\n/proc/%d/cmdline -> %s" % (process.pid, " ".join(process.cmdline or []))
+
+            # The content of the deleted binary is still accessible via the exe link of the process.
+            if matcher is not None or ioc_checker is not None:
+                try:
+                    fd = os.open(process.get_file("exe"), os.O_RDONLY)
+                    try:
+                        if matcher is not None:
+                            signatures = matcher.match_fd(fd)
+                            if signatures:
+                                message += "\nSignatures: %s" % ", ".join(signatures)
+                        if ioc_checker is not None:
+                            ioc_hash = ioc_checker.check_fd(fd)
+                            if ioc_hash is not None:
+                                message += "\nKnown malicious SHA-256: %s" % ioc_hash
+                    finally:
+                        os.close(fd)
+
+                # Process exited in the meantime.
+                except OSError:
+                    pass
             message += "\n"
 
         output_finding(__file__, message)
 
+    if ioc_checker is not None:
+        try:
+            ioc_checker.finish()
+
+        except Exception as e:
+            output_error(__file__, str(e))
+
 
 if __name__ == '__main__':
     is_init_run = False
@@ -9,8 +9,11 @@
 
 """
 Short summary:
-Search for binaries and scripts in /dev/shm.
-Malware that tries to hide is often stored there.
+Search for binaries and scripts in /dev/shm and other drop locations (e.g., /tmp or all tmpfs mounts).
+Malware that tries to hide is often stored there. Additionally, the content of all files in these locations is matched
+against signatures of known malicious content (e.g., crypto miners, reverse shells and webshells) and ELF files are
+checked against the hashes of known malicious files (if IOC_FILTER is set). For each found file, the entropy profile
+of its content is reported (packed or encrypted payloads have a high entropy).
 
 Requirements:
 None
@@ -22,18 +25,258 @@ https://twitter.com/CraigHRowland/status/1269196509079166976
 
 import os
 import sys
+import threading
+from typing import Any, Dict, List, Optional
 
-from lib.util import output_finding
+from lib.inode_cache import InodeCache
+from lib.ioc_filter import IocChecker, load_ioc_checker
+from lib.signature_matcher import SignatureMatcher, load_signature_matcher
+from lib.traversal import Detector, EntryContext, TraversalEngine
+from lib.util import output_error, output_finding
+from lib.util_entropy import format_entropy_profile, get_entropy_profile
+from lib.util_file import DirectoryWhitelist, FileLocation, FileWhitelist
+from lib.util_filetype import FILETYPE_HEADER_SIZE, get_executable_type
+from lib.util_mount import discover_drop_locations
 
 # Read configuration.
 try:
-    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR
-    from config.search_dev_shm import ACTIVATED
+    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR, STATE_DIR, COMBINED_FILESYSTEM_SEARCH
+    from config.search_dev_shm import ACTIVATED, DROP_LOCATIONS, DISCOVER_DROP_LOCATIONS, DISCOVER_FS_TYPES, \
+        MAX_FILES, MAX_FILES_PER_DIRECTORY, MAX_SCANNED_BYTES, SEARCH_SIGNATURES, REPORT_ENTROPY, \
+        DROP_DIRECTORY_WHITELIST, DROP_FILE_WHITELIST
+
+    STATE_DIR = os.path.join(os.path.dirname(__file__), STATE_DIR, os.path.basename(__file__))
 except:
     ALERTR_FIFO = None
     FROM_ADDR = None
     TO_ADDR = None
+    COMBINED_FILESYSTEM_SEARCH = False
     ACTIVATED = True
+    DROP_LOCATIONS = ["/dev/shm", "/tmp", "/var/tmp", "/run/user", "/dev/mqueue"]
+    DISCOVER_DROP_LOCATIONS = True
+    DISCOVER_FS_TYPES = ["tmpfs", "ramfs"]
+    MAX_FILES = 10000
+    MAX_FILES_PER_DIRECTORY = 1000
+    MAX_SCANNED_BYTES = 268435456
+    SEARCH_SIGNATURES = True
+    REPORT_ENTROPY = True
+    DROP_DIRECTORY_WHITELIST = []
+    DROP_FILE_WHITELIST = []
+    STATE_DIR = os.path.join("/tmp", os.path.basename(__file__))
+
+
+class DevShmDetector(Detector):
+    """
+    Detects files in drop locations that can be executed (e.g., ELF binaries and scripts) or whose content matches
+    signatures. Each file is classified by reading its header once and its content is matched against all signatures
+    in a single pass. The results are cached and only determined again if the inode, modification or change time of
+    the file or the signatures change.
+    """
+
+    name = os.path.basename(__file__)
+    header_size = FILETYPE_HEADER_SIZE
+
+    def __init__(self,
+                 locations: List[str],
+                 inode_cache: InodeCache,
+                 matcher: Optional[SignatureMatcher] = None,
+                 ioc_checker: Optional[IocChecker] = None,
+                 report_entropy: bool = False,
+                 max_files: int = MAX_FILES,
+                 max_files_per_directory: int = MAX_FILES_PER_DIRECTORY,
+                 max_scanned_bytes: int = MAX_SCANNED_BYTES):
+        """
+        :param locations:
+        :param inode_cache:
+        :param matcher: signatures the content of the files is matched against (None to not match any)
+        :param ioc_checker: hashes of known malicious files ELF files are checked against (None to not check them)
+        :param report_entropy: calculate the entropy profile of found files
+        :param max_files:
+        :param max_files_per_directory:
+        :param max_scanned_bytes:
+        """
+        super().__init__(locations)
+        self._inode_cache = inode_cache
+        self._matcher = matcher
+        self._ioc_checker = ioc_checker
+        self._report_entropy = report_entropy
+        self._signature_id = matcher.signature_id if matcher is not None else ""
+        self._max_files = max_files
+        self._max_files_per_directory = max_files_per_directory
+        self._classified_files = 0
+        self._classified_files_per_directory = {}  # type: Dict[str, int]
+        self._max_scanned_bytes = max_scanned_bytes
+        self._scanned_bytes = 0
+        self._skipped_files = 0
+
+        # Locations are searched by multiple threads in parallel.
+        self._limit_lock = threading.Lock()
+
+    @property
+    def cache_id(self) -> str:
+        cache_id = self.name
+        if self._matcher is not None:
+            cache_id += ":%s" % self._matcher.signature_id
+        if self._ioc_checker is not None:
+            cache_id += ":%s" % self._ioc_checker.filter_id
+        if self._report_entropy:
+            cache_id += ":entropy"
+        return cache_id
+
+    def _classify(self, context: EntryContext) -> List[Any]:
+        file_type = get_executable_type(context.header)
+        signatures = []  # type: List[str]
+        if self._matcher is not None:
+            signatures = self._matcher.match_file(context.path)
+
+        # The entropy is only calculated for files that are reported.
+        entropy_profile = None
+        if self._report_entropy and (file_type is not None or signatures):
+            entropy_profile = get_entropy_profile(context.path)
+
+        return [file_type, signatures, entropy_profile]
+
+    def check(self, context: EntryContext) -> Optional[List[Any]]:
+        if not context.entry.is_file(follow_symlinks=False):
+            return None
+
+        file_stat = context.stat
+        stamp = [file_stat.st_mtime_ns, file_stat.st_ctime_ns, self._signature_id, self._report_entropy]
+
+        # Stop classifying new or changed files if a limit is reached. The file is counted before it is classified,
+        # hence the limits also hold if multiple threads classify files at the same time.
+        if not self._inode_cache.is_cached(file_stat, stamp):
+            directory = os.path.dirname(context.path)
+            with self._limit_lock:
+                if (0 < self._max_files <= self._classified_files
+                        or 0 < self._max_files_per_directory <= self._classified_files_per_directory.get(directory, 0)
+                        or 0 < self._max_scanned_bytes <= self._scanned_bytes):
+                    self._skipped_files += 1
+                    return None
+
+                self._classified_files += 1
+                self._classified_files_per_directory[directory] = \
+                    self._classified_files_per_directory.get(directory, 0) + 1
+                if self._matcher is not None:
+                    self._scanned_bytes += self._matcher.get_scan_size(file_stat.st_size)
+
+        file_type, signatures, entropy_profile = self._inode_cache.get(file_stat,
+                                                                       stamp,
+                                                                       lambda: self._classify(context))
+
+        ioc_hash = None
+        if self._ioc_checker is not None and file_type is not None and file_type.startswith("ELF"):
+            ioc_hash = self._ioc_checker.check_file(context.path, file_stat)
+
+        if file_type is None and not signatures:
+            return None
+        return [context.path, file_type, signatures, ioc_hash, entropy_profile]
+
+    def finish(self):
+        if self._skipped_files:
+            output_error(__file__, "Limit of classified files reached (%d in total; %d per directory; %d bytes matched "
+                                   "against signatures). %d file(s) were not checked and are checked during the next "
+                                   "executions."
+                         % (self._max_files, self._max_files_per_directory, self._max_scanned_bytes,
+                            self._skipped_files))
+
+        # Unused entries are not kept since all files are visited during each execution.
+        self._inode_cache.store()
+        if self._ioc_checker is not None:
+            self._ioc_checker.finish()
+
+
+def get_drop_locations() -> List[str]:
+    """
+    :return: configured and discovered drop locations that exist
+    """
+    locations = list(DROP_LOCATIONS)
+    if DISCOVER_DROP_LOCATIONS:
+        locations.extend(discover_drop_locations(DISCOVER_FS_TYPES))
+
+    drop_locations = []  # type: List[str]
+    for location in locations:
+        location = os.path.normpath(location)
+        if location not in drop_locations and os.path.isdir(location) and not os.path.islink(location):
+            drop_locations.append(location)
+    return drop_locations
+
+
+def create_detector() -> DevShmDetector:
+    """
+    :return: detector searching all drop locations
+    """
+    # An invalid signature file does not prevent the search for executable files.
+    matcher = None
+    if SEARCH_SIGNATURES:
+        try:
+            matcher = load_signature_matcher(STATE_DIR)
+
+        except Exception as e:
+            output_error(__file__, str(e))
+
+    # A missing or corrupted IOC filter does not prevent the search for executable files.
+    ioc_checker = None
+    try:
+        ioc_checker = load_ioc_checker(STATE_DIR)
+
+    except Exception as e:
+        output_error(__file__, str(e))
+
+    return DevShmDetector(get_drop_locations(),
+                          InodeCache(STATE_DIR),
+                          matcher,
+                          ioc_checker,
+                          REPORT_ENTROPY)
+
+
+def get_combined_detector() -> Optional[DevShmDetector]:
+    """
+    :return: detector for the combined filesystem search (None if this script does not take part in it)
+    """
+    if not ACTIVATED:
+        return None
+
+    return create_detector()
+
+
+def process_suspicious_files(found_files: List[List[Any]]):
+    """
+    Applies the whitelists to the found suspicious files and outputs the remaining ones.
+
+    :param found_files: list of [file location, file type, matched signatures, known malicious hash, entropy profile]
+    entries (the file type is None if the file is not executable, the hash is None if the file is not known to be
+    malicious and the entropy profile is None if it was not calculated)
+    """
+    suspicious_files = []  # type: List[str]
+    try:
+        dir_whitelist = DirectoryWhitelist([FileLocation(x) for x in DROP_DIRECTORY_WHITELIST])
+        file_whitelist = FileWhitelist([FileLocation(x) for x in DROP_FILE_WHITELIST])
+
+        for file_location, file_type, signatures, ioc_hash, entropy_profile in found_files:
+            if dir_whitelist.is_whitelisted(file_location) or file_whitelist.is_whitelisted(file_location):
+                continue
+
+            line = "File: %s" % file_location
+            if file_type is not None:
+                line += "; Type: %s" % file_type
+            if signatures:
+                line += "; Signatures: %s" % ", ".join(signatures)
+            if ioc_hash is not None:
+                line += "; Known malicious SHA-256: %s" % ioc_hash
+            if entropy_profile is not None:
+                line += "; Entropy: %s" % format_entropy_profile(entropy_profile)
+            suspicious_files.append(line)
+
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
+
+    if suspicious_files:
+        message = "File(s) in drop locations suspicious:\n\n"
+        message += "\n".join(suspicious_files)
+
+        output_finding(__file__, message)
 
 
 def search_suspicious_files():
@@ -48,27 +291,25 @@ def search_suspicious_files():
             print("Module deactivated.")
         return
 
-    # Get all suspicious ELF files.
-    fd = os.popen("find /dev/shm -type f -exec file -p '{}' \\; | grep ELF")
-    elf_raw = fd.read().strip()
-    fd.close()
+    # The search is done by search_filesystem.py together with other searches.
+    if COMBINED_FILESYSTEM_SEARCH:
+        return
 
-    # Get all suspicious script files.
-    fd = os.popen("find /dev/shm -type f -exec file -p '{}' \\; | grep script")
-    script_raw = fd.read().strip()
-    fd.close()
+    # All drop locations are searched in a single pass. They are split by the mounts they contain and processed in
+    # parallel (grouped by the device they are stored on).
+    found_files = []  # type: List[Any]
+    try:
+        detector = create_detector()
 
-    suspicious_files = []
-    if elf_raw.strip():
-        suspicious_files.extend(elf_raw.strip().split("\n"))
-    if script_raw.strip():
-        suspicious_files.extend(script_raw.strip().split("\n"))
+        # Drop locations are writable, hence no results are cached.
+        results = TraversalEngine([detector]).run({}, lambda x: output_error(__file__, x))
+        found_files = results[detector.name]
 
-    if suspicious_files:
-        message = "File(s) in /dev/shm suspicious:\n\n"
-        message += "\n".join(suspicious_files)
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
 
-        output_finding(__file__, message)
+    process_suspicious_files(found_files)
 
 
 if __name__ == '__main__':
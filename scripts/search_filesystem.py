@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# written by sqall
+# twitter: https://twitter.com/sqall01
+# blog: https://h4des.org
+# github: https://github.com/sqall01
+#
+# Licensed under the MIT License.
+
+"""
+Short summary:
+Combines the filesystem searches of search_hidden_exe.py, search_immutable_files.py and search_dev_shm.py into a
+single traversal. Each file is only visited once and all checks are performed on it. The findings are still reported
+under the names of the scripts the checks belong to and with their whitelists. Activated by setting
+COMBINED_FILESYSTEM_SEARCH in config.py (the other scripts do not search on their own then).
+
+Requirements:
+None
+"""
+
+import os
+import sys
+from typing import List
+
+import search_dev_shm
+import search_hidden_exe
+import search_immutable_files
+from lib.step_state import load_step_state, store_step_state
+from lib.traversal import Detector, TraversalEngine
+from lib.util import output_error
+
+# Read configuration.
+try:
+    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR, STATE_DIR, COMBINED_FILESYSTEM_SEARCH
+
+    STATE_DIR = os.path.join(os.path.dirname(__file__), STATE_DIR, os.path.basename(__file__))
+except:
+    ALERTR_FIFO = None
+    FROM_ADDR = None
+    TO_ADDR = None
+    COMBINED_FILESYSTEM_SEARCH = False
+    STATE_DIR = os.path.join("/tmp", os.path.basename(__file__))
+
+
+def search_filesystem():
+    # Decide where to output results.
+    print_output = False
+    if ALERTR_FIFO is None and FROM_ADDR is None and TO_ADDR is None:
+        print_output = True
+
+    if not COMBINED_FILESYSTEM_SEARCH:
+        if print_output:
+            print("Module deactivated.")
+        return
+
+    step_state_data = {}
+    try:
+        step_state_data = load_step_state(STATE_DIR)
+
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
+
+    # Scripts that are deactivated or search in steps do not take part in the combined search.
+    processors = {search_hidden_exe.HiddenExeDetector.name: search_hidden_exe.process_hidden_exe_files,
+                  search_immutable_files.ImmutableDetector.name: search_immutable_files.process_immutable_files,
+                  search_dev_shm.DevShmDetector.name: search_dev_shm.process_suspicious_files}
+    detectors = []  # type: List[Detector]
+    try:
+        for get_detector in [search_hidden_exe.get_combined_detector,
+                             search_immutable_files.get_combined_detector,
+                             search_dev_shm.get_combined_detector]:
+            detector = get_detector()
+            if detector is not None:
+                detectors.append(detector)
+
+        results = TraversalEngine(detectors).run(step_state_data["mount_cache"], lambda x: output_error(__file__, x))
+
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
+
+    for name, found_files in results.items():
+        processors[name](found_files)
+
+    try:
+        store_step_state(STATE_DIR, step_state_data)
+
+    except Exception as e:
+        output_error(__file__, str(e))
+
+
+if __name__ == '__main__':
+    is_init_run = False
+    if len(sys.argv) == 2:
+        if sys.argv[1] == "--init":
+            is_init_run = True
+
+    # Script does not need to establish a state.
+    if not is_init_run:
+        search_filesystem()
@@ -10,6 +10,10 @@
 """
 Short summary:
 Searches for hidden ELF files in the filesystem. Usually, ELF binaries are not hidden in a Linux environment.
+Additionally, the content of all hidden files is matched against signatures of known malicious content (e.g., crypto
+miners, reverse shells and webshells) and hidden ELF files are checked against the hashes of known malicious files
+(if IOC_FILTER is set). For each found file, the entropy profile of its content is reported (packed or encrypted
+payloads have a high entropy).
 
 Requirements:
 None
@@ -17,31 +21,292 @@ None
 
 import os
 import sys
-from typing import List
-
-from lib.step_state import StepLocation, load_step_state, store_step_state
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from lib.inode_cache import InodeCache
+from lib.ioc_filter import IocChecker, load_ioc_checker
+from lib.signature_matcher import SignatureMatcher, load_signature_matcher
+from lib.step_state import get_step_coverage, get_step_generations, get_step_time_budget, iter_step_entries, \
+    load_step_state, store_step_state
+from lib.traversal import Detector, EntryContext, TraversalEngine
 from lib.util import output_error, output_finding
-from lib.util_file import FileLocation, apply_directory_whitelist, apply_file_whitelist
+from lib.util_entropy import format_entropy_profile, get_entropy_profile
+from lib.util_file import DirectoryWhitelist, FileLocation, FileWhitelist
+from lib.util_mount import get_location_mount_ids, get_skipped_mount_points
 
 # Read configuration.
 try:
-    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR, STATE_DIR
-    from config.search_hidden_exe import ACTIVATED, SEARCH_IN_STEPS, SEARCH_LOCATIONS, \
-        HIDDEN_EXE_DIRECTORY_WHITELIST, HIDDEN_EXE_FILE_WHITELIST
+    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR, STATE_DIR, COMBINED_FILESYSTEM_SEARCH
+    from config.search_hidden_exe import ACTIVATED, SEARCH_IN_STEPS, SEARCH_STEP_TIME_BUDGET, SEARCH_LOCATIONS, \
+        STAY_ON_FILESYSTEM, SEARCH_SIGNATURES, MAX_SCANNED_BYTES, REPORT_ENTROPY, HIDDEN_EXE_DIRECTORY_WHITELIST, \
+        HIDDEN_EXE_FILE_WHITELIST
 
     STATE_DIR = os.path.join(os.path.dirname(__file__), STATE_DIR, os.path.basename(__file__))
 except:
     ALERTR_FIFO = None
     FROM_ADDR = None
     TO_ADDR = None
+    COMBINED_FILESYSTEM_SEARCH = False
     ACTIVATED = True
     SEARCH_IN_STEPS = False
+    SEARCH_STEP_TIME_BUDGET = None
     SEARCH_LOCATIONS = ["/"]
+    STAY_ON_FILESYSTEM = False
+    SEARCH_SIGNATURES = True
+    MAX_SCANNED_BYTES = 268435456
+    REPORT_ENTROPY = True
     HIDDEN_EXE_DIRECTORY_WHITELIST = []
     HIDDEN_EXE_FILE_WHITELIST = []
     STATE_DIR = os.path.join("/tmp", os.path.basename(__file__))
 
 
+class HiddenExeDetector(Detector):
+    """
+    Detects hidden ELF files and hidden files whose content matches signatures. The matched signatures and the
+    entropy profile are cached and only determined again if the ctime of the file or the signatures change.
+    """
+
+    name = os.path.basename(__file__)
+    header_size = 4
+
+    def __init__(self,
+                 locations: List[str],
+                 mount_ids: Optional[Set[int]] = None,
+                 matcher: Optional[SignatureMatcher] = None,
+                 inode_cache: Optional[InodeCache] = None,
+                 ioc_checker: Optional[IocChecker] = None,
+                 report_entropy: bool = False,
+                 step_state_data: Optional[Dict[str, Any]] = None,
+                 max_scanned_bytes: int = MAX_SCANNED_BYTES):
+        """
+        :param locations:
+        :param mount_ids:
+        :param matcher: signatures the content of hidden files is matched against (None to not match any)
+        :param inode_cache: cache of the matched signatures and entropy profiles (needed if a matcher is given or
+        report_entropy is set)
+        :param ioc_checker: hashes of known malicious files the hidden ELF files are checked against (None to not check)
+        :param report_entropy: calculate the entropy profile of found files
+        :param step_state_data: step state if only a part of the locations is searched (unused cache entries are kept
+        until they were not seen during a complete pass)
+        :param max_scanned_bytes: maximal number of bytes matched against the signatures (0 means no limit)
+        """
+        super().__init__(locations, mount_ids)
+        self._matcher = matcher
+        self._inode_cache = inode_cache
+        self._ioc_checker = ioc_checker
+        self._report_entropy = report_entropy
+        self._signature_id = matcher.signature_id if matcher is not None else ""
+        self._step_state_data = step_state_data
+        self._max_scanned_bytes = max_scanned_bytes
+        self._scanned_bytes = 0
+        self._skipped_files = 0
+
+        # Locations are searched by multiple threads in parallel.
+        self._limit_lock = threading.Lock()
+
+    @property
+    def cache_id(self) -> str:
+        cache_id = self.name
+        if self._matcher is not None:
+            cache_id += ":%s" % self._matcher.signature_id
+        if self._ioc_checker is not None:
+            cache_id += ":%s" % self._ioc_checker.filter_id
+        if self._report_entropy:
+            cache_id += ":entropy"
+        return cache_id
+
+    def _analyze(self, context: EntryContext, is_elf: bool) -> List[Any]:
+        signatures = []  # type: List[str]
+        if self._matcher is not None:
+            signatures = self._matcher.match_file(context.path)
+
+        # The entropy is only calculated for files that are reported.
+        entropy_profile = None
+        if self._report_entropy and (is_elf or signatures):
+            entropy_profile = get_entropy_profile(context.path)
+
+        return [signatures, entropy_profile]
+
+    def check(self, context: EntryContext) -> Optional[List[Any]]:
+        if not context.entry.name.startswith("."):
+            return None
+
+        if not context.entry.is_file(follow_symlinks=False):
+            return None
+
+        is_elf = context.header[:4] == b"\x7fELF"
+
+        signatures = []  # type: List[str]
+        entropy_profile = None
+        if self._inode_cache is not None:
+            file_stat = context.stat
+            stamp = [file_stat.st_ctime_ns, self._signature_id, self._report_entropy]
+
+            # New or changed files are not analyzed (and hence not cached) once the limit is reached. The bytes of a
+            # file are counted before it is analyzed, hence the limit also holds if multiple threads analyze files at
+            # the same time.
+            is_skipped = False
+            if self._matcher is not None and not self._inode_cache.is_cached(file_stat, stamp):
+                with self._limit_lock:
+                    if 0 < self._max_scanned_bytes <= self._scanned_bytes:
+                        self._skipped_files += 1
+                        is_skipped = True
+                    else:
+                        self._scanned_bytes += self._matcher.get_scan_size(file_stat.st_size)
+
+            if not is_skipped:
+                signatures, entropy_profile = self._inode_cache.get(file_stat,
+                                                                    stamp,
+                                                                    lambda: self._analyze(context, is_elf))
+
+        ioc_hash = None
+        if is_elf and self._ioc_checker is not None:
+            ioc_hash = self._ioc_checker.check_file(context.path, context.stat)
+
+        if not is_elf and not signatures:
+            return None
+
+        return [context.path, is_elf, signatures, ioc_hash, entropy_profile]
+
+    def finish(self):
+        if self._skipped_files:
+            output_error(__file__, "Limit of bytes matched against signatures reached (%d bytes). The content of %d "
+                                   "file(s) was not matched and is matched during the next executions."
+                         % (self._max_scanned_bytes, self._skipped_files))
+
+        min_generation, generation = None, None
+        if self._step_state_data is not None:
+            min_generation, generation = get_step_generations(self._step_state_data)
+        if self._inode_cache is not None:
+            self._inode_cache.store(min_generation, generation)
+        if self._ioc_checker is not None:
+            self._ioc_checker.finish(min_generation, generation)
+
+
+def create_detector(mount_ids: Optional[Set[int]] = None,
+                    step_state_data: Optional[Dict[str, Any]] = None) -> HiddenExeDetector:
+    """
+    :param mount_ids:
+    :param step_state_data:
+    :return: detector searching all search locations
+    """
+    # An invalid signature file does not prevent the search for hidden ELF files.
+    matcher = None
+    if SEARCH_SIGNATURES:
+        try:
+            matcher = load_signature_matcher(STATE_DIR)
+
+        except Exception as e:
+            output_error(__file__, str(e))
+
+    # A missing or corrupted IOC filter does not prevent the search for hidden ELF files.
+    ioc_checker = None
+    try:
+        ioc_checker = load_ioc_checker(STATE_DIR)
+
+    except Exception as e:
+        output_error(__file__, str(e))
+
+    inode_cache = None
+    if matcher is not None or REPORT_ENTROPY:
+        inode_cache = InodeCache(STATE_DIR)
+
+    return HiddenExeDetector(SEARCH_LOCATIONS or ["/"],
+                             mount_ids,
+                             matcher,
+                             inode_cache,
+                             ioc_checker,
+                             REPORT_ENTROPY,
+                             step_state_data)
+
+
+def get_combined_detector() -> Optional[HiddenExeDetector]:
+    """
+    :return: detector for the combined filesystem search (None if this script does not take part in it)
+    """
+    if not ACTIVATED or SEARCH_IN_STEPS:
+        return None
+
+    locations = SEARCH_LOCATIONS or ["/"]
+    mount_ids = None
+    if STAY_ON_FILESYSTEM:
+        mount_ids = get_location_mount_ids(locations)
+
+    return create_detector(mount_ids)
+
+
+def _search_hidden_exe_files_step(step_state_data: Dict[str, Any]) -> List[List[Any]]:
+    """
+    Searches hidden ELF files in all search locations starting at the stored cursor until the time budget is used up.
+
+    :param step_state_data:
+    :return: list of [file location, is ELF file, matched signatures, known malicious hash, entropy profile] entries
+    """
+    # Files not visited during this step are still part of the current pass, hence unused inode cache entries
+    # are kept until they were not seen during a complete pass.
+    detector = create_detector(step_state_data=step_state_data)
+    engine = TraversalEngine([detector])
+    results = {detector.name: []}  # type: Dict[str, List[Any]]
+
+    def checkpoint():
+        # Findings are only output after the step finished, hence the cursor is not stored past unreported ones.
+        if not results[detector.name]:
+            store_step_state(STATE_DIR, step_state_data)
+
+    for entry in iter_step_entries(step_state_data,
+                                   SEARCH_LOCATIONS,
+                                   get_step_time_budget(SEARCH_STEP_TIME_BUDGET),
+                                   STAY_ON_FILESYSTEM,
+                                   get_skipped_mount_points(),
+                                   checkpoint):
+        engine.check_entry(entry, [detector], results)
+    detector.finish()
+
+    return results[detector.name]
+
+
+def process_hidden_exe_files(found_files: List[List[Any]]):
+    """
+    Applies the whitelists to the found hidden files and outputs the remaining ones.
+
+    :param found_files: list of [file location, is ELF file, matched signatures, known malicious hash, entropy profile]
+    entries
+    """
+    hidden_files = []  # type: List[str]
+    try:
+        dir_whitelist = DirectoryWhitelist([FileLocation(x) for x in HIDDEN_EXE_DIRECTORY_WHITELIST])
+        file_whitelist = FileWhitelist([FileLocation(x) for x in HIDDEN_EXE_FILE_WHITELIST])
+
+        for file_location, is_elf, signatures, ioc_hash, entropy_profile in found_files:
+            if dir_whitelist.is_whitelisted(file_location) or file_whitelist.is_whitelisted(file_location):
+                continue
+
+            line = "File: %s" % file_location
+            if is_elf:
+                line += "; Type: ELF"
+            if signatures:
+                line += "; Signatures: %s" % ", ".join(signatures)
+            if ioc_hash is not None:
+                line += "; Known malicious SHA-256: %s" % ioc_hash
+            if entropy_profile is not None:
+                line += "; Entropy: %s" % format_entropy_profile(entropy_profile)
+            hidden_files.append(line)
+
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
+
+    if hidden_files:
+        if SEARCH_SIGNATURES:
+            message = "Hidden ELF file(s) or hidden file(s) matching signatures found:\n\n"
+        else:
+            message = "Hidden ELF file(s) found:\n\n"
+        message += "\n".join(hidden_files)
+
+        output_finding(__file__, message)
+
+
 def search_hidden_exe_files():
     # Decide where to output results.
     print_output = False
@@ -53,6 +318,10 @@ def search_hidden_exe_files():
             print("Module deactivated.")
         return
 
+    # The search is done by search_filesystem.py together with other searches.
+    if COMBINED_FILESYSTEM_SEARCH and not SEARCH_IN_STEPS:
+        return
+
     step_state_data = {}
     try:
         step_state_data = load_step_state(STATE_DIR)
@@ -61,81 +330,40 @@ def search_hidden_exe_files():
         output_error(__file__, str(e))
         return
 
-    # Reset step if we do not search in steps but everything.
-    if not SEARCH_IN_STEPS:
-        step_state_data["next_step"] = 0
-
     if not SEARCH_LOCATIONS:
         SEARCH_LOCATIONS.append("/")
 
-    # Gather all search locations.
-    search_locations = []  # type: List[StepLocation]
-    # If SEARCH_IN_STEPS is active, build a list of directories to search in
-    if SEARCH_IN_STEPS:
-        for search_location in SEARCH_LOCATIONS:
-
-            # Add parent directory as non-recursive search location in order to search in it without going deeper.
-            search_locations.append(StepLocation(search_location, False))
-
-            # Add all containing subdirectories as recursive search locations.
-            elements = os.listdir(search_location)
-            elements.sort()
-            for element in elements:
-                path = os.path.join(search_location, element)
-                if os.path.isdir(path):
-                    search_locations.append(StepLocation(path, True))
-
-    # If we do not search in separated steps, just add each directory as a recursive search location.
-    else:
-        for search_location in SEARCH_LOCATIONS:
-            search_locations.append(StepLocation(search_location, True))
-
-    # Reset index if it is outside the search locations.
-    if step_state_data["next_step"] >= len(search_locations):
-        step_state_data["next_step"] = 0
-
-    while True:
-        search_location_obj = search_locations[step_state_data["next_step"]]
-
-        # Get all hidden ELF files.
-        if search_location_obj.search_recursive:
-            fd = os.popen("find %s -type f -iname \".*\" -exec echo -n \"{} \" \\; -exec head -c 4 {} \\; -exec echo \"\" \\; | grep -P \"\\x7fELF\""
-                          % search_location_obj.location)
+    # If SEARCH_IN_STEPS is active, the search locations are walked from the stored cursor on until the time budget
+    # is used up. Otherwise, the search locations are split by the mounts they contain and processed in parallel
+    # (grouped by the device they are stored on). The results of read-only filesystems are cached until a remount.
+    found_files = []  # type: List[List[Any]]
+    try:
+        if SEARCH_IN_STEPS:
+            found_files = _search_hidden_exe_files_step(step_state_data)
 
         else:
-            fd = os.popen("find %s -maxdepth 1 -type f -iname \".*\" -exec echo -n \"{} \" \\; -exec head -c 4 {} \\; -exec echo \"\" \\; | grep -P \"\\x7fELF\""
-                          % search_location_obj.location)
-        output_raw = fd.read().strip()
-        fd.close()
-
-        if output_raw != "":
-
-            hidden_files = []  # type: List[FileLocation]
-            output_list = output_raw.split("\n")
-            for output_entry in output_list:
-                file_location = output_entry[:-5]
-                hidden_files.append(FileLocation(file_location))
+            detector = create_detector()
+            results = TraversalEngine([detector]).run(step_state_data["mount_cache"],
+                                                     lambda x: output_error(__file__, x),
+                                                     STAY_ON_FILESYSTEM)
+            found_files = results[detector.name]
 
-            dir_whitelist = [FileLocation(x) for x in HIDDEN_EXE_DIRECTORY_WHITELIST]
-            file_whitelist = [FileLocation(x) for x in HIDDEN_EXE_FILE_WHITELIST]
-
-            hidden_files = apply_directory_whitelist(dir_whitelist, hidden_files)
-            hidden_files = apply_file_whitelist(file_whitelist, hidden_files)
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
 
-            if hidden_files:
-                message = "Hidden ELF file(s) found:\n\n"
-                message += "\n".join(["File: %s" % x.location for x in hidden_files])
+    process_hidden_exe_files(found_files)
 
-                output_finding(__file__, message)
+    try:
+        store_step_state(STATE_DIR, step_state_data)
 
-        step_state_data["next_step"] += 1
+    except Exception as e:
+        output_error(__file__, str(e))
 
-        # Stop search if we are finished.
-        if SEARCH_IN_STEPS or step_state_data["next_step"] >= len(search_locations):
-            break
 
+def print_coverage():
     try:
-        store_step_state(STATE_DIR, step_state_data)
+        print(get_step_coverage(load_step_state(STATE_DIR)))
 
     except Exception as e:
         output_error(__file__, str(e))
@@ -143,10 +371,15 @@ def search_hidden_exe_files():
 
 if __name__ == '__main__':
     is_init_run = False
+    is_coverage_run = False
     if len(sys.argv) == 2:
         if sys.argv[1] == "--init":
             is_init_run = True
+        elif sys.argv[1] == "--coverage":
+            is_coverage_run = True
 
     # Script does not need to establish a state.
-    if not is_init_run:
+    if is_coverage_run:
+        print_coverage()
+    elif not is_init_run:
         search_hidden_exe_files()
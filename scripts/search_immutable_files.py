@@ -9,7 +9,7 @@
 
 """
 Short summary:
-Searches for immutable files in the filesystem.
+Searches for immutable files in the filesystem (and optionally append-only files).
 
 Requirements:
 None
@@ -17,32 +17,42 @@ None
 
 import os
 import sys
-from typing import List, cast
+from typing import Any, Dict, List, Optional
 
-from lib.step_state import StepLocation, load_step_state, store_step_state
+from lib.inode_cache import InodeCache
+from lib.step_state import get_step_coverage, get_step_generations, get_step_time_budget, iter_step_entries, \
+    load_step_state, store_step_state
+from lib.traversal import Detector, EntryContext, TraversalEngine
 from lib.util import output_error, output_finding
-from lib.util_file import FileLocation, apply_directory_whitelist, apply_file_whitelist
+from lib.util_attr import FS_APPEND_FL, FS_IMMUTABLE_FL, format_inode_flags, get_inode_flags
+from lib.util_file import DirectoryWhitelist, FileLocation, FileWhitelist
+from lib.util_mount import get_skipped_mount_points
 
 # Read configuration.
 try:
-    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR, STATE_DIR
-    from config.search_immutable_files import ACTIVATED, SEARCH_IN_STEPS, SEARCH_LOCATIONS, \
-        IMMUTABLE_DIRECTORY_WHITELIST, IMMUTABLE_FILE_WHITELIST
+    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR, STATE_DIR, COMBINED_FILESYSTEM_SEARCH
+    from config.search_immutable_files import ACTIVATED, SEARCH_IN_STEPS, SEARCH_STEP_TIME_BUDGET, SEARCH_LOCATIONS, \
+        SEARCH_APPEND_ONLY, IMMUTABLE_DIRECTORY_WHITELIST, IMMUTABLE_FILE_WHITELIST
 
     STATE_DIR = os.path.join(os.path.dirname(__file__), STATE_DIR, os.path.basename(__file__))
 except:
     ALERTR_FIFO = None
     FROM_ADDR = None
     TO_ADDR = None
+    COMBINED_FILESYSTEM_SEARCH = False
     ACTIVATED = True
     SEARCH_IN_STEPS = False
+    SEARCH_STEP_TIME_BUDGET = None
     SEARCH_LOCATIONS = ["/"]
+    SEARCH_APPEND_ONLY = False
     IMMUTABLE_DIRECTORY_WHITELIST = []
     IMMUTABLE_FILE_WHITELIST = []
     STATE_DIR = os.path.join("/tmp", os.path.basename(__file__))
 
 
 class ImmutableFile(FileLocation):
+    __slots__ = ("_attribute",)
+
     def __init__(self, location: str, attribute: str):
         super().__init__(location)
         self._attribute = attribute
@@ -52,6 +62,123 @@ class ImmutableFile(FileLocation):
         return self._attribute
 
 
+class ImmutableDetector(Detector):
+    """
+    Detects immutable and append-only files by reading the inode flags of regular files and directories with one
+    open and ioctl call each. Changing the flags of a file changes its ctime, hence the flags are only read again if
+    the ctime changed (a directory's ctime also changes if entries are added or removed).
+    """
+
+    name = os.path.basename(__file__)
+
+    def __init__(self,
+                 locations: List[str],
+                 inode_cache: InodeCache,
+                 step_state_data: Optional[Dict[str, Any]] = None):
+        """
+        :param locations:
+        :param inode_cache:
+        :param step_state_data: step state if only a part of the locations is searched (unused cache entries are kept
+        until they were not seen during a complete pass)
+        """
+        super().__init__(locations)
+        self._inode_cache = inode_cache
+        self._step_state_data = step_state_data
+
+    def check(self, context: EntryContext) -> Optional[List[str]]:
+        is_dir = context.entry.is_dir(follow_symlinks=False)
+        if not is_dir and not context.entry.is_file(follow_symlinks=False):
+            return None
+
+        file_stat = context.stat
+        flags = self._inode_cache.get(file_stat,
+                                      [file_stat.st_ctime_ns],
+                                      lambda: get_inode_flags(context.path, is_dir))
+
+        # Append-only files are always collected to be able to use cached results regardless of SEARCH_APPEND_ONLY.
+        if flags & (FS_IMMUTABLE_FL | FS_APPEND_FL):
+            return [context.path, format_inode_flags(flags)]
+        return None
+
+    def finish(self):
+        if self._step_state_data is not None:
+            self._inode_cache.store(*get_step_generations(self._step_state_data))
+        else:
+            self._inode_cache.store()
+
+
+def get_combined_detector() -> Optional[ImmutableDetector]:
+    """
+    :return: detector for the combined filesystem search (None if this script does not take part in it)
+    """
+    if not ACTIVATED or SEARCH_IN_STEPS:
+        return None
+
+    return ImmutableDetector(SEARCH_LOCATIONS or ["/"], InodeCache(STATE_DIR))
+
+
+def _search_immutable_files_step(step_state_data: Dict[str, Any]) -> List[List[str]]:
+    """
+    Searches immutable files in all search locations starting at the stored cursor until the time budget is used up.
+
+    :param step_state_data:
+    :return: list of [file location, attributes] entries
+    """
+    # A step-wise search only processes a part of the files per execution, hence cache entries of the other files
+    # are kept until they were not seen during a complete pass.
+    detector = ImmutableDetector(SEARCH_LOCATIONS, InodeCache(STATE_DIR), step_state_data)
+    engine = TraversalEngine([detector])
+    results = {detector.name: []}  # type: Dict[str, List[Any]]
+
+    def checkpoint():
+        # Findings are only output after the step finished, hence the cursor is not stored past unreported ones.
+        if not results[detector.name]:
+            store_step_state(STATE_DIR, step_state_data)
+
+    for entry in iter_step_entries(step_state_data,
+                                   SEARCH_LOCATIONS,
+                                   get_step_time_budget(SEARCH_STEP_TIME_BUDGET),
+                                   False,
+                                   get_skipped_mount_points(),
+                                   checkpoint):
+        engine.check_entry(entry, [detector], results)
+    detector.finish()
+
+    return results[detector.name]
+
+
+def process_immutable_files(found_files: List[List[str]]):
+    """
+    Applies the whitelists to the found immutable files and outputs the remaining ones.
+
+    :param found_files: list of [file location, attributes] entries
+    """
+    immutable_files = []  # type: List[ImmutableFile]
+    try:
+        dir_whitelist = DirectoryWhitelist([FileLocation(x) for x in IMMUTABLE_DIRECTORY_WHITELIST])
+        file_whitelist = FileWhitelist([FileLocation(x) for x in IMMUTABLE_FILE_WHITELIST])
+
+        for file_location, attributes in found_files:
+            if "i" not in attributes and not (SEARCH_APPEND_ONLY and "a" in attributes):
+                continue
+            if dir_whitelist.is_whitelisted(file_location) or file_whitelist.is_whitelisted(file_location):
+                continue
+            immutable_files.append(ImmutableFile(file_location, attributes))
+
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
+
+    if immutable_files:
+        if SEARCH_APPEND_ONLY:
+            message = "Immutable or append-only file(s) found:\n\n"
+        else:
+            message = "Immutable file(s) found:\n\n"
+        message += "\n".join(["File: %s; Attributes: %s" % (x.location, x.attribute) for x in immutable_files])
+
+        output_finding(__file__, message)
+
+
 def search_immutable_files():
     # Decide where to output results.
     print_output = False
@@ -63,6 +190,10 @@ def search_immutable_files():
             print("Module deactivated.")
         return
 
+    # The search is done by search_filesystem.py together with other searches.
+    if COMBINED_FILESYSTEM_SEARCH and not SEARCH_IN_STEPS:
+        return
+
     step_state_data = {}
     try:
         step_state_data = load_step_state(STATE_DIR)
@@ -71,89 +202,39 @@ def search_immutable_files():
         output_error(__file__, str(e))
         return
 
-    # Reset step if we do not search in steps but everything.
-    if not SEARCH_IN_STEPS:
-        step_state_data["next_step"] = 0
-
     if not SEARCH_LOCATIONS:
         SEARCH_LOCATIONS.append("/")
 
-    # Gather all search locations.
-    search_locations = []  # type: List[StepLocation]
-    # If SEARCH_IN_STEPS is active, build a list of directories to search in
-    if SEARCH_IN_STEPS:
-        for search_location in SEARCH_LOCATIONS:
-
-            # Add parent directory as non-recursive search location in order to search in it without going deeper.
-            search_locations.append(StepLocation(search_location, False))
-
-            # Add all containing subdirectories as recursive search locations.
-            elements = os.listdir(search_location)
-            elements.sort()
-            for element in elements:
-                path = os.path.join(search_location, element)
-                if os.path.isdir(path):
-                    search_locations.append(StepLocation(path, True))
-
-    # If we do not search in separated steps, just add each directory as a recursive search location.
-    else:
-        for search_location in SEARCH_LOCATIONS:
-            search_locations.append(StepLocation(search_location, True))
-
-    # Reset index if it is outside the search locations.
-    if step_state_data["next_step"] >= len(search_locations):
-        step_state_data["next_step"] = 0
-
-    while True:
-        search_location_obj = search_locations[step_state_data["next_step"]]
-
-        # Get all immutable files.
-        if search_location_obj.search_recursive:
-            fd = os.popen("lsattr -R -a %s 2> /dev/null | sed -rn '/^[aAcCdDeijPsStTu\\-]{4}i/p'"
-                          % search_location_obj.location)
+    # If SEARCH_IN_STEPS is active, the search locations are walked from the stored cursor on until the time budget
+    # is used up. Otherwise, the search locations are split by the mounts they contain and processed in parallel
+    # (grouped by the device they are stored on). The results of read-only filesystems are cached until a remount.
+    found_files = []  # type: List[List[str]]
+    try:
+        if SEARCH_IN_STEPS:
+            found_files = _search_immutable_files_step(step_state_data)
 
         else:
-            fd = os.popen("lsattr -a %s 2> /dev/null | sed -rn '/^[aAcCdDeijPsStTu\\-]{4}i/p'"
-                          % search_location_obj.location)
-        output_raw = fd.read().strip()
-        fd.close()
-
-        if output_raw != "":
+            detector = ImmutableDetector(SEARCH_LOCATIONS, InodeCache(STATE_DIR))
+            results = TraversalEngine([detector]).run(step_state_data["mount_cache"],
+                                                      lambda x: output_error(__file__, x))
+            found_files = results[detector.name]
 
-            immutable_files = []  # type: List[ImmutableFile]
-            output_list = output_raw.split("\n")
-            for output_entry in output_list:
-                output_entry_list = output_entry.split(" ")
-
-                # Notify and skip line if sanity check fails.
-                if len(output_entry_list) != 2:
-                    output_error(__file__, "Unable to process line '%s'" % output_entry)
-                    continue
-
-                attributes = output_entry_list[0]
-                file_location = output_entry_list[1]
-                immutable_files.append(ImmutableFile(file_location, attributes))
-
-            dir_whitelist = [FileLocation(x) for x in IMMUTABLE_DIRECTORY_WHITELIST]
-            file_whitelist = [FileLocation(x) for x in IMMUTABLE_FILE_WHITELIST]
-
-            immutable_files = cast(List[ImmutableFile], apply_directory_whitelist(dir_whitelist, immutable_files))
-            immutable_files = cast(List[ImmutableFile], apply_file_whitelist(file_whitelist, immutable_files))
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
 
-            if immutable_files:
-                message = "Immutable file(s) found:\n\n"
-                message += "\n".join(["File: %s; Attributes: %s" % (x.location, x.attribute) for x in immutable_files])
+    process_immutable_files(found_files)
 
-                output_finding(__file__, message)
+    try:
+        store_step_state(STATE_DIR, step_state_data)
 
-        step_state_data["next_step"] += 1
+    except Exception as e:
+        output_error(__file__, str(e))
 
-        # Stop search if we are finished.
-        if SEARCH_IN_STEPS or step_state_data["next_step"] >= len(search_locations):
-            break
 
+def print_coverage():
     try:
-        store_step_state(STATE_DIR, step_state_data)
+        print(get_step_coverage(load_step_state(STATE_DIR)))
 
     except Exception as e:
         output_error(__file__, str(e))
@@ -161,10 +242,15 @@ def search_immutable_files():
 
 if __name__ == '__main__':
     is_init_run = False
+    is_coverage_run = False
     if len(sys.argv) == 2:
         if sys.argv[1] == "--init":
             is_init_run = True
+        elif sys.argv[1] == "--coverage":
+            is_coverage_run = True
 
     # Script does not need to establish a state.
-    if not is_init_run:
+    if is_coverage_run:
+        print_coverage()
+    elif not is_init_run:
         search_immutable_files()
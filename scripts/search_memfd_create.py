@@ -20,18 +20,24 @@ https://www.sandflysecurity.com/blog/detecting-linux-memfd_create-fileless-malwa
 
 import os
 import sys
+from typing import List
 
-from lib.util import output_finding
+from lib.ioc_filter import load_ioc_checker
+from lib.util import output_error, output_finding
+from lib.util_proc import ProcessInfo, ProcSnapshot
 
 # Read configuration.
 try:
-    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR
+    from config.config import ALERTR_FIFO, FROM_ADDR, TO_ADDR, STATE_DIR
     from config.search_memfd_create import ACTIVATED
+
+    STATE_DIR = os.path.join(os.path.dirname(__file__), STATE_DIR, os.path.basename(__file__))
 except:
     ALERTR_FIFO = None
     FROM_ADDR = None
     TO_ADDR = None
     ACTIVATED = True
+    STATE_DIR = os.path.join("/tmp", os.path.basename(__file__))
 
 
 def search_deleted_memfd_files():
@@ -46,20 +52,54 @@ def search_deleted_memfd_files():
             print("Module deactivated.")
         return
 
-    # Get all suspicious ELF files.
-    fd = os.popen("ls -laR /proc/*/exe 2> /dev/null | grep memfd:.*\\(deleted\\)")
-    suspicious_exe_raw = fd.read().strip()
-    fd.close()
+    # Get all processes executed from a memfd file.
+    suspicious_exes = []  # type: List[ProcessInfo]
+    try:
+        for process in ProcSnapshot():
+            exe = process.exe
+            if exe is not None and exe.startswith("/memfd:") and exe.endswith(" (deleted)"):
+                suspicious_exes.append(process)
 
-    suspicious_exes = []
-    if suspicious_exe_raw.strip():
-        suspicious_exes.extend(suspicious_exe_raw.strip().split("\n"))
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
 
+    ioc_checker = None
     if suspicious_exes:
-        message = "Deleted memfd file(s) found:\n\n"
-        message += "\n".join(suspicious_exes)
+        try:
+            ioc_checker = load_ioc_checker(STATE_DIR)
 
-        output_finding(__file__, message)
+        except Exception as e:
+            output_error(__file__, str(e))
+
+    if suspicious_exes:
+        message = "Deleted memfd file(s) found:\n\n"
+        for process in suspicious_exes:
+            message += "/proc/%d/exe -> %s\n" % (process.pid, process.exe)
+
+            # The content of the memfd file is accessible via the exe link of the process.
+            if ioc_checker is not None:
+                try:
+                    fd = os.open(process.get_file("exe"), os.O_RDONLY)
+                    try:
+                        ioc_hash = ioc_checker.check_fd(fd)
+                    finally:
+                        os.close(fd)
+                    if ioc_hash is not None:
+                        message += "Known malicious SHA-256: %s\n" % ioc_hash
+
+                # Process exited in the meantime.
+                except OSError:
+                    pass
+
+        output_finding(__file__, message.strip())
+
+    if ioc_checker is not None:
+        try:
+            ioc_checker.finish()
+
+        except Exception as e:
+            output_error(__file__, str(e))
 
 
 if __name__ == '__main__':
@@ -10,7 +10,8 @@
 """
 Short summary:
 Malware will name itself with [brackets] to impersonate a Linux kernel thread.
-Any Linux process that looks like a [kernel thread] should have an empty maps file.
+Real kernel threads have the PF_KTHREAD flag set and are children of [kthreadd] (pid 2). Any Linux process that
+looks like a [kernel thread] but is not one is confirmed as impostor by having memory mappings or an executable.
 
 Site note:
 when using ps auxwf | grep "\\[" they are children of [kthreadd]
@@ -23,10 +24,11 @@ https://twitter.com/CraigHRowland/status/1232399132632813568
 https://www.sandflysecurity.com/blog/detecting-linux-kernel-process-masquerading-with-command-line-forensics/
 """
 
-import os
 import sys
 
 from lib.util import output_error, output_finding
+from lib.util_proc import ProcSnapshot
+from lib.util_whitelist import PatternWhitelist
 
 # Read configuration.
 try:
@@ -52,49 +54,56 @@ def search_suspicious_process():
             print("Module deactivated.")
         return
 
-    # Iterate over all processes that have a "[".
-    fd = os.popen("ps auxw | grep \\\\[ | awk '{print $2}'")
-    pids_raw = fd.read().strip()
-    fd.close()
-    for pid in pids_raw.split("\n"):
-
-        # Get process name of pid.
-        fd = os.popen("ps u -p %s" % pid)
-        ps_output = fd.read().strip()
-        fd.close()
-
-        fd = os.popen("ps u -p %s | awk '{$1=$2=$3=$4=$5=$6=$7=$8=$9=$10=\"\"; print $0}'" % pid)
-        process_name_raw = fd.read().strip()
-        fd.close()
-        for process_name in process_name_raw.split("\n"):
-            process_name = process_name.strip()
-            # Ignore COMMAND since it is part of the headline of ps output.
-            if process_name == "COMMAND":
-                continue
-
-            # Check if we have whitelisted the process
-            # (e.g., [lxc monitor] /var/lib/lxc satellite).
-            elif process_name in NON_KTHREAD_WHITELIST:
-                continue
-
-            # Only consider process names that start with a "["
-            # (e.g., "avahi-daemon: running [towelie.local]"" does not)
-            elif process_name.startswith("["):
-
-                file_path = "/proc/%s/maps" % pid
-                try:
-                    with open(file_path, 'rt') as fp:
-                        data = fp.read()
-                        if data == "":
-                            continue
-
-                except Exception as e:
-                    output_error(__file__, str(e))
-                    continue
-
-                message = "Process with pid '%s' suspicious.\n\n" % pid
-                message += ps_output
-                output_finding(__file__, message)
+    try:
+        whitelist = PatternWhitelist(NON_KTHREAD_WHITELIST)
+
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
+
+    try:
+        snapshot = ProcSnapshot()
+
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
+
+    # Iterate over all processes whose command (as shown by ps) starts with a "[".
+    for process in snapshot:
+        process_name = process.command
+
+        # Process got terminated while searching.
+        if process_name is None:
+            continue
+
+        # Check if we have whitelisted the process
+        # (e.g., [lxc monitor] /var/lib/lxc satellite).
+        elif whitelist.is_whitelisted(process_name):
+            continue
+
+        # Only consider process names that start with a "["
+        # (e.g., "avahi-daemon: running [towelie.local]"" does not)
+        elif not process_name.startswith("["):
+            continue
+
+        is_kernel_thread = process.is_kernel_thread
+        if is_kernel_thread is None or is_kernel_thread:
+            continue
+
+        # Confirm the impostor since kernel threads neither have memory mappings nor an executable
+        # (e.g., zombie processes have neither of them).
+        reasons = []
+        if process.has_mappings():
+            reasons.append("has memory mappings")
+        if process.exe is not None:
+            reasons.append("has an executable")
+        if not reasons:
+            continue
+
+        message = "Process with pid '%d' suspicious (impersonates a kernel thread but %s).\n\n" \
+                  % (process.pid, " and ".join(reasons))
+        message += str(process)
+        output_finding(__file__, message)
 
 
 if __name__ == '__main__':
@@ -18,11 +18,10 @@ Reference:
 https://twitter.com/CraigHRowland/status/1579582776529281026
 """
 
-import os
-import re
 import sys
 
 from lib.util import output_error, output_finding
+from lib.util_proc import ProcSnapshot
 
 # Read configuration.
 try:
@@ -47,65 +46,34 @@ def search_leftover_ssh_process():
             print("Module deactivated.")
         return
 
-    # Search for SSH_CONNECTION and SSH_CLIENT
-    fd = os.popen("grep -l SSH_C /proc/*/environ 2> /dev/null")
-    ssh_processes = fd.read().strip()
-    fd.close()
+    try:
+        snapshot = ProcSnapshot()
 
-    for ssh_process in ssh_processes.split("\n"):
-        # Example output: /proc/996/environ
-        # noinspection RegExpRedundantEscape
-        matches = re.search(r'proc/(\d*)/environ', ssh_process, re.IGNORECASE)
-        if not matches:
-            continue
+    except Exception as e:
+        output_error(__file__, str(e))
+        return
 
-        pid = matches.group(1)
+    for process in snapshot:
 
-        try:
-            with open("/proc/" + str(pid) + "/status", "r") as fp:
-                status_data = fp.read()
+        # Search for SSH_CONNECTION and SSH_CLIENT.
+        environ = process.environ
+        if not environ or ("SSH_CONNECTION" not in environ.keys() and "SSH_CLIENT" not in environ.keys()):
+            continue
 
-        except FileNotFoundError:  # Process got terminated while searching
+        # Process got terminated while searching.
+        ppid = process.ppid
+        name = process.name
+        if ppid is None or name is None:
             continue
 
-        ppid = None
-        name = None
-        for line in status_data.split("\n"):
-            if line.startswith("PPid:"):
-                line_split = line.split("\t")
-
-                try:
-                    ppid = int(line_split[-1])
-                except Exception as e:
-                    output_error(__file__, "PPid not parsable for pid %d\n\n%s\n\n%s" % (pid, status_data, str(e)))
-                    break
-
-            elif line.startswith("Name:"):
-                line_split = line.split("\t")
-                name = line_split[-1]
-
-            if ppid is not None and name is not None:
-                break
-
-        if ppid is not None and name is not None:
-            if ppid == 1:
-
-                # Get executed file
-                exe_link = "/proc/" + str(pid) + "/exe"
-                fd = os.popen("ls -laR %s" % exe_link)
-                exe_raw = fd.read().strip()
-                fd.close()
-                matches = re.search(r'/proc/\d*/exe -> (.*)', exe_raw, re.IGNORECASE)
-                exe_file = exe_raw
-                if matches:
-                    exe_file = matches.group(1)
-
-                message = "Leftover process of SSH session found.\n\n"
-                message += "Name: %s\n" % name
-                message += "Exe: %s\n" % exe_file
-                message += "Pid: %s\n" % pid
-
-                output_finding(__file__, message)
+        # Process was reparented to init after its SSH session was disconnected.
+        if ppid == 1:
+            message = "Leftover process of SSH session found.\n\n"
+            message += "Name: %s\n" % name
+            message += "Exe: %s\n" % process.exe
+            message += "Pid: %d\n" % process.pid
+
+            output_finding(__file__, message)
 
 
 if __name__ == '__main__':
@@ -22,7 +22,9 @@ import os
 import sys
 from typing import List
 
-from lib.util import output_finding
+from lib.util import output_error, output_finding
+from lib.util_io import get_idle_io_command
+from lib.util_whitelist import PatternWhitelist
 
 # Read configuration.
 try:
@@ -41,13 +43,7 @@ def _process_whitelist(changed_files: List[str]) -> List[str]:
     if not FILE_WHITELIST:
         return changed_files
 
-    new_changed_files = []
-    for changed_file in changed_files:
-        if changed_file in FILE_WHITELIST:
-            continue
-        new_changed_files.append(changed_file)
-
-    return new_changed_files
+    return PatternWhitelist(FILE_WHITELIST).filter(changed_files)
 
 
 def verify_deb_packages():
@@ -62,14 +58,20 @@ def verify_deb_packages():
             print("Module deactivated.")
         return
 
-    fd = os.popen("%s -c 2> /dev/null" % DEBSUMS_EXE)
+    # debsums reads all files of all installed packages.
+    fd = os.popen(get_idle_io_command("%s -c 2> /dev/null" % DEBSUMS_EXE))
     output_raw = fd.read().strip()
     fd.close()
 
     if output_raw != "":
         changed_files = output_raw.split("\n")
 
-        changed_files = _process_whitelist(changed_files)
+        try:
+            changed_files = _process_whitelist(changed_files)
+
+        except Exception as e:
+            output_error(__file__, str(e))
+            return
 
         if changed_files:
             message = "Changed deb package files found.\n\n"
@@ -12,8 +12,31 @@ import subprocess
 import socket
 import sys
 import time
-from scripts.config.config import START_PROCESS_TIMEOUT, TO_ADDR, FROM_ADDR, ALERTR_FIFO
+from scripts.config.config import START_PROCESS_TIMEOUT, TO_ADDR, FROM_ADDR, ALERTR_FIFO, STATE_DIR, IOC_FILTER
 from scripts.lib.alerts import raise_alert_alertr, raise_alert_mail
+from scripts.lib.baseline import export_baseline, import_baseline
+from scripts.lib.ioc_filter import build_ioc_filter, get_ioc_filter_prefix
+
+USAGE = """Usage: %s [OPTION]
+
+Without option all scripts are executed. Options:
+  --init                                     initialize the states of all scripts
+  --merkle-root                              print the Merkle root of the scripts that support it
+  --coverage                                 print the search coverage of the scripts that support it
+  --export-baseline <file>                   initialize the monitor scripts and export their states
+  --import-baseline <file> [sha256]          install the exported states of the monitor scripts
+  --build-ioc-filter <feed> [filter_prefix]  build the IOC filter files from a feed of SHA-256 hashes"""
+
+# Options passed to the scripts with the scripts that support them (None for all scripts). Scripts that do not support
+# an option would ignore it and perform a normal run instead, hence they are not executed.
+SCRIPT_OPTIONS = {"--init": None,
+                  "--merkle-root": ["monitor_cron.py", "monitor_systemd_units.py"],
+                  "--coverage": ["search_hidden_exe.py", "search_immutable_files.py"]}
+
+# Options handled by this script with their allowed number of arguments.
+OPTIONS = {"--export-baseline": [1],
+           "--import-baseline": [1, 2],
+           "--build-ioc-filter": [1, 2]}
 
 
 if __name__ == '__main__':
@@ -23,7 +46,71 @@ if __name__ == '__main__':
         print_output = True
 
     script_dir = os.path.dirname(os.path.abspath(__file__)) + "/scripts/"
-    for script in os.listdir(script_dir):
+    state_root = os.path.join(script_dir, STATE_DIR)
+    script_args = sys.argv[1:]
+
+    # Reject unknown options and options with a wrong number of arguments instead of passing them to all scripts.
+    if script_args:
+        option = script_args[0]
+        is_valid = False
+        if option in SCRIPT_OPTIONS.keys():
+            is_valid = len(script_args) == 1
+        elif option in OPTIONS.keys():
+            is_valid = (len(script_args) - 1) in OPTIONS[option]
+        if not is_valid:
+            print(USAGE % sys.argv[0])
+            sys.exit(1)
+
+    # Install a golden baseline (created with "--export-baseline") as state for the monitor scripts.
+    if len(sys.argv) in [3, 4] and sys.argv[1] == "--import-baseline":
+        expected_hash = sys.argv[3] if len(sys.argv) == 4 else None
+        try:
+            imported_scripts = import_baseline(sys.argv[2], state_root, expected_hash)
+
+        except Exception as e:
+            print("Importing baseline failed: %s" % str(e))
+            sys.exit(1)
+
+        print("Imported baseline for: %s" % ", ".join(imported_scripts))
+        sys.exit(0)
+
+    # Build the IOC filter files (see IOC_FILTER) from a feed with one SHA-256 hash per line.
+    if len(sys.argv) in [3, 4] and sys.argv[1] == "--build-ioc-filter":
+        filter_prefix = sys.argv[3] if len(sys.argv) == 4 else get_ioc_filter_prefix(IOC_FILTER)
+        if filter_prefix is None:
+            print("No IOC filter location given and IOC_FILTER not set.")
+            sys.exit(1)
+
+        try:
+            with open(sys.argv[2], "r") as fp:
+                num_hashes = build_ioc_filter(fp, filter_prefix)
+
+        except Exception as e:
+            print("Building IOC filter failed: %s" % str(e))
+            sys.exit(1)
+
+        print("Built IOC filter '%s' with %d hash(es)." % (filter_prefix, num_hashes))
+        sys.exit(0)
+
+    # Initialize all monitor scripts and pack their states into a golden baseline afterwards.
+    export_baseline_file = None
+    if len(sys.argv) == 3 and sys.argv[1] == "--export-baseline":
+        export_baseline_file = sys.argv[2]
+        script_args = ["--init"]
+
+    supported_scripts = None
+    if script_args and script_args[0] in SCRIPT_OPTIONS.keys():
+        supported_scripts = SCRIPT_OPTIONS[script_args[0]]
+
+    executed_scripts = []
+    for script in sorted(os.listdir(script_dir)):
+        if supported_scripts is not None and script not in supported_scripts:
+            continue
+
+        # Only monitor scripts hold a state that can be exported.
+        if export_baseline_file is not None and not script.startswith("monitor_"):
+            continue
+
         # Execute all python scripts.
         if script[-3:] == ".py" and script != "__init__.py":
 
@@ -33,8 +120,7 @@ if __name__ == '__main__':
             to_execute = [script_dir + script]
 
             # Pass arguments to scripts.
-            if len(sys.argv) > 1:
-                to_execute.extend(sys.argv[1:])
+            to_execute.extend(script_args)
 
             process = None
             try:
@@ -149,6 +235,8 @@ if __name__ == '__main__':
 
             # Process executed successfully.
             elif exit_code == 0:
+                executed_scripts.append(script)
+
                 if print_output:
                     stdout, stderr = process.communicate()
                     print(stdout.decode("ascii"))
@@ -188,3 +276,16 @@ if __name__ == '__main__':
                     process.kill()
                 except:
                     pass
+
+    if export_baseline_file is not None:
+        # Deactivated scripts do not hold a state.
+        executed_scripts = [x for x in executed_scripts if os.path.isdir(os.path.join(state_root, x))]
+        try:
+            baseline_hash = export_baseline(state_root, executed_scripts, export_baseline_file)
+
+        except Exception as e:
+            print("Exporting baseline failed: %s" % str(e))
+            sys.exit(1)
+
+        print("Exported baseline for: %s" % ", ".join(executed_scripts))
+        print("SHA-256 of baseline file: %s" % baseline_hash)